@@ -1,39 +1,56 @@
 import json
 import random
 import time
-from locust import HttpUser, task, between, SequentialTaskSet
+from locust import task, between, SequentialTaskSet
+from deadlines import deadline
+from odoo_load_test import OdooUser, ID_POOLS
+from odoo_rpc import CallKw, Slot, JSON_HEADERS
+
+JOURNEY_CREATE_CUSTOMER = CallKw("res.partner", "create", args=[{
+    "name": Slot("name"),
+    "email": Slot("email"),
+    "is_company": True
+}])
+
+JOURNEY_CREATE_SALE_ORDER = CallKw("sale.order", "create", args=[{
+    "partner_id": Slot("partner_id"),
+    "state": "draft"
+}])
+
+SALES_ANALYSIS = CallKw("sale.order", "read_group", args=[[]], kwargs={
+    "fields": ["amount_total:sum", "partner_id"],
+    "groupby": ["partner_id"],
+    "limit": 50
+})
+
+INVENTORY_ANALYSIS = CallKw("stock.quant", "read_group", args=[[]], kwargs={
+    "fields": ["quantity:sum", "product_id"],
+    "groupby": ["product_id"],
+    "limit": 100
+})
+
 
 class BusinessProcessTest(SequentialTaskSet):
     """Simulate complete business processes"""
 
+    @deadline("menu")
     def on_start(self):
         """Login before starting the sequence"""
-        self.user.login()
+        self.user.start_session()
 
     @task
+    @deadline("write")
     def create_customer_journey(self):
         """Complete customer creation to sale order process"""
         # Step 1: Create customer
-        partner_data = {
-            "name": f"Journey Customer {random.randint(1000, 9999)}",
-            "email": f"journey{random.randint(1000, 9999)}@example.com",
-            "is_company": True
-        }
-
-        partner_payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "create",
-                "args": [partner_data],
-                "kwargs": {}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        partner_response = self.client.post("/web/dataset/call_kw/res.partner/create",
-                                            json=partner_payload,
+        partner_payload = JOURNEY_CREATE_CUSTOMER.encode(
+            name=f"Journey Customer {random.randint(1000, 9999)}",
+            email=f"journey{random.randint(1000, 9999)}@example.com"
+        )
+
+        partner_response = self.client.post(JOURNEY_CREATE_CUSTOMER.url,
+                                            data=partner_payload,
+                                            headers=JSON_HEADERS,
                                             name="Journey: Create Customer")
 
         try:
@@ -41,85 +58,42 @@ class BusinessProcessTest(SequentialTaskSet):
             partner_id = partner_result.get('result')
 
             if partner_id:
+                ID_POOLS["res.partner"].add(partner_id)
                 time.sleep(2)  # Simulate user thinking time
 
                 # Step 2: Create sale order for this customer
-                order_data = {
-                    "partner_id": partner_id,
-                    "state": "draft"
-                }
-
-                order_payload = {
-                    "jsonrpc": "2.0",
-                    "method": "call",
-                    "params": {
-                        "model": "sale.order",
-                        "method": "create",
-                        "args": [order_data],
-                        "kwargs": {}
-                    },
-                    "id": random.randint(1, 1000000)
-                }
-
-                self.client.post("/web/dataset/call_kw/sale.order/create",
-                                 json=order_payload,
+                self.client.post(JOURNEY_CREATE_SALE_ORDER.url,
+                                 data=JOURNEY_CREATE_SALE_ORDER.encode(partner_id=partner_id),
+                                 headers=JSON_HEADERS,
                                  name="Journey: Create Sale Order")
 
         except Exception as e:
             print(f"Business process failed: {e}")
 
 
-class ReportsUser(HttpUser):
+class ReportsUser(OdooUser):
     """User focused on reporting and analytics"""
     weight = 1
     wait_time = between(10, 30)
 
+    @deadline("menu")
     def on_start(self):
-        self.login()
+        self.start_session()
 
     @task(5)
+    @deadline("report")
     def sales_analysis(self):
         """Heavy sales analysis queries"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "sale.order",
-                "method": "read_group",
-                "args": [[]],
-                "kwargs": {
-                    "fields": ["amount_total:sum", "partner_id"],
-                    "groupby": ["partner_id"],
-                    "limit": 50
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        self.client.post("/web/dataset/call_kw/sale.order/read_group",
-                         json=payload,
+        self.client.post(SALES_ANALYSIS.url,
+                         data=SALES_ANALYSIS.encode(),
+                         headers=JSON_HEADERS,
                          name="Sales Analysis Report")
 
     @task(3)
+    @deadline("report")
     def inventory_analysis(self):
         """Inventory analysis queries"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "stock.quant",
-                "method": "read_group",
-                "args": [[]],
-                "kwargs": {
-                    "fields": ["quantity:sum", "product_id"],
-                    "groupby": ["product_id"],
-                    "limit": 100
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        self.client.post("/web/dataset/call_kw/stock.quant/read_group",
-                         json=payload,
+        self.client.post(INVENTORY_ANALYSIS.url,
+                         data=INVENTORY_ANALYSIS.encode(),
+                         headers=JSON_HEADERS,
                          name="Inventory Analysis Report")
-
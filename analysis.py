@@ -4,28 +4,287 @@
 # analysis.py - Analyze load test results
 # ============================================================================
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import glob
 import argparse
+import json
+import os
+import re
+import sys
 from datetime import datetime
+from pandas.api.types import union_categoricals
+
+from histograms import LatencyHistogram, bucket_value
+
+# Schema of locust's *_stats_history.csv. Percentiles are "N/A" until an
+# endpoint has responses, which becomes NaN instead of an object column.
+HISTORY_PERCENTILES = ["50%", "66%", "75%", "80%", "90%", "95%", "98%", "99%", "99.9%", "99.99%", "100%"]
+HISTORY_DTYPES = {
+    "Timestamp": "int64",
+    "User Count": "int32",
+    "Type": "category",
+    "Name": "category",
+    "Requests/s": "float32",
+    "Failures/s": "float32",
+    **{percentile: "float32" for percentile in HISTORY_PERCENTILES},
+    "Total Request Count": "int64",
+    "Total Failure Count": "int64",
+    "Total Median Response Time": "float32",
+    "Total Average Response Time": "float32",
+    "Total Min Response Time": "float32",
+    "Total Max Response Time": "float32",
+    "Total Average Content Size": "float32",
+}
+HISTORY_CHUNK_ROWS = 500_000
+
+HTTP_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+
+# Rows load_shapes.py logs once a second for the stage that is running
+STAGE_REQUEST_TYPE = "STAGE"
+
+# Endpoint groups for the per-endpoint charts, by stats name; first match wins
+ENDPOINT_GROUPS = {
+    "menus": re.compile(r"Menu|Dashboard|Web Interface|Login|Asset"),
+    "writes": re.compile(r"Create|Update|Journey"),
+    "reports": re.compile(r"Report|Analysis"),
+    "reads": re.compile(r""),
+}
+
+
+def endpoint_group(name):
+    return next(group for group, pattern in ENDPOINT_GROUPS.items() if pattern.search(name))
+
+
+def safe_divide(numerator, denominator):
+    """Element-wise division that gives NaN rather than inf where the denominator is 0"""
+    return numerator / denominator.where(denominator != 0)
+
+
+# Capacity analysis
+DEFAULT_SLO_P95 = 2000  # ms, the "acceptable" 95th percentile in the Readme
+LEVEL_SETTLE_SECONDS = 10  # locust's windowed percentiles trail a load step by up to 10s
+MIN_LEVEL_SECONDS = 5  # shorter load levels are pooled with the next ones, or left out
+MIN_P95_COVERAGE = 0.5  # share of a level's seconds that must have completed responses to trust its p95
+MSER_BATCH = 5
+
+
+def mser_truncation(values, batch=MSER_BATCH):
+    """Warm-up length in samples by MSER-5
+
+    Picks the truncation point, in the first half, that minimizes the standard
+    error of the mean of what remains (over batch means of 5 samples).
+    """
+    values = np.asarray(values, dtype="float64")
+    batches = len(values) // batch
+    if batches < 2:
+        return 0
+    means = values[:batches * batch].reshape(batches, batch).mean(axis=1)
+    scores = [means[start:].var() / (batches - start) for start in range(batches // 2 + 1)]
+    return int(np.argmin(scores)) * batch
+
+
+def pool_levels(seconds, minimum=MIN_LEVEL_SECONDS):
+    """Level number of each user count: consecutive short ones pooled until they last minimum seconds
+
+    A user count lasting minimum seconds or more is a level of its own.
+
+    >>> pool_levels([1, 1, 1, 1, 1, 1, 1, 167])
+    [0, 0, 0, 0, 0, 1, 1, 2]
+    >>> pool_levels([2, 2, 2, 2, 2, 2])
+    [0, 0, 0, 1, 1, 1]
+    """
+    levels, level, pooled = [], 0, 0
+    for count in seconds:
+        if count >= minimum and pooled:
+            level, pooled = level + 1, 0
+        levels.append(level)
+        pooled += count
+        if pooled >= minimum:
+            level, pooled = level + 1, 0
+    return levels
+
+
+def usl_throughput(users, throughput_per_user, contention, coherency):
+    """Universal Scalability Law: X(N) = λN / (1 + σ(N - 1) + κN(N - 1))"""
+    users = np.asarray(users, dtype="float64")
+    return throughput_per_user * users / (1 + contention * (users - 1) + coherency * users * (users - 1))
+
+
+def fit_usl(users, throughput):
+    """(λ, σ, κ) of the USL curve closest to the measured throughput, or None with under 4 load levels
+
+    For a given λ the model is linear in σ and κ (λN/X - 1 = σ(N - 1) + κN(N - 1)),
+    so those come from non-negative least squares and λ from a search that
+    minimizes the throughput error.
+    """
+    users = np.asarray(users, dtype="float64")
+    throughput = np.asarray(throughput, dtype="float64")
+    measured = (users > 0) & (throughput > 0)
+    users, throughput = users[measured], throughput[measured]
+    if len(users) < 4:
+        return None
+
+    design = np.column_stack([users - 1, users * (users - 1)])
+
+    def coefficients(throughput_per_user):
+        target = throughput_per_user * users / throughput - 1
+        candidates = [np.linalg.lstsq(design, target, rcond=None)[0]]
+        for column in range(2):
+            # Best fit with the other coefficient held at zero
+            x = design[:, column]
+            only = np.zeros(2)
+            only[column] = max(x @ target / (x @ x), 0) if x @ x else 0
+            candidates.append(only)
+        candidates = [candidate for candidate in candidates if (candidate >= 0).all()]
+        return min(candidates, key=lambda candidate: ((design @ candidate - target) ** 2).sum())
+
+    def error(throughput_per_user):
+        contention, coherency = coefficients(throughput_per_user)
+        return ((usl_throughput(users, throughput_per_user, contention, coherency) - throughput) ** 2).sum()
+
+    # λ is the throughput of a single user, at least the best throughput per user seen
+    best = (throughput / users).max()
+    grid = np.geomspace(best * 0.8, best * 4, 400)
+    for _ in range(3):
+        errors = [error(throughput_per_user) for throughput_per_user in grid]
+        index = int(np.argmin(errors))
+        grid = np.linspace(grid[max(index - 1, 0)], grid[min(index + 1, len(grid) - 1)], 100)
+    throughput_per_user = grid[int(np.argmin([error(value) for value in grid]))]
+    return (throughput_per_user, *coefficients(throughput_per_user))
+
+
+def throughput_knee(users, throughput):
+    """User count where throughput stops growing with load, by Kneedle, or None if it never bends
+
+    Kneedle: on the curve normalized to a unit square, the knee is the point
+    furthest above the straight line from the first to the last point.
+    """
+    users = np.asarray(users, dtype="float64")
+    throughput = pd.Series(throughput).rolling(3, center=True, min_periods=1).median().to_numpy()
+    if len(users) < 3 or np.ptp(users) == 0 or np.ptp(throughput) == 0:
+        return None
+    difference = (throughput - throughput.min()) / np.ptp(throughput) - (users - users.min()) / np.ptp(users)
+    index = int(np.argmax(difference))
+    return users[index] if difference[index] > 0.1 else None
+
+
+def find_runs(path):
+    """CSV prefixes of the runs at path, oldest first
+
+    path is a prefix, a glob pattern of prefixes ('results_medium_*') or a
+    directory, which stands for every run in it.
+    """
+    pattern = os.path.join(path, "*") if os.path.isdir(path) else path
+    stats_files = sorted(glob.glob(f"{pattern}_stats.csv"), key=os.path.getmtime)
+    return [stats_file[:-len("_stats.csv")] for stats_file in stats_files]
+
+
+def concat_chunks(chunks):
+    """pd.concat that keeps categorical columns categorical when chunks saw different categories"""
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in HISTORY_DTYPES.items()})
+    frame = pd.concat(chunks, ignore_index=True)
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            frame[column] = union_categoricals([chunk[column] for chunk in chunks])
+    return frame
+
 
 class LoadTestAnalyzer:
     """Analyze and visualize load test results"""
 
-    def __init__(self, csv_prefix):
+    def __init__(self, csv_prefix, history_columns=None, use_cache=True):
         self.csv_prefix = csv_prefix
+        self.history_columns = history_columns
+        self.use_cache = use_cache
         self.stats_df = None
         self.failures_df = None
         self.history_df = None
 
+    @property
+    def history_path(self):
+        return f"{self.csv_prefix}_stats_history.csv"
+
+    @property
+    def history_cache_path(self):
+        return f"{self.csv_prefix}_stats_history.parquet"
+
+    def iter_history(self, columns=None, chunk_rows=HISTORY_CHUNK_ROWS):
+        """Stream the stats history as typed chunks, for aggregating files that don't fit in memory"""
+        columns = columns or list(HISTORY_DTYPES)
+        reader = pd.read_csv(self.history_path,
+                             usecols=columns,
+                             dtype={column: HISTORY_DTYPES[column] for column in columns},
+                             na_values=["N/A"],
+                             chunksize=chunk_rows)
+        with reader:
+            yield from reader
+
+    def load_history(self, columns=None):
+        """Typed stats history, from the Parquet sidecar when it is newer than the CSV
+
+        Timestamps are epoch seconds in the CSV and come back as datetimes.
+        """
+        columns = columns or list(HISTORY_DTYPES)
+        cache = self.history_cache_path
+        if self.use_cache and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(self.history_path):
+            history = pd.read_parquet(cache, columns=columns)
+        else:
+            history = concat_chunks(self.iter_history())
+            if self.use_cache:
+                self._write_history_cache(history)
+            history = history[columns]
+
+        if "Timestamp" in history.columns:
+            history["Timestamp"] = pd.to_datetime(history["Timestamp"], unit="s")
+        return history
+
+    def _write_history_cache(self, history):
+        """Save the whole typed history next to the CSV; needs pyarrow or fastparquet"""
+        try:
+            history.to_parquet(self.history_cache_path, index=False)
+        except ImportError:
+            print("Install pyarrow to cache the stats history as Parquet")
+
+    def summarize_history(self, chunk_rows=HISTORY_CHUNK_ROWS):
+        """Per-endpoint totals over the whole history, one chunk at a time
+
+        Combines partial sums and maxima per chunk, so memory depends on the
+        number of endpoints rather than on the length of the run.
+        """
+        columns = ["Type", "Name", "Requests/s", "Failures/s", "95%", "99%", "Total Request Count"]
+        partials = []
+        for chunk in self.iter_history(columns, chunk_rows):
+            partials.append(chunk.groupby(["Type", "Name"], observed=True, dropna=False).agg(
+                samples=("Requests/s", "size"),
+                requests_per_s=("Requests/s", "sum"),
+                failures_per_s=("Failures/s", "sum"),
+                max_p95=("95%", "max"),
+                max_p99=("99%", "max"),
+                requests=("Total Request Count", "max"),
+            ))
+        if not partials:
+            return pd.DataFrame()
+
+        combined = pd.concat(partials).groupby(level=["Type", "Name"], observed=True, dropna=False).agg({
+            "samples": "sum", "requests_per_s": "sum", "failures_per_s": "sum",
+            "max_p95": "max", "max_p99": "max", "requests": "max",
+        })
+        combined["requests_per_s"] /= combined["samples"]
+        combined["failures_per_s"] /= combined["samples"]
+        return combined.rename(columns={"requests_per_s": "mean_requests_per_s",
+                                        "failures_per_s": "mean_failures_per_s"})
+
     def load_data(self):
         """Load CSV results from Locust"""
         try:
             # Load stats data
             stats_files = glob.glob(f"{self.csv_prefix}_stats.csv")
             if stats_files:
-                self.stats_df = pd.read_csv(stats_files[0])
+                self.stats_df = pd.read_csv(stats_files[0], na_values=["N/A"])
                 print(f"Loaded stats data: {len(self.stats_df)} rows")
 
             # Load failures data
@@ -35,10 +294,8 @@ class LoadTestAnalyzer:
                 print(f"Loaded failures data: {len(self.failures_df)} rows")
 
             # Load history data
-            history_files = glob.glob(f"{self.csv_prefix}_stats_history.csv")
-            if history_files:
-                self.history_df = pd.read_csv(history_files[0])
-                self.history_df['Timestamp'] = pd.to_datetime(self.history_df['Timestamp'])
+            if os.path.exists(self.history_path):
+                self.history_df = self.load_history(self.history_columns)
                 print(f"Loaded history data: {len(self.history_df)} rows")
 
         except Exception as e:
@@ -54,33 +311,64 @@ class LoadTestAnalyzer:
         print("LOAD TEST SUMMARY REPORT")
         print("="*60)
 
+        # Only real requests: the Aggregated row already covers them, and the synthetic rows
+        # (TTI, CACHE, INTENDED, TTFB, DEADLINE, STAGE, ...) aren't requests Odoo served
+        is_request = self.stats_df['Type'].isin(HTTP_METHODS)
+        endpoints = self.stats_df[is_request]
+        synthetic = self.stats_df[~is_request & (self.stats_df['Name'] != 'Aggregated') &
+                                  (self.stats_df['Type'] != STAGE_REQUEST_TYPE)]
+
         # Overall statistics
-        total_requests = self.stats_df['Request Count'].sum()
-        total_failures = self.stats_df['Failure Count'].sum()
+        total_requests = endpoints['Request Count'].sum()
+        total_failures = endpoints['Failure Count'].sum()
         failure_rate = (total_failures / total_requests * 100) if total_requests > 0 else 0
 
         print(f"Total Requests: {total_requests:,}")
         print(f"Total Failures: {total_failures:,}")
         print(f"Failure Rate: {failure_rate:.2f}%")
 
-        # Response time statistics
-        avg_response_time = self.stats_df['Average Response Time'].mean()
-        max_response_time = self.stats_df['Max Response Time'].max()
-        p50_response_time = self.stats_df['50%'].mean()
-        p95_response_time = self.stats_df['95%'].mean()
+        # Response time statistics: percentiles of all requests together, which averaging
+        # per-endpoint percentiles doesn't give; exact from histograms when the run exported them
+        histograms = self.load_histograms()
+        if histograms:
+            overall = LatencyHistogram()
+            for (_, request_type, _), histogram in histograms.items():
+                if request_type in HTTP_METHODS:
+                    overall.merge(histogram)
+            avg_response_time = overall.mean()
+            p50_response_time, p95_response_time, p99_response_time = (
+                overall.percentile(0.50), overall.percentile(0.95), overall.percentile(0.99))
+            source = f"merged histograms, {overall.total:,} samples"
+        else:
+            aggregated = self.stats_df[self.stats_df['Name'] == 'Aggregated']
+            weights = endpoints['Request Count']
+            avg_response_time = (endpoints['Average Response Time'] * weights).sum() / weights.sum() if weights.sum() else 0
+            p50_response_time, p95_response_time, p99_response_time = (
+                aggregated[percentile].iloc[0] if not aggregated.empty else float('nan')
+                for percentile in ('50%', '95%', '99%'))
+            source = "locust's Aggregated row"
+        max_response_time = endpoints['Max Response Time'].max()
 
-        print(f"\nResponse Time Statistics:")
+        print(f"\nResponse Time Statistics ({source}):")
         print(f"Average: {avg_response_time:.2f}ms")
         print(f"50th Percentile: {p50_response_time:.2f}ms")
         print(f"95th Percentile: {p95_response_time:.2f}ms")
+        print(f"99th Percentile: {p99_response_time:.2f}ms")
         print(f"Maximum: {max_response_time:.2f}ms")
 
         # Top slow endpoints
         print(f"\nSlowest Endpoints:")
-        slow_endpoints = self.stats_df.nlargest(5, 'Average Response Time')[['Name', 'Average Response Time']]
+        slow_endpoints = endpoints.nlargest(5, 'Average Response Time')[['Name', 'Average Response Time']]
         for _, row in slow_endpoints.iterrows():
             print(f"  {row['Name']}: {row['Average Response Time']:.2f}ms")
 
+        # Measurements derived from the requests, kept out of the numbers above
+        if not synthetic.empty:
+            print(f"\nSynthetic Series:")
+            for _, row in synthetic.sort_values(['Type', 'Name']).iterrows():
+                print(f"  {row['Type']} {row['Name']}: {row['Request Count']:,} samples, "
+                      f"{row['Average Response Time']:.2f}ms average, {row['Max Response Time']:.2f}ms max")
+
         # Failure analysis
         if self.failures_df is not None and not self.failures_df.empty:
             print(f"\nTop Failure Types:")
@@ -88,56 +376,761 @@ class LoadTestAnalyzer:
             for error, count in failure_counts.items():
                 print(f"  {error}: {count} occurrences")
 
-    def create_visualizations(self):
+    @property
+    def histograms_path(self):
+        return f"{self.csv_prefix}_histograms.jsonl"
+
+    def load_histograms(self, paths=None, window=None):
+        """Merge exported latency histograms into {(window start, type, name): LatencyHistogram}
+
+        Reads one line at a time, so memory is bounded by the number of keys
+        rather than the length of the run. Several files (workers' runs,
+        scenarios) merge exactly. window is in seconds; None merges each
+        endpoint over the whole run, under a window start of None.
+        """
+        paths = paths or [self.histograms_path]
+        merged = {}
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    row = json.loads(line)
+                    start = row["window"] // window * window if window else None
+                    key = (start, row["type"], row["name"])
+                    histogram = LatencyHistogram.from_json(row["counts"])
+                    if key in merged:
+                        merged[key].merge(histogram)
+                    else:
+                        merged[key] = histogram
+        return merged
+
+    def histogram_percentiles(self, window=60, paths=None):
+        """Exact percentiles per endpoint and window, plus an Aggregated row per window"""
+        histograms = self.load_histograms(paths, window)
+        for (start, _, _), histogram in list(histograms.items()):
+            aggregated = histograms.setdefault((start, None, "Aggregated"), LatencyHistogram())
+            aggregated.merge(histogram)
+
+        rows = [{
+            "Timestamp": pd.to_datetime(start, unit="s"),
+            "Type": request_type,
+            "Name": name,
+            "Requests": histogram.total,
+            "Average": histogram.mean(),
+            **{label: histogram.percentile(fraction) for label, fraction in
+               (("50%", 0.50), ("90%", 0.90), ("95%", 0.95), ("99%", 0.99), ("99.9%", 0.999))}
+        } for (start, request_type, name), histogram in histograms.items()]
+        return pd.DataFrame(rows).sort_values(["Timestamp", "Name"], ignore_index=True) if rows else pd.DataFrame()
+
+    def window_samples(self, window_seconds, exact=True):
+        """Requests and latency per endpoint and time window, the units compare mode resamples
+
+        Returns {(type, name): DataFrame indexed by window start}, with the
+        Aggregated row under type "". Every endpoint gets a row for every window
+        of the run, with no requests where it wasn't called. exact=True takes a
+        Histogram per window from the exported histograms; otherwise the
+        Average, 50%, 95% and 99% come from the stats history.
+        """
+        samples = {}
+        if exact:
+            histograms = self.load_histograms(window=window_seconds)
+            for (start, _, _), histogram in list(histograms.items()):
+                histograms.setdefault((start, "", "Aggregated"), LatencyHistogram()).merge(histogram)
+            starts = sorted({start for start, _, _ in histograms})
+            for request_type, name in {(request_type, name) for _, request_type, name in histograms}:
+                per_window = [histograms.get((start, request_type, name)) or LatencyHistogram() for start in starts]
+                samples[(request_type, name)] = pd.DataFrame({
+                    "Requests": [histogram.total for histogram in per_window],
+                    "Histogram": per_window,
+                }, index=starts)
+            return samples
+
+        if self.history_df is None:
+            self.history_df = self.load_history()
+        series = self.endpoint_timeseries(f"{window_seconds}s")
+        starts = series.index.get_level_values("Timestamp").unique().sort_values()
+        for (request_type, name), endpoint in series.groupby(level=["Type", "Name"], observed=True, dropna=False):
+            endpoint = endpoint.droplevel(["Type", "Name"]).reindex(starts)
+            samples[(request_type if isinstance(request_type, str) else "", name)] = pd.DataFrame({
+                "Requests": endpoint["requests"].fillna(0),
+                "Average": endpoint["average_response_time"],
+                "50%": endpoint["p50"],
+                "95%": endpoint["p95"],
+                "99%": endpoint["p99"],
+            })
+        return samples
+
+    def endpoint_timeseries(self, window="10s"):
+        """Throughput, failure rate and latency per endpoint and time bucket
+
+        The history has one row per endpoint (plus Aggregated) per second. Rates
+        and the windowed percentiles are averaged over each bucket; the average
+        response time is exact, from the change in the cumulative totals.
+        """
+        history = self.history_df
+        buckets = history.groupby(["Type", "Name", history["Timestamp"].dt.floor(window)],
+                                  observed=True, dropna=False, sort=True)
+        series = buckets.agg(
+            users=("User Count", "max"),
+            requests_per_s=("Requests/s", "mean"),
+            failures_per_s=("Failures/s", "mean"),
+            p50=("50%", "mean"),
+            p95=("95%", "mean"),
+            p99=("99%", "mean"),
+            total_requests=("Total Request Count", "last"),
+            total_average=("Total Average Response Time", "last"),
+        )
+
+        per_endpoint = series.groupby(level=["Type", "Name"], observed=True, dropna=False)
+        total_ms = series["total_average"].astype("float64") * series["total_requests"]
+        requests = per_endpoint["total_requests"].diff().fillna(series["total_requests"])
+        response_ms = total_ms.groupby(level=["Type", "Name"], observed=True, dropna=False).diff().fillna(total_ms)
+
+        series["requests"] = requests
+        series["average_response_time"] = safe_divide(response_ms, requests)
+        series["failure_rate"] = safe_divide(series["failures_per_s"], series["requests_per_s"]) * 100
+        return series.drop(columns=["total_requests", "total_average"])
+
+    def create_visualizations(self, window="10s"):
         """Create performance visualizations"""
         if self.history_df is None:
             print("No timeline data available for visualizations")
             return
 
+        series = self.endpoint_timeseries(window)
+        series.to_csv(f"{self.csv_prefix}_endpoint_timeseries.csv")
+        print(f"Per-endpoint time series saved as {self.csv_prefix}_endpoint_timeseries.csv")
+
+        names = series.index.get_level_values("Name")
+        overall = series[names == "Aggregated"].droplevel(["Type", "Name"])
+
         fig, axes = plt.subplots(2, 2, figsize=(15, 10))
-        fig.suptitle('Load Test Performance Analysis', fontsize=16)
+        fig.suptitle(f'Load Test Performance Analysis ({window} windows)', fontsize=16)
 
         # Response time over time
-        axes[0, 0].plot(self.history_df['Timestamp'], self.history_df['Average Response Time'])
-        axes[0, 0].set_title('Average Response Time Over Time')
+        axes[0, 0].plot(overall.index, overall['average_response_time'], label='Average')
+        axes[0, 0].plot(overall.index, overall['p95'], label='95th percentile')
+        axes[0, 0].set_title('Response Time Over Time')
         axes[0, 0].set_ylabel('Response Time (ms)')
+        axes[0, 0].legend()
         axes[0, 0].tick_params(axis='x', rotation=45)
 
         # Requests per second over time
-        axes[0, 1].plot(self.history_df['Timestamp'], self.history_df['Requests/s'])
+        axes[0, 1].plot(overall.index, overall['requests_per_s'])
         axes[0, 1].set_title('Requests per Second Over Time')
         axes[0, 1].set_ylabel('Requests/s')
         axes[0, 1].tick_params(axis='x', rotation=45)
 
         # User count over time
-        axes[1, 0].plot(self.history_df['Timestamp'], self.history_df['User Count'])
+        axes[1, 0].plot(overall.index, overall['users'])
         axes[1, 0].set_title('User Count Over Time')
         axes[1, 0].set_ylabel('Active Users')
         axes[1, 0].tick_params(axis='x', rotation=45)
 
         # Failure rate over time
-        axes[1, 1].plot(self.history_df['Timestamp'],
-                        self.history_df['Failures/s'] / self.history_df['Requests/s'] * 100)
+        axes[1, 1].plot(overall.index, overall['failure_rate'])
         axes[1, 1].set_title('Failure Rate Over Time')
         axes[1, 1].set_ylabel('Failure Rate (%)')
         axes[1, 1].tick_params(axis='x', rotation=45)
 
         plt.tight_layout()
         plt.savefig(f'{self.csv_prefix}_analysis.png', dpi=300, bbox_inches='tight')
+        plt.close(fig)
         print(f"Visualizations saved as {self.csv_prefix}_analysis.png")
 
-    def analyze(self):
+        self.create_endpoint_charts(series, window)
+
+        percentiles = self.histogram_percentiles(int(pd.Timedelta(window).total_seconds()))
+        if not percentiles.empty:
+            percentiles.to_csv(f"{self.csv_prefix}_histogram_percentiles.csv", index=False)
+            print(f"Exact percentiles per window saved as {self.csv_prefix}_histogram_percentiles.csv")
+
+    def create_endpoint_charts(self, series, window):
+        """One small-multiples chart per endpoint group: a panel per endpoint, shared axes"""
+        types = series.index.get_level_values("Type")
+        endpoints = series[types.isin(HTTP_METHODS)]
+        names = endpoints.index.get_level_values("Name").unique()
+
+        for group in ENDPOINT_GROUPS:
+            group_names = sorted(name for name in names if endpoint_group(name) == group)
+            if not group_names:
+                continue
+
+            columns = min(4, len(group_names))
+            rows = -(-len(group_names) // columns)
+            fig, axes = plt.subplots(rows, columns, figsize=(4 * columns, 3 * rows),
+                                     sharex=True, sharey=True, squeeze=False)
+            fig.suptitle(f'{group.title()}: response time and throughput per endpoint ({window} windows)')
+
+            for ax, name in zip(axes.flat, group_names):
+                endpoint = endpoints.xs(name, level="Name").droplevel("Type")
+                endpoint = endpoint.groupby(level="Timestamp").mean()  # same name under GET and POST
+                ax.plot(endpoint.index, endpoint['average_response_time'], label='Average')
+                ax.plot(endpoint.index, endpoint['p95'], label='95th percentile')
+                throughput = ax.twinx()
+                throughput.fill_between(endpoint.index, endpoint['requests_per_s'], color='gray', alpha=0.2)
+                throughput.set_ylim(bottom=0)
+                ax.set_title(name, fontsize=9)
+                ax.tick_params(axis='x', rotation=45, labelsize=7)
+            for ax in list(axes.flat)[len(group_names):]:
+                ax.set_visible(False)
+
+            axes[0, 0].set_ylabel('Response Time (ms)')
+            axes[0, 0].legend(fontsize=7)
+            plt.tight_layout()
+            path = f'{self.csv_prefix}_{group}.png'
+            plt.savefig(path, dpi=150, bbox_inches='tight')
+            plt.close(fig)
+            print(f"{group.title()} chart saved as {path}")
+
+    @staticmethod
+    def stage_timeline(history):
+        """The load_shapes.py stage running at each timestamp of the history, or None without stages
+
+        A stage runs where its STAGE row's request count grows; between two of
+        its markers (e.g. while users spawn) the last stage carries on.
+        """
+        markers = history[history["Type"] == STAGE_REQUEST_TYPE]
+        if markers.empty:
+            return None
+        counts = markers.pivot_table(index="Timestamp", columns="Name", values="Total Request Count",
+                                     aggfunc="max", observed=True).fillna(0)
+        logged = counts.diff().fillna(counts)
+        stage = logged.idxmax(axis=1).where(logged.max(axis=1) > 0)
+        return stage.astype("object").ffill().dropna()
+
+    def stage_breakdown(self):
+        """Requests, throughput, latency and failures of every endpoint in every load profile stage
+
+        Request, failure and response time totals are exact, from the change in
+        the cumulative totals; p95 and p99 are the medians of locust's windowed
+        percentiles over the stage.
+        """
+        history = self.load_history(["Timestamp", "User Count", "Type", "Name", "95%", "99%", "Total Request Count",
+                                     "Total Failure Count", "Total Average Response Time"])
+        stages = self.stage_timeline(history)
+        if stages is None:
+            return pd.DataFrame()
+
+        history = history[history["Type"] != STAGE_REQUEST_TYPE].sort_values("Timestamp")
+        endpoint = [history["Type"], history["Name"]]
+        total_ms = history["Total Average Response Time"].astype("float64") * history["Total Request Count"]
+        history = history.assign(
+            Stage=history["Timestamp"].map(stages),
+            requests=history.groupby(endpoint, observed=True, dropna=False)["Total Request Count"].diff()
+            .fillna(history["Total Request Count"]),
+            failures=history.groupby(endpoint, observed=True, dropna=False)["Total Failure Count"].diff()
+            .fillna(history["Total Failure Count"]),
+            response_ms=total_ms.groupby(endpoint, observed=True, dropna=False).diff().fillna(total_ms),
+        ).dropna(subset=["Stage"])
+
+        breakdown = history.groupby(["Stage", "Type", "Name"], observed=True, dropna=False).agg(
+            users=("User Count", "max"),
+            requests=("requests", "sum"),
+            failures=("failures", "sum"),
+            response_ms=("response_ms", "sum"),
+            p95=("95%", "median"),
+            p99=("99%", "median"),
+        ).reset_index()
+
+        timestamps = stages.index.to_series()
+        spans = timestamps.groupby(stages).agg(["min", "max"])
+        breakdown["start"] = breakdown["Stage"].map(spans["min"])
+        breakdown["seconds"] = (breakdown["Stage"].map(spans["max"]) - breakdown["start"]).dt.total_seconds() + 1
+        breakdown["requests_per_s"] = breakdown["requests"] / breakdown["seconds"]
+        breakdown["average_response_time"] = safe_divide(breakdown["response_ms"], breakdown["requests"])
+        breakdown["failure_rate"] = safe_divide(breakdown["failures"], breakdown["requests"]) * 100
+        return (breakdown.drop(columns="response_ms")
+                .sort_values(["start", "Type", "Name"], na_position="last", ignore_index=True))
+
+    def generate_stage_report(self):
+        """Print the Aggregated numbers per stage of a load profile run and save every endpoint's"""
+        if not os.path.exists(self.history_path):
+            return
+        breakdown = self.stage_breakdown()
+        if breakdown.empty:
+            return
+
+        print("\n" + "="*60)
+        print("LOAD PROFILE STAGES")
+        print("="*60)
+        for _, row in breakdown[breakdown["Name"] == "Aggregated"].iterrows():
+            print(f"{row['Stage']:<20} {row['seconds']:>6.0f}s {row['users']:>5} users {row['requests_per_s']:>8.1f} req/s  "
+                  f"avg {row['average_response_time']:>7.0f}ms  p95 {row['p95']:>6.0f}ms  {row['failure_rate']:.2f}% failures")
+
+        breakdown.to_csv(f"{self.csv_prefix}_stages.csv", index=False)
+        print(f"Per-stage numbers of every endpoint saved as {self.csv_prefix}_stages.csv")
+
+    def capacity(self, slo_p95=DEFAULT_SLO_P95, settle=LEVEL_SETTLE_SECONDS):
+        """Throughput and p95 per user count, saturation knee, USL fit, SLO crossing and warm-up
+
+        Meant for runs that ramp the load up slowly or in steps, like the
+        stress scenario. Throughput comes from the change in the Aggregated
+        request count every second, which doesn't trail the load like locust's
+        Requests/s. Load levels lasting 2 * settle seconds or more leave out
+        their first settle seconds; user counts lasting under MIN_LEVEL_SECONDS
+        are pooled into one level at their mean user count, and a level still
+        that short is left out. A level's p95 is the median of locust's
+        windowed "95%" over the seconds that completed responses; it is
+        unknown (NaN) when under MIN_P95_COVERAGE of them did, since hung
+        requests leave windows empty rather than slow. Estimates the levels
+        can't give are listed under "insufficient". The warm-up is everything
+        before the peak user count is reached plus the MSER-5 truncation of
+        p95 after that.
+        """
+        history = self.load_history(["Timestamp", "User Count", "Name", "95%", "Total Request Count"])
+        overall = history[history["Name"] == "Aggregated"].sort_values("Timestamp", ignore_index=True)
+        elapsed = (overall["Timestamp"] - overall["Timestamp"].iloc[0]).dt.total_seconds()
+        overall["Throughput"] = safe_divide(overall["Total Request Count"].diff(), elapsed.diff())
+        # Locust reports 0 for windows without completed responses
+        overall["Responded"] = overall["95%"].where(overall["95%"] > 0)
+
+        level = (overall["User Count"] != overall["User Count"].shift()).cumsum()
+        level_start = elapsed.groupby(level).transform("first")
+        level_length = elapsed.groupby(level).transform("last") - level_start
+        settled = (level_length < 2 * settle) | (elapsed - level_start >= settle)
+        measured = overall[settled & (overall["User Count"] > 0)].dropna(subset=["Throughput"])
+        seconds = measured.groupby("User Count").size()
+        pooled = pd.Series(pool_levels(seconds), index=seconds.index)
+        levels = measured.groupby(measured["User Count"].map(pooled)).agg(
+            users=("User Count", "mean"),
+            seconds=("Throughput", "size"),
+            throughput=("Throughput", "mean"),
+            p95=("Responded", "median"),
+            p95_seconds=("Responded", "count"),
+        ).set_index("users").rename_axis("User Count")
+        levels = levels[levels["seconds"] >= MIN_LEVEL_SECONDS]
+        levels.loc[levels["p95_seconds"] < MIN_P95_COVERAGE * levels["seconds"], "p95"] = np.nan
+        users = levels.index.to_numpy(dtype="float64")
+
+        # Warm-up: the ramp, then MSER-5 on the p95 of the first stretch at peak load
+        peak = overall["User Count"].max()
+        at_peak = overall.index[overall["User Count"] == peak]
+        plateau = overall.loc[at_peak[0]:]
+        plateau = plateau[(plateau["User Count"] == peak).cummin()].dropna(subset=["Responded"])
+        warmup = elapsed[plateau.index[mser_truncation(plateau["Responded"])]] if len(plateau) else elapsed.iloc[-1]
+
+        insufficient = []
+        usl = fit_usl(users, levels["throughput"])
+        if usl is None:
+            insufficient.append("usl")
+        peak_users = peak_throughput = None
+        if usl is not None:
+            throughput_per_user, contention, coherency = usl
+            if coherency > 0 and contention < 1:
+                peak_users = np.sqrt((1 - contention) / coherency)
+                peak_throughput = usl_throughput(peak_users, *usl)
+
+        # Linear interpolation between the last level within the SLO and the first beyond it; a level
+        # of unknown p95 before that may have crossed already
+        slo_users = None
+        p95 = levels["p95"].to_numpy(dtype="float64")
+        beyond = np.flatnonzero(p95 > slo_p95)
+        within = p95[:beyond[0]] if len(beyond) else p95
+        if not len(p95) or np.isnan(within).any():
+            insufficient.append("slo_users")
+        elif len(beyond):
+            index = beyond[0]
+            slo_users = users[index]
+            if index > 0 and p95[index] > p95[index - 1]:
+                slo_users = users[index - 1] + (slo_p95 - p95[index - 1]) / (p95[index] - p95[index - 1]) * (
+                    users[index] - users[index - 1])
+
+        knee = throughput_knee(users, levels["throughput"])
+        if len(levels) < 3:
+            insufficient.append("knee_users")
+        limits = [limit for limit in (peak_users, slo_users) if limit is not None]
+        if "slo_users" in insufficient or not limits and "knee_users" in insufficient:
+            insufficient.append("max_sustainable_users")
+        return {
+            "slo_p95": slo_p95,
+            "levels": levels,
+            "knee_users": knee,
+            "usl": usl,
+            "usl_peak_users": peak_users,
+            "usl_peak_throughput": peak_throughput,
+            "slo_users": slo_users,
+            "max_sustainable_users": None if "max_sustainable_users" in insufficient else min(limits) if limits else knee,
+            "insufficient": insufficient,
+            "warmup_seconds": warmup,
+            "timeline": overall.assign(Elapsed=elapsed),
+        }
+
+    def generate_capacity_report(self, slo_p95=DEFAULT_SLO_P95):
+        """Print the capacity analysis, save its numbers and chart, and return it"""
+        capacity = self.capacity(slo_p95)
+        levels = capacity["levels"]
+
+        def users(value, estimate=None):
+            if estimate in capacity["insufficient"]:
+                return "insufficient data"
+            return f"{value:.0f} users" if value is not None else "not reached"
+
+        print("\n" + "="*60)
+        print("CAPACITY REPORT")
+        print("="*60)
+        if len(levels):
+            print(f"Load levels measured: {len(levels)} ({levels.index.min():.0f}-{levels.index.max():.0f} users)")
+        else:
+            print(f"Load levels measured: none lasting {MIN_LEVEL_SECONDS}s or more")
+        unknown = levels["p95"].isna().sum()
+        if unknown:
+            print(f"Levels without a p95: {unknown}, responses completed in under "
+                  f"{MIN_P95_COVERAGE:.0%} of their seconds (hung or failing requests?)")
+        print(f"Warm-up to trim: first {capacity['warmup_seconds']:.0f}s")
+        print(f"Throughput stops scaling at: {users(capacity['knee_users'], 'knee_users')}")
+        if capacity["usl"] is not None:
+            throughput_per_user, contention, coherency = capacity["usl"]
+            print(f"USL fit: λ={throughput_per_user:.3f} req/s per user, σ={contention:.4f} (contention), "
+                  f"κ={coherency:.6f} (coherency)")
+            if capacity["usl_peak_users"] is not None:
+                print(f"USL peak: {capacity['usl_peak_throughput']:.1f} req/s at {users(capacity['usl_peak_users'])}")
+            else:
+                print("USL peak: none, throughput keeps growing with load")
+        else:
+            print("USL fit: insufficient data, needs at least 4 load levels, ramp the users up more slowly")
+        print(f"p95 crosses {slo_p95:.0f}ms at: {users(capacity['slo_users'], 'slo_users')}")
+        print(f"Estimated maximum sustainable concurrency: "
+              f"{users(capacity['max_sustainable_users'], 'max_sustainable_users')}")
+
+        levels.to_csv(f"{self.csv_prefix}_capacity.csv")
+        summary = {key: value for key, value in capacity.items() if key not in ("levels", "timeline")}
+        with open(f"{self.csv_prefix}_capacity.json", "w") as f:
+            json.dump(summary, f, indent=2, default=float)
+        print(f"Load levels saved as {self.csv_prefix}_capacity.csv, estimates as {self.csv_prefix}_capacity.json")
+
+        self.create_capacity_charts(capacity)
+        return capacity
+
+    def create_capacity_charts(self, capacity):
+        """Throughput and p95 against users with the estimates marked, and the warm-up over time"""
+        levels = capacity["levels"]
+        timeline = capacity["timeline"]
+        users = levels.index.to_numpy(dtype="float64")
+
+        fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+        fig.suptitle('Capacity Analysis', fontsize=16)
+
+        axes[0].scatter(users, levels['throughput'], s=12, label='Measured')
+        if capacity["usl"] is not None:
+            curve = np.linspace(1, max(users.max(), capacity["usl_peak_users"] or 0) * 1.1, 200)
+            axes[0].plot(curve, usl_throughput(curve, *capacity["usl"]), color='C1', label='USL fit')
+        if capacity["usl_peak_users"] is not None:
+            axes[0].axvline(capacity["usl_peak_users"], color='C1', linestyle='--',
+                            label=f'USL peak ({capacity["usl_peak_users"]:.0f} users)')
+        if capacity["knee_users"] is not None:
+            axes[0].axvline(capacity["knee_users"], color='C2', linestyle=':',
+                            label=f'Knee ({capacity["knee_users"]:.0f} users)')
+        axes[0].set_title('Throughput vs Users')
+        axes[0].set_xlabel('Users')
+        axes[0].set_ylabel('Requests/s')
+        axes[0].legend()
+
+        axes[1].plot(users, levels['p95'], marker='.')
+        axes[1].axhline(capacity["slo_p95"], color='C3', linestyle='--', label=f'SLO ({capacity["slo_p95"]:.0f}ms)')
+        if capacity["slo_users"] is not None:
+            axes[1].axvline(capacity["slo_users"], color='C3', linestyle=':',
+                            label=f'Crossed at {capacity["slo_users"]:.0f} users')
+        axes[1].set_title('95th Percentile vs Users')
+        axes[1].set_xlabel('Users')
+        axes[1].set_ylabel('Response Time (ms)')
+        axes[1].legend()
+
+        axes[2].plot(timeline['Elapsed'], timeline['Responded'], label='95th percentile')
+        axes[2].axvspan(0, capacity["warmup_seconds"], color='gray', alpha=0.2,
+                        label=f'Warm-up ({capacity["warmup_seconds"]:.0f}s)')
+        load = axes[2].twinx()
+        load.plot(timeline['Elapsed'], timeline['User Count'], color='C1', label='Users')
+        load.set_ylabel('Users')
+        axes[2].set_title('Warm-up')
+        axes[2].set_xlabel('Elapsed (s)')
+        axes[2].set_ylabel('Response Time (ms)')
+        axes[2].legend(loc='upper left')
+
+        plt.tight_layout()
+        plt.savefig(f'{self.csv_prefix}_capacity.png', dpi=150, bbox_inches='tight')
+        plt.close(fig)
+        print(f"Capacity charts saved as {self.csv_prefix}_capacity.png")
+
+    def analyze(self, window="10s", capacity=False, slo_p95=DEFAULT_SLO_P95):
         """Run complete analysis"""
         self.load_data()
         self.generate_summary_report()
-        self.create_visualizations()
+        self.create_visualizations(window)
+        self.generate_stage_report()
+        if capacity:
+            self.generate_capacity_report(slo_p95)
+
+
+# Metrics compare mode reports; latencies in ms (higher is worse) and throughput (lower is worse)
+COMPARISON_METRICS = ["Average", "50%", "95%", "99%", "Requests/s"]
+COMPARISON_PERCENTILES = {"50%": 0.50, "95%": 0.95, "99%": 0.99}
+# A bootstrap over fewer time windows than this per side gives intervals too narrow to trust
+MIN_COMPARISON_WINDOWS = 5
+
+
+def metric_verdict(metric, change, low, high, tolerance):
+    """"regressed", "improved" or None for a metric's change and CI (in %), regardless of gating
+
+    A verdict needs the whole interval on one side of zero and a change beyond the tolerance.
+
+    >>> metric_verdict("95%", 20.0, 10.0, 30.0, 5.0)
+    'regressed'
+    >>> metric_verdict("95%", -20.0, -30.0, -10.0, 5.0)
+    'improved'
+    >>> metric_verdict("Requests/s", 20.0, 10.0, 30.0, 5.0)
+    'improved'
+    >>> metric_verdict("Requests/s", -20.0, -30.0, -10.0, 5.0)
+    'regressed'
+    >>> metric_verdict("Requests/s", 75.0, -93.0, 9000.0, 5.0) is None
+    True
+    >>> metric_verdict("95%", 3.0, 1.0, 5.0, 5.0) is None
+    True
+    """
+    if not abs(change) > tolerance:
+        return None
+    # Latency is worse upwards, throughput downwards
+    increased, decreased = low > 0, high < 0
+    if metric == "Requests/s":
+        increased, decreased = decreased, increased
+    if increased:
+        return "regressed"
+    if decreased:
+        return "improved"
+    return None
+
+
+def matrix_percentiles(counts, values, fraction):
+    """LatencyHistogram.percentile for every row of a (histograms x buckets) count matrix"""
+    cumulative = counts.cumsum(axis=1)
+    total = cumulative[:, -1]
+    rank = np.maximum(np.ceil(fraction * total), 1)
+    index = np.minimum((cumulative < rank[:, None]).sum(axis=1), len(values) - 1)
+    return np.where(total > 0, values[index], np.nan)
+
+
+class RunComparison:
+    """Per-endpoint latency and throughput deltas between baseline and candidate runs
+
+    Confidence intervals come from a bootstrap over time windows rather than
+    single requests: response times close in time move together, and resampling
+    requests one by one would make the intervals far too narrow. Several runs on
+    one side are pooled. A metric has regressed when its interval excludes no
+    change and the change itself is worse than the tolerance (in %), see
+    metric_verdict; an endpoint has regressed when any gated metric or its
+    failure rate has. Endpoints with requests in fewer than min_windows windows
+    on either side aren't judged.
+    """
+
+    def __init__(self, baseline, candidate, window="10s", gate=("95%", "Requests/s"), tolerance=5.0,
+                 max_failure_increase=1.0, min_requests=50, iterations=2000, confidence=0.95,
+                 use_cache=True, seed=0, min_windows=MIN_COMPARISON_WINDOWS):
+        self.baseline = [LoadTestAnalyzer(prefix, use_cache=use_cache) for prefix in baseline]
+        self.candidate = [LoadTestAnalyzer(prefix, use_cache=use_cache) for prefix in candidate]
+        self.window_seconds = int(pd.Timedelta(window).total_seconds())
+        self.gate = list(gate)
+        self.tolerance = tolerance
+        self.max_failure_increase = max_failure_increase
+        self.min_requests = min_requests
+        self.min_windows = min_windows
+        self.iterations = iterations
+        self.confidence = confidence
+        self.seed = seed
+        # Histograms only if every run has them, so both sides are measured the same way
+        self.exact = all(os.path.exists(run.histograms_path) for run in self.baseline + self.candidate)
+
+    def pooled_samples(self, runs):
+        pooled = {}
+        for run in runs:
+            for key, windows in run.window_samples(self.window_seconds, self.exact).items():
+                pooled.setdefault(key, []).append(windows)
+        return {key: pd.concat(windows, ignore_index=True) for key, windows in pooled.items()}
+
+    @staticmethod
+    def failure_counts(runs):
+        """Request and failure counts per (type, name), summed over the runs' final stats"""
+        totals = []
+        for run in runs:
+            stats = pd.read_csv(f"{run.csv_prefix}_stats.csv", na_values=["N/A"])
+            stats["Type"] = stats["Type"].fillna("")
+            totals.append(stats.set_index(["Type", "Name"])[["Request Count", "Failure Count"]])
+        return pd.concat(totals).groupby(level=["Type", "Name"]).sum()
+
+    def statistics(self, windows, weights):
+        """Every comparison metric for each row of weights (resamples x windows)"""
+        requests = weights @ windows["Requests"].to_numpy(dtype="float64")
+        statistics = {"Requests/s": requests / (len(windows) * self.window_seconds)}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if self.exact:
+                histograms = windows["Histogram"]
+                buckets = [bucket for histogram in histograms for bucket in histogram.counts] or [0]
+                first, last = min(buckets), max(buckets)
+                counts = np.zeros((len(histograms), last - first + 1))
+                for row, histogram in enumerate(histograms):
+                    for bucket, count in histogram.counts.items():
+                        counts[row, bucket - first] = count
+                values = np.array([bucket_value(bucket) for bucket in range(first, last + 1)])
+                merged = weights @ counts
+                statistics["Average"] = merged @ values / requests
+                for label, fraction in COMPARISON_PERCENTILES.items():
+                    statistics[label] = matrix_percentiles(merged, values, fraction)
+            else:
+                # Request-weighted means of each window's values
+                window_requests = windows["Requests"].to_numpy(dtype="float64")
+                for label in ["Average", *COMPARISON_PERCENTILES]:
+                    weighted = np.nan_to_num(windows[label].to_numpy(dtype="float64")) * window_requests
+                    statistics[label] = weights @ weighted / requests
+        return statistics
+
+    def resample(self, rng, windows):
+        count = len(windows)
+        return rng.multinomial(count, np.full(count, 1 / count), size=self.iterations).astype("float64")
+
+    def compare_endpoint(self, rng, baseline, candidate):
+        point_baseline = self.statistics(baseline, np.ones((1, len(baseline))))
+        point_candidate = self.statistics(candidate, np.ones((1, len(candidate))))
+        boot_baseline = self.statistics(baseline, self.resample(rng, baseline))
+        boot_candidate = self.statistics(candidate, self.resample(rng, candidate))
+
+        tail = (1 - self.confidence) / 2 * 100
+        row, regressed, improved = {}, [], []
+        for metric in COMPARISON_METRICS:
+            before, after = point_baseline[metric][0], point_candidate[metric][0]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                change = (after - before) / before * 100
+                deltas = (boot_candidate[metric] - boot_baseline[metric]) / boot_baseline[metric] * 100
+            deltas = deltas[np.isfinite(deltas)]
+            low, high = np.percentile(deltas, [tail, 100 - tail]) if len(deltas) else (np.nan, np.nan)
+            row.update({f"{metric} baseline": before, f"{metric} candidate": after,
+                        f"{metric} change %": change, f"{metric} CI low %": low, f"{metric} CI high %": high})
+
+            verdict = metric_verdict(metric, change, low, high, self.tolerance) if metric in self.gate else None
+            if verdict == "regressed":
+                regressed.append(metric)
+            elif verdict == "improved":
+                improved.append(metric)
+        return row, regressed, improved
+
+    def compare(self):
+        """One row per endpoint in either side, with a Status of regressed, improved, no change,
+        too few requests, too few windows, added or removed"""
+        baseline_samples = self.pooled_samples(self.baseline)
+        candidate_samples = self.pooled_samples(self.candidate)
+        baseline_failures = self.failure_counts(self.baseline)
+        candidate_failures = self.failure_counts(self.candidate)
+        rng = np.random.default_rng(self.seed)
+
+        rows = []
+        for key in sorted(baseline_samples.keys() | candidate_samples.keys(), key=lambda key: (key[1] == "Aggregated", key)):
+            baseline, candidate = baseline_samples.get(key), candidate_samples.get(key)
+            row = {"Type": key[0], "Name": key[1],
+                   "Baseline Requests": int(baseline["Requests"].sum()) if baseline is not None else 0,
+                   "Candidate Requests": int(candidate["Requests"].sum()) if candidate is not None else 0,
+                   "Regressed": ""}
+
+            if baseline is None or candidate is None:
+                row["Status"] = "added" if baseline is None else "removed"
+            elif min(row["Baseline Requests"], row["Candidate Requests"]) < self.min_requests:
+                row["Status"] = "too few requests"
+            elif min((baseline["Requests"] > 0).sum(), (candidate["Requests"] > 0).sum()) < self.min_windows:
+                # e.g. Login, only at the start of a run: a one-window bootstrap has a zero-width CI
+                row["Status"] = "too few windows"
+            else:
+                metrics, regressed, improved = self.compare_endpoint(rng, baseline, candidate)
+                row.update(metrics)
+
+                failure_rates = []
+                for failures in (baseline_failures, candidate_failures):
+                    counts = failures.loc[key] if key in failures.index else None
+                    failure_rates.append(counts["Failure Count"] / counts["Request Count"] * 100
+                                         if counts is not None and counts["Request Count"] else 0.0)
+                row["Failure % baseline"], row["Failure % candidate"] = failure_rates
+                if failure_rates[1] - failure_rates[0] > self.max_failure_increase:
+                    regressed.append("Failure %")
+
+                row["Regressed"] = ", ".join(regressed)
+                row["Status"] = "regressed" if regressed else "improved" if improved else "no change"
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def report(self, output=None):
+        """Print the comparison, save it as CSV and return the number of regressed rows"""
+        comparison = self.compare()
+
+        print("\n" + "="*60)
+        print("RUN COMPARISON REPORT")
+        print("="*60)
+        print(f"Baseline:  {', '.join(run.csv_prefix for run in self.baseline)}")
+        print(f"Candidate: {', '.join(run.csv_prefix for run in self.candidate)}")
+        print(f"Latency from {'merged histograms' if self.exact else 'the stats history (approximate percentiles)'}, "
+              f"{self.confidence:.0%} bootstrap CIs over {self.window_seconds}s windows, "
+              f"tolerance {self.tolerance:g}%")
+
+        for _, row in comparison.iterrows():
+            label = f"{row['Type']} {row['Name']}".strip()
+            print(f"\n{label}: {row['Status']}" + (f" ({row['Regressed']})" if row["Regressed"] else ""))
+            if row["Status"] in ("added", "removed", "too few requests", "too few windows"):
+                print(f"  {row['Baseline Requests']} baseline / {row['Candidate Requests']} candidate requests")
+                continue
+            for metric in COMPARISON_METRICS:
+                unit = "" if metric == "Requests/s" else "ms"
+                print(f"  {metric:>10}: {row[f'{metric} baseline']:.2f}{unit} -> {row[f'{metric} candidate']:.2f}{unit} "
+                      f"({row[f'{metric} change %']:+.1f}%, CI {row[f'{metric} CI low %']:+.1f}% .. "
+                      f"{row[f'{metric} CI high %']:+.1f}%)")
+            print(f"  {'Failures':>10}: {row['Failure % baseline']:.2f}% -> {row['Failure % candidate']:.2f}%")
+
+        output = output or f"{self.candidate[-1].csv_prefix}_comparison.csv"
+        comparison.to_csv(output, index=False)
+        print(f"\nComparison saved as {output}")
+
+        regressions = int((comparison["Status"] == "regressed").sum()) if not comparison.empty else 0
+        print(f"Regressed: {regressions}")
+        return regressions
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyze Locust load test results")
     parser.add_argument("csv_prefix", help="Prefix of CSV files to analyze (e.g., 'results_medium_20231201_143000')")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the Parquet history cache")
+    parser.add_argument("--window", default="10s", help="Time bucket for the time series, e.g. 10s, 1min, 5min")
+    parser.add_argument("--capacity", action="store_true",
+                        help="Estimate the saturation point and capacity of a ramp-up run (e.g. the stress scenario)")
+    parser.add_argument("--slo-p95", type=float, default=DEFAULT_SLO_P95, help="p95 SLO in ms for --capacity")
+
+    compare = parser.add_argument_group("compare mode", "Compare csv_prefix (the candidate) against a baseline. "
+                                        "Both may be a prefix, a glob pattern of prefixes or a directory; "
+                                        "several runs on one side are pooled")
+    compare.add_argument("--baseline", help="Baseline run(s) to compare against")
+    compare.add_argument("--compare", action="store_true",
+                         help="Without --baseline: compare the newest run in csv_prefix with the earlier ones")
+    compare.add_argument("--budget", type=int, default=0, help="Regressed endpoints allowed before exiting with status 1")
+    compare.add_argument("--tolerance", type=float, default=5.0, help="Changes smaller than this (in %%) never count as regressions")
+    compare.add_argument("--gate", nargs="+", choices=COMPARISON_METRICS, default=["95%", "Requests/s"],
+                         help="Metrics that can make an endpoint regress")
+    compare.add_argument("--max-failure-increase", type=float, default=1.0,
+                         help="Failure rate increase, in percentage points, that counts as a regression")
+    compare.add_argument("--min-requests", type=int, default=50, help="Requests each side needs for an endpoint to be judged")
+    compare.add_argument("--min-windows", type=int, default=MIN_COMPARISON_WINDOWS,
+                         help="Time windows each side needs for an endpoint to be judged")
+    compare.add_argument("--bootstrap", type=int, default=2000, help="Bootstrap resamples")
+    compare.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals")
+    compare.add_argument("--output", help="Comparison CSV (default: <candidate>_comparison.csv)")
 
     args = parser.parse_args()
 
-    analyzer = LoadTestAnalyzer(args.csv_prefix)
-    analyzer.analyze()
+    if args.baseline or args.compare:
+        candidate = find_runs(args.csv_prefix)
+        baseline = find_runs(args.baseline) if args.baseline else candidate[:-1]
+        if not args.baseline:
+            candidate = candidate[-1:]
+        if not baseline or not candidate:
+            sys.exit(f"Need at least one baseline and one candidate run, found {len(baseline)} and {len(candidate)}")
+
+        comparison = RunComparison(baseline, candidate, window=args.window, gate=args.gate, tolerance=args.tolerance,
+                                   max_failure_increase=args.max_failure_increase, min_requests=args.min_requests,
+                                   min_windows=args.min_windows, iterations=args.bootstrap, confidence=args.confidence, use_cache=not args.no_cache)
+        sys.exit(1 if comparison.report(args.output) > args.budget else 0)
+
+    analyzer = LoadTestAnalyzer(args.csv_prefix, use_cache=not args.no_cache)
+    analyzer.analyze(args.window, args.capacity, args.slo_p95)
@@ -0,0 +1,113 @@
+# ============================================================================
+# arrival_rate.py - Open-model load: fixed arrival rate with coordinated-omission correction
+# ============================================================================
+#
+# The regular user classes are closed-loop: a user only sends its next request
+# once the previous one returned and its wait_time passed, so a slow Odoo
+# quietly lowers the offered load. Here every OdooArrivalRateUser starts tasks
+# from the OdooLoadTest mix as a Poisson process at --arrival-rate per second,
+# no matter how many are still in flight.
+#
+# Each request is reported twice:
+#   POST/GET <name>  - service time, measured from when the request was sent
+#   INTENDED <name>  - corrected latency, measured from when the task was due
+#
+# Run with:
+# locust -f arrival_rate.py --host=https://your-odoo-domain.com -u 10 -r 10 -t 300s --arrival-rate 2
+
+import logging
+import random
+import time
+
+import gevent
+from gevent.pool import Pool
+from locust import events
+
+import odoo_load_test
+
+logger = logging.getLogger(__name__)
+
+INTENDED_REQUEST_TYPE = "INTENDED"
+
+_environment = None
+
+
+@events.init_command_line_parser.add_listener
+def add_arrival_rate_arguments(parser):
+    parser.add_argument("--arrival-rate", type=float, default=1.0,
+                        help="Tasks per second each OdooArrivalRateUser starts, regardless of response times")
+
+
+@events.init.add_listener
+def remember_environment(environment, **kwargs):
+    global _environment
+    _environment = environment
+
+
+@events.request.add_listener
+def record_intended_latency(request_type, name, response_time, start_time=None, **kwargs):
+    """Log the latency since the intended start for requests made by a scheduled task"""
+    intended_start = getattr(gevent.getcurrent(), "intended_start", None)
+    if intended_start is None or start_time is None or _environment is None:
+        return
+
+    corrected = (start_time - intended_start) * 1000 + response_time
+    # Straight into the entry, so the Aggregated row still only counts real requests
+    _environment.stats.get(name, INTENDED_REQUEST_TYPE).log(corrected, 0)
+
+
+class OdooArrivalRateUser(odoo_load_test.OdooLoadTest):
+    """Runs the OdooLoadTest task mix as an open model at a fixed arrival rate"""
+
+    # Weighted task list to sample from; locust repeats each task by its weight
+    task_mix = list(odoo_load_test.OdooLoadTest.tasks)
+    max_in_flight = 500
+    # FastHttpUser's per-session connection limit; arrivals mustn't queue behind it
+    concurrency = max_in_flight
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = Pool(self.max_in_flight)
+
+    def arrival_rate(self):
+        options = self.environment.parsed_options
+        return options.arrival_rate if options is not None else 1.0
+
+    def schedule_arrivals(self):
+        """Start a task at every arrival of a Poisson process, without waiting for earlier ones"""
+        rate = self.arrival_rate()
+        intended_start = time.time()
+
+        while True:
+            intended_start += random.expovariate(rate)
+            delay = intended_start - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+
+            task = random.choice(self.task_mix)
+            if self.in_flight.full():
+                self.environment.events.request.fire(
+                    request_type="ARRIVAL",
+                    name="Dropped Arrival",
+                    response_time=0,
+                    response_length=0,
+                    exception=Exception(f"{self.max_in_flight} tasks already in flight"),
+                    context={}
+                )
+                continue
+
+            self.in_flight.spawn(self.run_arrival, task, intended_start)
+
+    def run_arrival(self, task, intended_start):
+        gevent.getcurrent().intended_start = intended_start
+        try:
+            task(self)
+        except Exception as e:
+            logger.error(f"Error in {task.__name__}: {e}")
+
+    def on_stop(self):
+        self.in_flight.kill(block=False)
+
+
+# Only the scheduler runs as a locust task; the OdooLoadTest tasks are what it schedules
+OdooArrivalRateUser.tasks = [OdooArrivalRateUser.schedule_arrivals]
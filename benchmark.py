@@ -0,0 +1,399 @@
+# ============================================================================
+# benchmark.py - Measure the load generator itself against a local stub server
+# ============================================================================
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+import timeit
+
+from stub_server import StubServerProcess
+
+
+def run_in_worker(stub, engine, users, duration, user_class="odoo_load_test:OdooLoadTest"):
+    """Run one measurement in a fresh process, so engines and classes don't share state"""
+    cmd = [sys.executable, __file__, "worker",
+           "--engine", engine,
+           "--user-class", user_class,
+           "--host", stub.url,
+           "--users", str(users),
+           "--duration", str(duration)]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_worker(engine, user_class, host, users, duration):
+    """Drive one user class with no think time on one engine and print the result as JSON"""
+    os.environ["ODOO_LOCUST_ENGINE"] = engine
+
+    import gevent
+    import importlib
+    import logging
+    import psutil
+    from locust import constant
+    from locust.env import Environment
+
+    # Per-request INFO logging would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+
+    module_name, class_name = user_class.split(":")
+    base = getattr(importlib.import_module(module_name), class_name)
+    benchmark_user = type(class_name, (base,), {"wait_time": constant(0)})
+
+    process = psutil.Process()
+    env = Environment(user_classes=[benchmark_user], host=host)
+    runner = env.create_local_runner()
+    rss_before = process.memory_info().rss
+    runner.start(users, spawn_rate=users)
+    gevent.sleep(2)  # let every user finish logging in
+    rss_after = process.memory_info().rss
+
+    requests_start = env.stats.total.num_requests
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    gevent.sleep(duration)
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+    requests = env.stats.total.num_requests - requests_start
+
+    runner.quit()
+
+    print(json.dumps({
+        "engine": engine,
+        "user_class": user_class,
+        "requests": requests,
+        "failures": env.stats.total.num_failures,
+        "requests_per_second": requests / wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "requests_per_core": requests / cpu_seconds if cpu_seconds else 0.0,
+        "cpu_ms_per_request": cpu_seconds * 1000 / requests if requests else 0.0,
+        "memory_kb_per_user": (rss_after - rss_before) / 1024 / users,
+    }))
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes
+
+    VmHWM starts over at exec, unlike ru_maxrss, which a worker would inherit
+    from the parent that forked it.
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class EngineBenchmark:
+    """Compare requests/s per core of the HttpUser and FastHttpUser engines"""
+
+    engines = ["http", "fast"]
+
+    def __init__(self, users=20, duration=20, port=8069):
+        self.users = users
+        self.duration = duration
+        self.port = port
+
+    def run(self):
+        """Benchmark every engine, each in its own process, against one stub"""
+        results = {}
+        with StubServerProcess(port=self.port) as stub:
+            for engine in self.engines:
+                print(f"Benchmarking '{engine}' engine: {self.users} users for {self.duration}s...")
+                results[engine] = run_in_worker(stub, engine, self.users, self.duration)
+
+        self.print_report(results)
+        return results
+
+    @staticmethod
+    def print_report(results):
+        print("\n" + "="*60)
+        print("ENGINE BENCHMARK")
+        print("="*60)
+        print(f"{'Engine':<8}{'Requests':>12}{'Req/s':>12}{'CPU s':>10}{'Req/s/core':>14}")
+        for engine, result in results.items():
+            print(f"{engine:<8}{result['requests']:>12,}{result['requests_per_second']:>12.1f}"
+                  f"{result['cpu_seconds']:>10.2f}{result['requests_per_core']:>14.1f}")
+
+        if results.get("http", {}).get("requests_per_core"):
+            speedup = results["fast"]["requests_per_core"] / results["http"]["requests_per_core"]
+            print(f"\nfast/http speedup per core: {speedup:.2f}x")
+
+
+class UserClassBenchmark:
+    """Generator cost of each user class: sustained req/s, CPU per request and memory per user
+
+    Users run with no think time against a zero-latency stub, so the single
+    generator process is the bottleneck and the req/s is the most one core can
+    sustain for that task mix.
+    """
+
+    user_classes = [
+        "odoo_load_test:OdooLoadTest",
+        "odoo_load_test:HeavyUser",
+        "odoo_load_test:LightUser",
+        "advanced_load_test:ReportsUser",
+    ]
+
+    def __init__(self, engine="fast", users=50, duration=20, port=8069, stub_args=()):
+        self.engine = engine
+        self.users = users
+        self.duration = duration
+        self.port = port
+        self.stub_args = stub_args
+
+    def run(self):
+        results = {}
+        with StubServerProcess(port=self.port, extra_args=self.stub_args) as stub:
+            for user_class in self.user_classes:
+                print(f"Benchmarking {user_class}: {self.users} users for {self.duration}s on '{self.engine}'...")
+                results[user_class] = run_in_worker(stub, self.engine, self.users, self.duration, user_class)
+
+        self.print_report(results)
+        return results
+
+    @staticmethod
+    def print_report(results):
+        print("\n" + "="*60)
+        print("USER CLASS BENCHMARK")
+        print("="*60)
+        print(f"{'User class':<34}{'Req/s':>10}{'CPU ms/req':>12}{'KB/user':>10}{'Failures':>10}")
+        for user_class, result in results.items():
+            print(f"{user_class:<34}{result['requests_per_second']:>10.1f}{result['cpu_ms_per_request']:>12.3f}"
+                  f"{result['memory_kb_per_user']:>10.1f}{result['failures']:>10,}")
+
+
+class PayloadBenchmark:
+    """Encode cost per call_kw call: per-call dict + json.dumps versus compiled templates"""
+
+    def __init__(self, number=100000):
+        self.number = number
+
+    @staticmethod
+    def cases():
+        """(name, build-the-dict-and-dump, compiled template) for representative tasks"""
+        import odoo_load_test as olt
+
+        partner = {
+            "name": "Test Customer 4321",
+            "email": "test4321@example.com",
+            "phone": "+1-555-4321",
+            "is_company": True,
+            "street": "123 Test Street",
+            "zip": "12345"
+        }
+
+        def dict_fetch_partners():
+            return json.dumps({
+                "jsonrpc": "2.0",
+                "method": "call",
+                "params": {
+                    "model": "res.partner",
+                    "method": "search_read",
+                    "args": [[]],
+                    "kwargs": {
+                        "fields": ["name", "email", "phone", "is_company"],
+                        "limit": 50,
+                        "offset": 42
+                    }
+                },
+                "id": 123456
+            }).encode()
+
+        def dict_create_partner():
+            return json.dumps({
+                "jsonrpc": "2.0",
+                "method": "call",
+                "params": {
+                    "model": "res.partner",
+                    "method": "create",
+                    "args": [dict(partner, city="Test City")],
+                    "kwargs": {}
+                },
+                "id": 123456
+            }).encode()
+
+        def dict_heavy_load():
+            return json.dumps({
+                "jsonrpc": "2.0",
+                "method": "call",
+                "params": {
+                    "model": "res.partner",
+                    "method": "search_read",
+                    "args": [[]],
+                    "kwargs": {
+                        "fields": ["name", "email", "phone", "street", "city", "country_id"],
+                        "limit": 200
+                    }
+                },
+                "id": 123456
+            }).encode()
+
+        return [
+            ("Fetch Partners Data", dict_fetch_partners, lambda: olt.FETCH_PARTNERS.encode(offset=42)),
+            ("Create Partner", dict_create_partner, lambda: olt.CREATE_PARTNER.encode(**partner)),
+            ("Heavy Data Load", dict_heavy_load, lambda: olt.HEAVY_PARTNER_LOAD.encode()),
+        ]
+
+    def run(self):
+        print("\n" + "="*60)
+        print("PAYLOAD ENCODE BENCHMARK (microseconds per call)")
+        print("="*60)
+        print(f"{'Call':<22}{'dict+dumps':>12}{'template':>12}{'speedup':>10}")
+        for name, before, after in self.cases():
+            before_us = timeit.timeit(before, number=self.number) / self.number * 1e6
+            after_us = timeit.timeit(after, number=self.number) / self.number * 1e6
+            print(f"{name:<22}{before_us:>12.2f}{after_us:>12.2f}{before_us / after_us:>9.1f}x")
+
+
+class HistoryBenchmark:
+    """Time and peak memory of loading a synthetic stats history, old loader versus new"""
+
+    methods = ["naive", "typed", "summary", "parquet"]
+
+    def __init__(self, rows=5_000_000, directory="."):
+        self.rows = rows
+        self.prefix = os.path.join(directory, f"synthetic_{rows}")
+
+    def generate(self):
+        """A stats history shaped like locust's: an Aggregated row plus 40 endpoints per second"""
+        import numpy as np
+        import pandas as pd
+        from analysis import HISTORY_PERCENTILES
+
+        path = f"{self.prefix}_stats_history.csv"
+        if os.path.exists(path):
+            return path
+
+        print(f"Generating {self.rows:,} history rows in {path}...")
+        rng = np.random.default_rng(42)
+        names = ["Aggregated"] + [f"Endpoint {i}" for i in range(40)]
+        seconds = -(-self.rows // len(names))
+        history = pd.DataFrame({
+            "Timestamp": np.repeat(1_756_100_000 + np.arange(seconds), len(names))[:self.rows],
+            "User Count": np.repeat(np.minimum(np.arange(seconds) // 10, 500), len(names))[:self.rows],
+            "Type": np.tile([""] + ["POST"] * 40, seconds)[:self.rows],
+            "Name": np.tile(names, seconds)[:self.rows],
+            "Requests/s": rng.gamma(2.0, 5.0, self.rows).round(6),
+            "Failures/s": rng.exponential(0.05, self.rows).round(6),
+        })
+        base = rng.lognormal(5, 0.6, self.rows)
+        missing = rng.random(self.rows) < 0.05
+        for i, percentile in enumerate(HISTORY_PERCENTILES):
+            history[percentile] = pd.array((base * (1 + i * 0.3)).round(-1), dtype="Int64")
+            history.loc[missing, percentile] = pd.NA
+        history["Total Request Count"] = np.arange(self.rows)
+        history["Total Failure Count"] = np.arange(self.rows) // 100
+        history["Total Median Response Time"] = base.round(-1).astype(int)
+        history["Total Average Response Time"] = base.round(3)
+        history["Total Min Response Time"] = 1
+        history["Total Max Response Time"] = (base * 5).astype(int)
+        history["Total Average Content Size"] = 2048
+        history.to_csv(path, index=False, na_rep="N/A")
+        return path
+
+    def run(self):
+        self.generate()
+        results = {}
+        for method in self.methods:
+            print(f"Benchmarking '{method}' history loading...")
+            cmd = [sys.executable, __file__, "history-worker", "--method", method, "--prefix", self.prefix]
+            output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results[method] = json.loads(output.strip().splitlines()[-1])
+
+        self.print_report(results)
+        return results
+
+    @staticmethod
+    def print_report(results):
+        print("\n" + "="*60)
+        print("STATS HISTORY LOADING BENCHMARK")
+        print("="*60)
+        print(f"{'Method':<10}{'Rows':>12}{'Seconds':>10}{'Peak RSS MB':>14}{'Frame MB':>10}")
+        for method, result in results.items():
+            print(f"{method:<10}{result['rows']:>12,}{result['seconds']:>10.2f}"
+                  f"{result['peak_rss_mb']:>14.0f}{result['frame_mb']:>10.0f}")
+
+    @staticmethod
+    def run_worker(method, prefix):
+        """Load the history one way in a fresh process and print time and peak memory as JSON"""
+        import pandas as pd
+        from analysis import LoadTestAnalyzer
+
+        analyzer = LoadTestAnalyzer(prefix, use_cache=method == "parquet")
+        if method == "parquet" and not os.path.exists(analyzer.history_cache_path):
+            analyzer.load_history()  # build the sidecar; only the cached load is timed
+
+        started = time.perf_counter()
+        if method == "naive":
+            # What load_data did before: inferred dtypes, "N/A" as strings
+            frame = pd.read_csv(analyzer.history_path)
+            frame["Timestamp"] = pd.to_datetime(frame["Timestamp"])
+        elif method == "summary":
+            frame = analyzer.summarize_history()
+        else:
+            frame = analyzer.load_history()
+        seconds = time.perf_counter() - started
+
+        print(json.dumps({
+            "method": method,
+            "rows": len(frame),
+            "seconds": seconds,
+            "peak_rss_mb": peak_rss() / 1e6,
+            "frame_mb": frame.memory_usage(deep=True).sum() / 1e6,
+        }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    engines_parser = subparsers.add_parser("engines", help="Requests/s per core of each HTTP engine")
+    engines_parser.add_argument("--users", type=int, default=20, help="Concurrent users per engine")
+    engines_parser.add_argument("--duration", type=int, default=20, help="Measured seconds per engine")
+    engines_parser.add_argument("--port", type=int, default=8069, help="Port for the stub server")
+
+    users_parser = subparsers.add_parser("users", help="Req/s, CPU per request and memory per user of each user class")
+    users_parser.add_argument("--engine", default="fast", choices=EngineBenchmark.engines)
+    users_parser.add_argument("--users", type=int, default=50, help="Concurrent users per class")
+    users_parser.add_argument("--duration", type=int, default=20, help="Measured seconds per class")
+    users_parser.add_argument("--port", type=int, default=8069, help="Port for the stub server")
+    users_parser.add_argument("--stub-args", default="",
+                              help='Extra stub_server.py options, e.g. "--latency lognormal:50:0.5"')
+
+    payloads_parser = subparsers.add_parser("payloads", help="Encode cost per JSON-RPC call")
+    payloads_parser.add_argument("--number", type=int, default=100000, help="Calls timed per case")
+
+    history_parser = subparsers.add_parser("history", help="Loading a large stats history in analysis.py")
+    history_parser.add_argument("--rows", type=int, default=5_000_000, help="Rows of synthetic history")
+    history_parser.add_argument("--directory", default=".", help="Where the synthetic history is written")
+
+    history_worker_parser = subparsers.add_parser("history-worker")
+    history_worker_parser.add_argument("--method", required=True, choices=HistoryBenchmark.methods)
+    history_worker_parser.add_argument("--prefix", required=True)
+
+    worker_parser = subparsers.add_parser("worker")
+    worker_parser.add_argument("--engine", required=True, choices=EngineBenchmark.engines)
+    worker_parser.add_argument("--user-class", required=True, help="module:Class")
+    worker_parser.add_argument("--host", required=True)
+    worker_parser.add_argument("--users", type=int, required=True)
+    worker_parser.add_argument("--duration", type=int, required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "engines":
+        EngineBenchmark(args.users, args.duration, args.port).run()
+    elif args.command == "users":
+        UserClassBenchmark(args.engine, args.users, args.duration, args.port, shlex.split(args.stub_args)).run()
+    elif args.command == "payloads":
+        PayloadBenchmark(args.number).run()
+    elif args.command == "history":
+        HistoryBenchmark(args.rows, args.directory).run()
+    elif args.command == "history-worker":
+        HistoryBenchmark.run_worker(args.method, args.prefix)
+    elif args.command == "worker":
+        run_worker(args.engine, args.user_class, args.host, args.users, args.duration)
@@ -0,0 +1,211 @@
+# ============================================================================
+# breaking_point.py - Search for the most users Odoo serves within its SLOs
+# ============================================================================
+#
+# One continuous run of the OdooLoadTest users, driven by a LoadTestShape that
+# searches for the breaking point: the user count doubles from
+# --search-start-users until a level breaches the SLOs (or --search-max-users
+# is reached), then a binary search between the last passing and the first
+# failing level narrows it down to --search-resolution users.
+#
+# At every level the shape waits --search-settle seconds after the users are
+# running, then measures windows of --search-window seconds from locust's live
+# stats (the master's, in distributed runs). A level fails as soon as one window
+# breaches --slo-p95 or --slo-error-rate, and passes once p95 stops rising: by
+# no more than 20% (or 10% of the SLO) from one window to the next. A level
+# whose latency is still climbing after --search-max-windows fails too.
+#
+# The highest passing level and every measured window are logged and written
+# to <csv prefix>_breaking_point.json (breaking_point.json without --csv).
+#
+# Run with:
+# locust -f breaking_point.py --host=https://your-odoo-domain.com --headless --csv results_search --slo-p95 2000
+
+import json
+import logging
+import time
+
+from locust import LoadTestShape, events
+
+from guardrails import Snapshot, window_percentile
+# The same user mix as running odoo_load_test.py
+from odoo_load_test import HeavyUser, LightUser, OdooLoadTest  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+STEADY_TOLERANCE = 0.2
+STEADY_SLO_SHARE = 0.1
+
+_search = None
+
+
+@events.init_command_line_parser.add_listener
+def add_search_arguments(parser):
+    parser.add_argument("--slo-p95", type=float, default=2000, help="95th percentile a passing level stays under, in ms")
+    parser.add_argument("--slo-error-rate", type=float, default=1.0, help="Failure percentage a passing level stays under")
+    parser.add_argument("--search-start-users", type=int, default=10, help="First load level of the search")
+    parser.add_argument("--search-max-users", type=int, default=1000, help="Highest load level the search tries")
+    parser.add_argument("--search-resolution", type=int, default=5,
+                        help="Stop once the passing and failing levels are this many users apart")
+    parser.add_argument("--search-spawn-rate", type=float, default=10, help="Users started or stopped per second")
+    parser.add_argument("--search-settle", type=float, default=10,
+                        help="Seconds at a level before measuring, locust's percentiles trail changes by ~10s")
+    parser.add_argument("--search-window", type=float, default=30, help="Seconds per measurement window")
+    parser.add_argument("--search-max-windows", type=int, default=6,
+                        help="Windows a level gets for its p95 to stop rising")
+
+
+class BreakingPointSearch:
+    """Exponential, then binary search for the highest user count within the SLOs"""
+
+    def __init__(self, slo_p95=2000, slo_error_rate=1.0, start_users=10, max_users=1000, resolution=5,
+                 settle=10, window=30, max_windows=6):
+        self.slo_p95 = slo_p95
+        self.slo_error_rate = slo_error_rate
+        self.max_users = max_users
+        self.resolution = resolution
+        self.settle = settle
+        self.window = window
+        self.max_windows = max_windows
+        self.passing = None
+        self.failing = None
+        self.steps = []
+        self.finished = False
+        self._start_step(min(start_users, max_users))
+
+    def _start_step(self, users):
+        self.step = {"users": users, "verdict": None, "reason": None, "windows": []}
+        self.steps.append(self.step)
+        self._running_since = None
+        self._snapshot = None
+
+    def measure(self, stats, now):
+        """Close the current window: throughput, p95 and error rate since the last snapshot"""
+        total = stats.total
+        snapshot = Snapshot(total, now)
+        requests = snapshot.requests - self._snapshot.requests
+        failures = snapshot.failures - self._snapshot.failures
+        window = {
+            "seconds": round(now - self._snapshot.at, 1),
+            "requests": requests,
+            "requests_per_s": requests / (now - self._snapshot.at),
+            "p95": window_percentile(self._snapshot.response_times, snapshot.response_times, 0.95),
+            "error_rate": failures / requests * 100 if requests else 0.0,
+        }
+        self._snapshot = snapshot
+        return window
+
+    def steady(self):
+        windows = self.step["windows"]
+        if len(windows) < 2 or windows[-1]["p95"] is None or windows[-2]["p95"] is None:
+            return False
+        # Latency that drops or holds is steady; only a climbing p95 means a queue is still growing
+        rise = windows[-1]["p95"] - windows[-2]["p95"]
+        return rise <= max(STEADY_TOLERANCE * windows[-2]["p95"], STEADY_SLO_SHARE * self.slo_p95)
+
+    def update(self, stats, user_count, now=None):
+        """Advance the search; returns the user count to run, or None once it is done"""
+        if self.finished:
+            return None
+        now = time.monotonic() if now is None else now
+        users = self.step["users"]
+
+        if self._running_since is None:
+            if user_count == users:
+                self._running_since = now
+            return users
+        if self._snapshot is None:
+            if now - self._running_since >= self.settle:
+                self._snapshot = Snapshot(stats.total, now)
+            return users
+        if now - self._snapshot.at < self.window:
+            return users
+
+        window = self.measure(stats, now)
+        self.step["windows"].append(window)
+        logger.info(f"{users} users: p95 {window['p95']}ms, {window['error_rate']:.2f}% errors, "
+                    f"{window['requests_per_s']:.1f} req/s")
+
+        if window["p95"] is not None and window["p95"] > self.slo_p95:
+            self._conclude(False, f"p95 {window['p95']}ms over {self.slo_p95:g}ms")
+        elif window["error_rate"] > self.slo_error_rate:
+            self._conclude(False, f"{window['error_rate']:.2f}% errors over {self.slo_error_rate:g}%")
+        elif self.steady():
+            self._conclude(True, "steady within the SLOs")
+        elif len(self.step["windows"]) >= self.max_windows:
+            self._conclude(False, f"no steady state after {self.max_windows} windows")
+        return None if self.finished else self.step["users"]
+
+    def _conclude(self, passed, reason):
+        users = self.step["users"]
+        self.step["verdict"] = "pass" if passed else "fail"
+        self.step["reason"] = reason
+        logger.info(f"{users} users: {self.step['verdict']}, {reason}")
+
+        if passed:
+            self.passing = users
+        else:
+            self.failing = users
+
+        if self.failing is None:
+            if users >= self.max_users:
+                self.finished = True
+                return
+            next_users = min(users * 2, self.max_users)
+        else:
+            low = self.passing or 0
+            if self.failing - low <= self.resolution:
+                self.finished = True
+                return
+            next_users = (low + self.failing) // 2
+            if next_users <= 0:
+                self.finished = True
+                return
+        self._start_step(next_users)
+
+    def report(self):
+        return {
+            "highest_passing_users": self.passing,
+            "lowest_failing_users": self.failing,
+            "finished": self.finished,
+            "slo": {"p95_ms": self.slo_p95, "error_rate_percent": self.slo_error_rate},
+            "steps": self.steps,
+        }
+
+
+class BreakingPointShape(LoadTestShape):
+    """Runs the users as BreakingPointSearch decides, and stops when it has an answer"""
+
+    def tick(self):
+        global _search
+        options = self.runner.environment.parsed_options
+        if _search is None:
+            _search = BreakingPointSearch(options.slo_p95, options.slo_error_rate, options.search_start_users,
+                                          options.search_max_users, options.search_resolution,
+                                          options.search_settle, options.search_window, options.search_max_windows)
+        users = _search.update(self.runner.stats, self.get_current_user_count())
+        return (users, options.search_spawn_rate) if users is not None else None
+
+
+@events.test_stop.add_listener
+def report_breaking_point(environment, **kwargs):
+    global _search
+    if _search is None:
+        return
+    report = _search.report()
+    _search = None
+
+    if report["highest_passing_users"] is not None:
+        logger.info(f"Breaking point search: {report['highest_passing_users']} users pass the SLOs"
+                    + (f", {report['lowest_failing_users']} don't" if report["lowest_failing_users"] else
+                       ", the highest level tried"))
+    else:
+        logger.info("Breaking point search: no load level passed the SLOs")
+    if not report["finished"]:
+        logger.info("Breaking point search was stopped before it converged")
+
+    prefix = getattr(environment.parsed_options, "csv_prefix", None)
+    path = f"{prefix}_breaking_point.json" if prefix else "breaking_point.json"
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Breaking point evidence saved as {path}")
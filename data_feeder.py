@@ -0,0 +1,256 @@
+# ============================================================================
+# data_feeder.py - Hand generated dataset records to the create tasks
+# ============================================================================
+#
+# ODOO_LOCUST_FEEDS maps models to datasets written by test_data_generator.py:
+#
+#   {"res.partner": "partners.parquet", "product.template": "products.jsonl"}
+#
+# Every record is handed out once: the users of a worker take turns on one
+# feed per model, and in distributed runs each worker keeps every count-th row
+# of the dataset from its partition (see partitioning.py), so no two workers
+# create the same record. Parquet is read memory-mapped and JSONL streamed, a
+# batch of rows at a time; nothing is loaded whole.
+#
+# ODOO_LOCUST_FEED_EXHAUSTED says what happens once a worker's share is used up:
+#   wrap        start over from the worker's first row (records repeat)
+#   stop        stop the run, the master's in distributed runs
+#   regenerate  generate new rows numbered past the end of the dataset, unique
+#               per worker; with ODOO_LOCUST_FEED_SEED set to the seed printed
+#               by generate they are the rows a bigger dataset would have had.
+#               References come from .odoo_reference_ids.json for the host.
+#               Generating runs on gevent's OS threads, off the users' event loop
+#
+# A worker whose partition has no rows at all (more workers than rows) logs it
+# and its users create synthetic records, whatever the policy.
+
+import json
+import logging
+import os
+
+import gevent
+from gevent.lock import Semaphore
+from locust import events
+from locust.runners import STATE_STOPPED, STATE_STOPPING, WorkerRunner
+
+from partitioning import PARTITION
+
+logger = logging.getLogger(__name__)
+
+EXHAUSTED_POLICIES = ("wrap", "stop", "regenerate")
+FEED_BATCH = 1000
+KINDS = {"res.partner": "partners", "product.template": "products"}
+
+_environment = None
+
+
+def partition_batches(path, index, count, batch_size=FEED_BATCH):
+    """Lists of the records of rows index, index + count, ... of a JSONL or Parquet dataset"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        row = 0
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size):
+            first = (index - row) % count
+            row += len(batch)
+            if first < len(batch):
+                yield batch.take(list(range(first, len(batch), count))).to_pylist()
+    elif path.endswith(".jsonl"):
+        batch = []
+        with open(path, "rb") as f:
+            for row, line in enumerate(f):
+                # The other workers' lines aren't even parsed
+                if row % count == index:
+                    batch.append(json.loads(line))
+                    if len(batch) == batch_size:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
+    else:
+        raise ValueError(f"Unknown dataset format of '{path}', expected .jsonl or .parquet")
+
+
+def dataset_rows(path):
+    """Number of rows of a JSONL or Parquet dataset"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path, memory_map=True).metadata.num_rows
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def cached_references(host):
+    """Reference ids test_data_generator.py cached for the host, or none"""
+    from test_data_generator import REFERENCE_CACHE
+
+    if not host or not os.path.exists(REFERENCE_CACHE):
+        return {}
+    with open(REFERENCE_CACHE) as f:
+        return json.load(f).get(host, {})
+
+
+# The generator keeps its value pools in module state, so feeds take turns generating
+_generating = Semaphore()
+
+
+class Regenerator:
+    """New records of one kind, BLOCK_ROWS at a time, numbered past the end of a dataset"""
+
+    def __init__(self, model, seed=None):
+        import test_data_generator as generator
+
+        self.generator = generator
+        self.kind = KINDS[model]
+        self.seed = generator.random_seed() if seed is None else seed
+        # Thousands of Faker calls, made once when the feed is created rather than mid-run
+        self.pools = generator.build_pools(self.kind, self.seed)
+        self.references = {}
+        self.block = None
+        self.count = 1
+
+    def start(self, first_row, index, count, references):
+        """Continue with blocks index, index + count, ... of those after first_row"""
+        self.block = -(-first_row // self.generator.BLOCK_ROWS) + index
+        self.count = count
+        self.references = references
+
+    def _generate(self, block):
+        self.generator.use_values(self.pools, self.references)
+        return self.generator.to_records([self.generator.generate_shard(
+            self.kind, block * self.generator.BLOCK_ROWS, self.generator.BLOCK_ROWS, self.seed)])
+
+    def next_batch(self):
+        """The next block's records, generated on gevent's OS threads while the users keep running"""
+        with _generating:
+            records = gevent.get_hub().threadpool.apply(self._generate, (self.block,))
+        self.block += self.count
+        return records
+
+
+class DataFeed:
+    """Records of one dataset, each handed out once per pass, from this worker's share of the rows"""
+
+    def __init__(self, model, path, exhausted="wrap", seed=None):
+        if exhausted not in EXHAUSTED_POLICIES:
+            raise ValueError(f"Unknown feed policy '{exhausted}', expected one of {list(EXHAUSTED_POLICIES)}")
+        if model not in KINDS:
+            raise ValueError(f"No dataset kind for '{model}', expected one of {list(KINDS)}")
+        if not os.path.exists(path):
+            raise ValueError(f"Dataset '{path}' of {model} not found")
+        self.model = model
+        self.path = path
+        self.exhausted = exhausted
+        self.regenerator = Regenerator(model, seed) if exhausted == "regenerate" else None
+        self.regenerating = False
+        self.handed_out = 0
+        self.stopped = False
+        self.empty = False
+        self._buffer = []
+        self._batches = None
+        self._partition = None
+        self._pass_rows = 0
+        self._lock = Semaphore()
+
+    def _open(self):
+        """Start at this worker's first row, of its current partition"""
+        self._partition = (PARTITION.index, PARTITION.count)
+        self._batches = partition_batches(self.path, *self._partition)
+        self._buffer = []
+        self._pass_rows = 0
+        self.regenerating = False
+        self.stopped = False
+        self.empty = False
+
+    def _refill(self):
+        """Read the next batch of this worker's rows, applying the policy when there are none left"""
+        if self.regenerating:
+            self._buffer = self.regenerator.next_batch()[::-1]
+            return
+        for batch in self._batches:
+            # Reversed, so records are popped from the end in dataset order
+            self._buffer = batch[::-1]
+            self._pass_rows += len(batch)
+            return
+
+        if self.exhausted == "regenerate":
+            logger.info(f"{self.model} feed used up after {self.handed_out} records, generating new ones")
+            host = _environment.host if _environment is not None else None
+            threadpool = gevent.get_hub().threadpool
+            self.regenerator.start(threadpool.apply(dataset_rows, (self.path,)), *self._partition,
+                                   threadpool.apply(cached_references, (host,)))
+            self.regenerating = True
+            self._buffer = self.regenerator.next_batch()[::-1]
+        elif not self._pass_rows:
+            # More workers than rows: nothing to hand out here, but no reason to stop the others
+            logger.warning(f"{self.model} feed has no rows for partition {self._partition[0]} of "
+                           f"{self._partition[1]}, creating synthetic records instead")
+            self.empty = True
+        elif self.exhausted == "wrap":
+            logger.info(f"{self.model} feed used up after {self.handed_out} records, starting over")
+            self._open()
+            self._refill()
+        else:
+            logger.info(f"{self.model} feed used up after {self.handed_out} records")
+            self.stopped = True
+            stop_run(f"{self.model} feed used up after {self.handed_out} records")
+
+    def next(self):
+        """The next unused record, or None once the feed is stopped or has no rows for this worker"""
+        if self._partition != (PARTITION.index, PARTITION.count):
+            # A new run split the workers differently, the rows left belong to others now
+            with self._lock:
+                if self._partition != (PARTITION.index, PARTITION.count):
+                    self._open()
+        if not self._buffer:
+            # One user reads the next batch while the others wait for it
+            with self._lock:
+                if not self._buffer and not self.stopped and not self.empty:
+                    self._refill()
+            if not self._buffer:
+                return None
+        self.handed_out += 1
+        return self._buffer.pop()
+
+
+def load_feeds(config=None):
+    """DataFeeds by model from ODOO_LOCUST_FEEDS (JSON or a JSON file), empty when none are set"""
+    if config is None:
+        config = os.environ.get("ODOO_LOCUST_FEEDS", "")
+    if not config:
+        return {}
+    if not config.lstrip().startswith("{"):
+        with open(config) as f:
+            config = f.read()
+    exhausted = os.environ.get("ODOO_LOCUST_FEED_EXHAUSTED", "wrap")
+    seed = os.environ.get("ODOO_LOCUST_FEED_SEED")
+    return {model: DataFeed(model, path, exhausted, int(seed) if seed else None)
+            for model, path in json.loads(config).items()}
+
+
+def stop_run(reason):
+    """Stop the run; a worker asks the master, which stops every worker"""
+    if _environment is not None and _environment.runner is not None:
+        _environment.runner.send_message("feed_exhausted", reason)
+
+
+def receive_feed_exhausted(environment, msg, **kwargs):
+    """Master or local runner: stop once a feed is used up; headless locust quits, anything else just stops"""
+    if environment.runner.state in (STATE_STOPPING, STATE_STOPPED):
+        return
+    logger.warning(f"Stopping the run: {msg.data}")
+    options = environment.parsed_options
+    # Not from the user's greenlet, which stopping the users kills
+    if options is not None and getattr(options, "headless", False):
+        gevent.spawn(environment.runner.quit)
+    else:
+        gevent.spawn(environment.runner.stop)
+
+
+@events.init.add_listener
+def setup_feeds(environment, **kwargs):
+    global _environment
+    _environment = environment
+    if environment.runner is not None and not isinstance(environment.runner, WorkerRunner):
+        environment.runner.register_message("feed_exhausted", receive_feed_exhausted)
@@ -0,0 +1,144 @@
+# ============================================================================
+# deadlines.py - Per-category request deadlines and hung-connection handling
+# ============================================================================
+#
+# Tasks are grouped into categories (menu, read, write, report), each with a
+# connect, read and total deadline in seconds. Connect and read limits are
+# applied by the HTTP engine; the total deadline cuts the whole task off, is
+# reported as a DEADLINE failure and drops the user's pooled connections so
+# a hung Odoo worker can't keep holding them.
+#
+# Override per run with ODOO_LOCUST_DEADLINES, e.g.
+# ODOO_LOCUST_DEADLINES='{"write": {"total": 30}, "report": {"read": 300, "total": 300}}'
+
+import functools
+import json
+import logging
+import os
+import time
+
+import gevent
+from locust import TaskSet, events
+from locust.clients import LocustHttpAdapter
+from locust.contrib.fasthttp import FastResponse
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_REQUEST_TYPE = "DEADLINE"
+FIRST_BYTE_REQUEST_TYPE = "TTFB"
+
+
+class Deadline:
+    """Connect, read and total time limits for one category of requests, in seconds"""
+
+    def __init__(self, connect, read, total):
+        self.connect = connect
+        self.read = read
+        self.total = total
+
+    def __repr__(self):
+        return f"Deadline(connect={self.connect}, read={self.read}, total={self.total})"
+
+
+class DeadlineExceeded(Exception):
+    """A task ran past the total deadline of its category"""
+
+
+DEFAULT_DEADLINES = {
+    "menu": Deadline(connect=5, read=30, total=45),
+    "read": Deadline(connect=5, read=30, total=45),
+    "write": Deadline(connect=5, read=60, total=90),
+    "report": Deadline(connect=5, read=120, total=180),
+}
+
+
+def load_deadlines(overrides=None):
+    """Default deadlines with the JSON overrides from ODOO_LOCUST_DEADLINES applied"""
+    if overrides is None:
+        overrides = os.environ.get("ODOO_LOCUST_DEADLINES", "")
+    limits = {category: vars(deadline) for category, deadline in DEFAULT_DEADLINES.items()}
+    for category, values in (json.loads(overrides) if overrides else {}).items():
+        if category not in limits:
+            raise ValueError(f"Unknown deadline category '{category}', expected one of {list(limits)}")
+        limits[category] = dict(limits[category], **values)
+    return {category: Deadline(**values) for category, values in limits.items()}
+
+
+class DeadlineHttpAdapter(LocustHttpAdapter):
+    """HttpUser adapter applying the connect/read limits of the running task's category"""
+
+    def send(self, request, timeout=None, **kwargs):
+        limits = getattr(gevent.getcurrent(), "deadline", None)
+        if timeout is None and limits is not None:
+            timeout = (limits.connect, limits.read)
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+class FirstByteResponse(FastResponse):
+    """FastHttpUser response that notes when its headers arrived"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        stamp_first_byte()
+
+
+def stamp_first_byte(*args, **kwargs):
+    """Response hook: remember when the current request got its response headers"""
+    gevent.getcurrent().first_byte_at = time.time()
+
+
+@events.request.add_listener
+def clear_first_byte(**kwargs):
+    current = gevent.getcurrent()
+    current.first_byte_at = None
+    current.request_done_at = time.time()
+
+
+def deadline(category):
+    """Run a task under the connect/read/total deadline of a category"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(owner, *args, **kwargs):
+            user = owner.user if isinstance(owner, TaskSet) else owner
+            limits = user.deadlines[category]
+            current = gevent.getcurrent()
+            previous = getattr(current, "deadline", None)
+            current.deadline = limits
+            current.first_byte_at = None
+            current.request_done_at = started = time.time()
+            timeout_error = DeadlineExceeded()
+            try:
+                with gevent.Timeout(limits.total, timeout_error):
+                    return func(owner, *args, **kwargs)
+            except DeadlineExceeded as e:
+                if e is not timeout_error:
+                    raise  # an enclosing task's deadline
+                report_deadline_exceeded(user, f"{category}: {func.__name__}", limits, started)
+            finally:
+                current.deadline = previous
+        return wrapper
+    return decorator
+
+
+def report_deadline_exceeded(user, name, limits, started):
+    """Record a timed-out task as its own failure class and replace the user's connections"""
+    current = gevent.getcurrent()
+    first_byte_at = current.first_byte_at
+    request_started = max(started, current.request_done_at)
+
+    if first_byte_at is not None:
+        user.environment.stats.get(name, FIRST_BYTE_REQUEST_TYPE).log((first_byte_at - request_started) * 1000, 0)
+        error = DeadlineExceeded(f"total deadline of {limits.total}s exceeded after first byte")
+    else:
+        error = DeadlineExceeded(f"total deadline of {limits.total}s exceeded before first byte")
+
+    user.environment.events.request.fire(
+        request_type=DEADLINE_REQUEST_TYPE,
+        name=name,
+        response_time=(time.time() - started) * 1000,
+        response_length=0,
+        exception=error,
+        context={}
+    )
+    logger.warning(f"{name}: {error}, dropping connections")
+    user.drop_connections()
@@ -0,0 +1,241 @@
+# ============================================================================
+# guardrails.py - Live SLO checks that abort a run that is clearly failing
+# ============================================================================
+#
+# SLOs are declared in ODOO_LOCUST_SLOS, as JSON or the path of a JSON file:
+#
+#   {"window": 30, "grace": 60, "slos": [
+#       {"endpoint": "Aggregated", "p95": 2000, "error_rate": 1, "min_rps": 5},
+#       {"endpoint": "Menu: |Create ", "p99": 10000}]}
+#
+# endpoint is a stats name or a regular expression found in several (each is
+# checked on its own), Aggregated by default; p95 and p99 are in ms, error_rate in percent. Every
+# second the live stats of the last `window` seconds are checked (the master's
+# in distributed runs). A breach starts and ends as a BREACH_EVENT, logged and
+# appended to <csv prefix>_slo_breaches.jsonl. Once one breach has lasted
+# `grace` seconds the run is stopped and locust exits with SLO_ABORT_EXIT_CODE.
+
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import deque
+
+import gevent
+from locust import events
+from locust.event import EventHook
+from locust.runners import WorkerRunner
+
+logger = logging.getLogger(__name__)
+
+# locust itself exits with 1 on failed requests and 2 on unhandled errors
+SLO_ABORT_EXIT_CODE = 3
+
+SLO_METRICS = ("p95", "p99", "error_rate", "min_rps")
+DEFAULT_WINDOW = 30
+DEFAULT_GRACE = 60
+# Percentiles and error rates of fewer requests than this aren't judged
+MIN_WINDOW_REQUESTS = 20
+
+# Only real requests are judged; CACHE, STAGE, TTFB, INTENDED and the other synthetic rows
+# reuse request names and would otherwise be mistaken for them
+HTTP_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+
+# Fired with objective, state ("breached" or "recovered"), value, limit and at (unix time)
+BREACH_EVENT = EventHook()
+
+
+def window_percentile(before, after, fraction):
+    """Percentile of the responses counted in after but not in before (locust response_times dicts)"""
+    counts = sorted((ms, count - before.get(ms, 0)) for ms, count in after.items() if count > before.get(ms, 0))
+    total = sum(count for _, count in counts)
+    if not total:
+        return None
+    rank = max(math.ceil(fraction * total), 1)
+    seen = 0
+    for ms, count in counts:
+        seen += count
+        if seen >= rank:
+            return ms
+
+
+class Snapshot:
+    """Cumulative totals of a stats entry at one moment"""
+
+    def __init__(self, entry, at):
+        self.at = at
+        self.requests = entry.num_requests
+        self.failures = entry.num_failures
+        self.response_times = dict(entry.response_times)
+
+
+def window_metrics(before, after):
+    """p95, p99, error rate and throughput between two snapshots of the same entry"""
+    requests = after.requests - before.requests
+    failures = after.failures - before.failures
+    return {
+        "requests": requests,
+        "p95": window_percentile(before.response_times, after.response_times, 0.95),
+        "p99": window_percentile(before.response_times, after.response_times, 0.99),
+        "error_rate": failures / requests * 100 if requests else 0.0,
+        "min_rps": requests / (after.at - before.at) if after.at > before.at else 0.0,
+    }
+
+
+class Objective:
+    """One limit on one metric of the endpoints matching a name or pattern"""
+
+    def __init__(self, endpoint, metric, limit):
+        if metric not in SLO_METRICS:
+            raise ValueError(f"Unknown SLO metric '{metric}', expected one of {list(SLO_METRICS)}")
+        self.endpoint = endpoint
+        self.pattern = re.compile(endpoint)
+        self.metric = metric
+        self.limit = limit
+
+    def matches(self, name):
+        return name == self.endpoint or self.pattern.search(name) is not None
+
+    def judge(self, metrics):
+        """(breached, value), or None when the window has too few requests to tell"""
+        value = metrics[self.metric]
+        if self.metric == "min_rps":
+            return value < self.limit, value
+        if metrics["requests"] < MIN_WINDOW_REQUESTS or value is None:
+            return None
+        return value > self.limit, value
+
+
+def load_slos(config=None):
+    """(window, grace, objectives) from ODOO_LOCUST_SLOS, or None when no SLOs are set"""
+    if config is None:
+        config = os.environ.get("ODOO_LOCUST_SLOS", "")
+    if not config:
+        return None
+    if not config.lstrip().startswith("{"):
+        with open(config) as f:
+            config = f.read()
+    config = json.loads(config)
+
+    objectives = []
+    for slo in config.get("slos", []):
+        slo = dict(slo)
+        endpoint = slo.pop("endpoint", "Aggregated")
+        objectives.extend(Objective(endpoint, metric, limit) for metric, limit in slo.items())
+    return config.get("window", DEFAULT_WINDOW), config.get("grace", DEFAULT_GRACE), objectives
+
+
+class Guardrails:
+    """Checks the objectives on live stats every second and stops the run after the grace period"""
+
+    def __init__(self, environment, window, grace, objectives):
+        self.environment = environment
+        self.window = window
+        self.grace = grace
+        self.objectives = objectives
+        self.history = {}
+        self.breaches = {}
+        self.started = time.time()
+        self.abort_reason = None
+
+    def entries(self):
+        """Live request entries by (name, method), Aggregated included, that some objective looks at"""
+        stats = self.environment.stats
+        requests = {(entry.name, entry.method): entry for entry in stats.entries.values()
+                    if entry.method in HTTP_METHODS}
+        requests[("Aggregated", None)] = stats.total
+        return {key: entry for key, entry in requests.items()
+                if any(objective.matches(key[0]) for objective in self.objectives)}
+
+    def check(self, now=None):
+        now = time.time() if now is None else now
+        for key, entry in self.entries().items():
+            history = self.history.setdefault(key, deque())
+            history.append(Snapshot(entry, now))
+            while len(history) > 1 and now - history[1].at >= self.window:
+                history.popleft()
+
+        # Nothing is judged before a whole window of data exists
+        if now - self.started < self.window:
+            return
+
+        for objective in self.objectives:
+            for (name, method), history in self.history.items():
+                if not objective.matches(name) or len(history) < 2:
+                    continue
+                # Reported with the method, as locust lists them: "POST Login"
+                name = f"{method} {name}" if method else name
+                verdict = objective.judge(window_metrics(history[0], history[-1]))
+                if verdict is None:
+                    continue
+                breached, value = verdict
+                key = (objective.endpoint, objective.metric, name)
+                if not breached:
+                    if self.breaches.pop(key, None) is not None:
+                        self.report(key, "recovered", value, objective.limit, now)
+                    continue
+
+                if key not in self.breaches:
+                    self.breaches[key] = now
+                    self.report(key, "breached", value, objective.limit, now)
+                elif now - self.breaches[key] >= self.grace and self.abort_reason is None:
+                    self.abort(f"{name} {objective.metric} {value:g} against {objective.limit:g} "
+                               f"for {now - self.breaches[key]:.0f}s")
+
+    def report(self, key, state, value, limit, at):
+        _, metric, name = key
+        objective = {"endpoint": name, "metric": metric}
+        if state == "breached":
+            logger.warning(f"SLO breached: {name} {metric} {value:g} against {limit:g}")
+        else:
+            logger.info(f"SLO recovered: {name} {metric} {value:g} against {limit:g}")
+        BREACH_EVENT.fire(objective=objective, state=state, value=value, limit=limit, at=at)
+
+        prefix = getattr(self.environment.parsed_options, "csv_prefix", None)
+        if prefix:
+            with open(f"{prefix}_slo_breaches.jsonl", "a") as f:
+                f.write(json.dumps({**objective, "state": state, "value": value, "limit": limit, "at": at}) + "\n")
+
+    def abort(self, reason):
+        """Stop the run with SLO_ABORT_EXIT_CODE; headless locust quits, anything else just stops"""
+        self.abort_reason = reason
+        logger.error(f"Aborting the run, SLO breached past the {self.grace}s grace period: {reason}")
+        self.environment.process_exit_code = SLO_ABORT_EXIT_CODE
+        options = self.environment.parsed_options
+        if options is not None and getattr(options, "headless", False):
+            self.environment.runner.quit()
+        else:
+            self.environment.runner.stop()
+
+    def run(self):
+        while self.abort_reason is None:
+            self.check()
+            gevent.sleep(1)
+
+
+GUARDRAILS = None
+_checker = None
+
+
+@events.test_start.add_listener
+def start_guardrails(environment, **kwargs):
+    global GUARDRAILS, _checker
+    if isinstance(environment.runner, WorkerRunner) or _checker is not None:
+        return
+    slos = load_slos()
+    if slos is None:
+        return
+    GUARDRAILS = Guardrails(environment, *slos)
+    _checker = gevent.spawn(GUARDRAILS.run)
+    logger.info(f"Checking {len(GUARDRAILS.objectives)} SLOs over {GUARDRAILS.window}s windows, "
+                f"aborting after {GUARDRAILS.grace}s in breach")
+
+
+@events.test_stop.add_listener
+def stop_guardrails(environment, **kwargs):
+    global _checker
+    if _checker is not None:
+        _checker.kill(block=False)
+        _checker = None
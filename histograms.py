@@ -0,0 +1,180 @@
+# ============================================================================
+# histograms.py - Mergeable latency histograms per endpoint and time window
+# ============================================================================
+#
+# Percentiles can't be averaged or added up, but histograms can. Every
+# response time is counted in a log-scaled bucket (each bucket is about 2%
+# wide, so any percentile read back is within 1% of the true value), per
+# endpoint and per time window. Merging is adding counts, which is exact no
+# matter how the samples were split between workers, windows or runs.
+#
+# Workers send their counts to the master with locust's regular stats reports.
+# The master (or a standalone run) appends them to <csv prefix>_histograms.jsonl
+# when --csv is set; a window may be spread over several lines, which
+# analysis.py simply adds together.
+
+import json
+import math
+import os
+import time
+from collections import Counter
+
+import gevent
+from locust import events
+from locust.runners import WorkerRunner
+
+RELATIVE_ERROR = 0.01
+GAMMA = (1 + RELATIVE_ERROR) / (1 - RELATIVE_ERROR)
+LOG_GAMMA = math.log(GAMMA)
+MIN_MS = 0.01  # anything faster is counted as 0.01ms
+
+WINDOW_SECONDS = int(os.environ.get("ODOO_LOCUST_HISTOGRAM_WINDOW", "10"))
+
+# The master only writes a window once late worker reports for it are unlikely
+FLUSH_DELAY = 15
+
+
+def bucket_of(ms):
+    return math.ceil(math.log(max(ms, MIN_MS)) / LOG_GAMMA)
+
+
+def bucket_value(bucket):
+    """The value whose relative error is lowest for everything in the bucket"""
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+class LatencyHistogram:
+    """Response time counts in log-scaled buckets; merging is adding counts"""
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def record(self, ms, count=1):
+        self.counts[bucket_of(ms)] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def percentile(self, fraction):
+        """Latency in ms below which `fraction` (0-1) of the samples fall, or None if empty"""
+        total = self.total
+        if not total:
+            return None
+        rank = max(math.ceil(fraction * total), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return bucket_value(bucket)
+
+    def mean(self):
+        total = self.total
+        if not total:
+            return None
+        return sum(bucket_value(bucket) * count for bucket, count in self.counts.items()) / total
+
+    def to_json(self):
+        return {str(bucket): count for bucket, count in self.counts.items()}
+
+    @classmethod
+    def from_json(cls, counts):
+        return cls({int(bucket): count for bucket, count in counts.items()})
+
+
+class HistogramRecorder:
+    """Histograms per (window start, request type, name) collected in this process"""
+
+    def __init__(self, window=WINDOW_SECONDS):
+        self.window = window
+        self.histograms = {}
+
+    def record(self, request_type, name, ms, at=None):
+        at = time.time() if at is None else at
+        key = (int(at // self.window * self.window), request_type, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(ms)
+
+    def merge_rows(self, rows):
+        for row in rows:
+            key = (row["window"], row["type"], row["name"])
+            histogram = LatencyHistogram.from_json(row["counts"])
+            if key in self.histograms:
+                self.histograms[key].merge(histogram)
+            else:
+                self.histograms[key] = histogram
+
+    def drain(self, before=None):
+        """Remove and return the windows that started before `before` (all by default) as rows"""
+        keys = [key for key in self.histograms if before is None or key[0] < before]
+        return [{"window": window, "type": request_type, "name": name,
+                 "counts": self.histograms.pop((window, request_type, name)).to_json()}
+                for window, request_type, name in keys]
+
+
+RECORDER = HistogramRecorder()
+_flusher = None
+
+
+def output_path(environment):
+    prefix = getattr(environment.parsed_options, "csv_prefix", None)
+    return f"{prefix}_histograms.jsonl" if prefix else None
+
+
+def flush(environment, before=None):
+    rows = RECORDER.drain(before)
+    path = output_path(environment)
+    if rows and path:
+        with open(path, "a") as output:
+            output.writelines(json.dumps(row) + "\n" for row in rows)
+
+
+def flush_periodically(environment):
+    while True:
+        gevent.sleep(5)
+        flush(environment, before=time.time() - RECORDER.window - FLUSH_DELAY)
+
+
+@events.request.add_listener
+def record_response_time(request_type, name, response_time, **kwargs):
+    RECORDER.record(request_type, name, response_time)
+
+
+@events.report_to_master.add_listener
+def send_histograms(client_id, data):
+    data["histograms"] = RECORDER.drain()
+
+
+@events.worker_report.add_listener
+def receive_histograms(client_id, data):
+    RECORDER.merge_rows(data.get("histograms", []))
+
+
+@events.test_start.add_listener
+def start_flushing(environment, **kwargs):
+    global _flusher
+    if not isinstance(environment.runner, WorkerRunner) and _flusher is None:
+        _flusher = gevent.spawn(flush_periodically, environment)
+
+
+@events.test_stop.add_listener
+def stop_flushing(environment, **kwargs):
+    global _flusher
+    if _flusher is not None:
+        _flusher.kill(block=False)
+        _flusher = None
+    if not isinstance(environment.runner, WorkerRunner):
+        flush(environment)
+
+
+@events.quitting.add_listener
+def flush_remaining(environment, **kwargs):
+    # The workers' last reports can reach the master after test_stop
+    if not isinstance(environment.runner, WorkerRunner):
+        flush(environment)
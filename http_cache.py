@@ -0,0 +1,217 @@
+# ============================================================================
+# http_cache.py - Browser-style HTTP cache for the assets a virtual user loads
+# ============================================================================
+#
+# Every user keeps a size-bounded LRU cache of the asset bundles and images the
+# /web page references. A fresh entry (Cache-Control max-age, Expires or the
+# Last-Modified heuristic) costs no request at all; a stale one is revalidated
+# with If-None-Match / If-Modified-Since and usually comes back as a 304.
+#
+# Lookups are counted as CACHE rows ("fresh hit", "revalidated", "miss") next
+# to the request stats; they don't count towards Aggregated.
+#
+# ODOO_LOCUST_COLD_USER_RATIO sets the share of users that start with an empty
+# cache (default 1.0). The others are returning visitors: when they load their
+# first page they get the assets users on the same worker already downloaded,
+# and whatever that page references that none has is downloaded for them first,
+# once per worker and outside the stats, as their previous visit.
+
+import logging
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+import requests
+from gevent.lock import Semaphore
+from locust import events
+
+CACHE_REQUEST_TYPE = "CACHE"
+CACHE_OUTCOMES = ("fresh hit", "revalidated", "miss")
+
+ASSET_URL = re.compile(r'(?:src|href)="(/web/(?:assets|static|image|binary)/[^"]+)"')
+
+COLD_USER_RATIO = float(os.environ.get("ODOO_LOCUST_COLD_USER_RATIO", "1.0"))
+PREVIOUS_VISIT_TIMEOUT = 60  # seconds per asset
+
+
+class CacheEntry:
+    """Validators and freshness of one cached response; the body itself isn't kept"""
+
+    def __init__(self, etag, last_modified, expires_at, size):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.size = size
+
+    def copy(self):
+        return CacheEntry(self.etag, self.last_modified, self.expires_at, self.size)
+
+    @classmethod
+    def from_response(cls, response, now):
+        """Entry of a 200 response, or None if it may not be stored"""
+        expires_at = freshness_deadline(response.headers, now)
+        if expires_at is None:
+            return None
+        return cls(response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                   expires_at, len(response.content or b""))
+
+
+def freshness_deadline(headers, now):
+    """When a response stops being fresh, or None if it may not be stored"""
+    directives = {}
+    for directive in (headers.get("Cache-Control") or "").lower().split(","):
+        key, _, value = directive.strip().partition("=")
+        directives[key] = value
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return now
+    if directives.get("max-age", "").isdigit():
+        return now + int(directives["max-age"])
+
+    try:
+        if headers.get("Expires"):
+            return parsedate_to_datetime(headers["Expires"]).timestamp()
+        if headers.get("Last-Modified"):
+            # Browsers' heuristic: fresh for 10% of the time since the last change
+            age = now - parsedate_to_datetime(headers["Last-Modified"]).timestamp()
+            return now + max(age, 0) * 0.1
+    except (TypeError, ValueError):
+        pass
+    return now
+
+
+def asset_stat_name(url):
+    """Group asset URLs by bundle or route rather than by content hash or record"""
+    path = url.split("?")[0]
+    if path.startswith("/web/assets/"):
+        return f"Asset: {path.rsplit('/', 1)[-1]}"
+    return f"Asset: {'/'.join(path.split('/')[:3])}"
+
+
+# Assets downloaded on this worker, shared with warm users as their "previous visit";
+# the most recently downloaded SHARED_MAX_BYTES of them, so old bundle hashes age out
+SHARED_MAX_BYTES = 50 * 1024 * 1024
+SHARED_ENTRIES = OrderedDict()
+_shared_size = 0
+
+
+def share_entry(url, entry):
+    """Keep a copy of a downloaded entry for users that start warm"""
+    global _shared_size
+    previous = SHARED_ENTRIES.pop(url, None)
+    if previous is not None:
+        _shared_size -= previous.size
+    SHARED_ENTRIES[url] = entry.copy()
+    _shared_size += entry.size
+    while _shared_size > SHARED_MAX_BYTES and SHARED_ENTRIES:
+        _, evicted = SHARED_ENTRIES.popitem(last=False)
+        _shared_size -= evicted.size
+
+
+_previous_visit = Semaphore()
+
+
+def share_previous_visit(user, urls):
+    """Download the assets no user on this worker has yet, so warm users can start with them
+
+    Made with requests and the user's session cookies rather than the user's
+    client: the visit before the test isn't part of its stats. One warm user
+    downloads them while the others wait.
+    """
+    with _previous_visit:
+        for url in urls:
+            if url in SHARED_ENTRIES:
+                continue
+            now = time.time()
+            try:
+                response = requests.get(user.host.rstrip("/") + url, cookies=user.cookie_jar,
+                                        timeout=PREVIOUS_VISIT_TIMEOUT)
+            except requests.RequestException as e:
+                logging.getLogger(__name__).warning(f"Previous visit of {url} failed: {e}")
+                continue
+            entry = CacheEntry.from_response(response, now) if response.status_code == 200 else None
+            if entry is not None:
+                share_entry(url, entry)
+
+
+class BrowserCache:
+    """One user's HTTP cache, bounded to max_bytes of response bodies"""
+
+    def __init__(self, max_bytes=50 * 1024 * 1024, warm=None):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        # Filled when the user loads its first page: users spawned before any download start warm too
+        self.warm = warm if warm is not None else random.random() >= COLD_USER_RATIO
+
+    def _store(self, url, entry):
+        previous = self.entries.pop(url, None)
+        if previous is not None:
+            self.size -= previous.size
+        self.entries[url] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def load_page_assets(self, user, html):
+        """Fetch every asset a page references, through the cache"""
+        urls = list(dict.fromkeys(ASSET_URL.findall(html)))
+        if self.warm:
+            self.warm = False
+            share_previous_visit(user, urls)
+            # Copies: a revalidation only refreshes this user's entry
+            for url, entry in SHARED_ENTRIES.items():
+                self._store(url, entry.copy())
+        for url in urls:
+            self.fetch(user, url)
+
+    def fetch(self, user, url):
+        now = time.time()
+        entry = self.entries.get(url)
+        stats = user.environment.stats
+
+        if entry is not None and entry.expires_at > now:
+            self.entries.move_to_end(url)
+            stats.get("fresh hit", CACHE_REQUEST_TYPE).log(0, entry.size)
+            return
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        with user.client.get(url, headers=headers, name=asset_stat_name(url), catch_response=True) as response:
+            if response.status_code == 304 and entry is not None:
+                entry.expires_at = freshness_deadline(response.headers, now) or now
+                self.entries.move_to_end(url)
+                stats.get("revalidated", CACHE_REQUEST_TYPE).log(0, entry.size)
+                response.success()
+            elif response.status_code == 200:
+                stats.get("miss", CACHE_REQUEST_TYPE).log(0, len(response.content or b""))
+                entry = CacheEntry.from_response(response, now)
+                if entry is not None:
+                    self._store(url, entry)
+                    share_entry(url, entry)
+            else:
+                response.failure(f"Asset failed to load with status {response.status_code}")
+
+
+@events.test_stop.add_listener
+def log_hit_ratio(environment, **kwargs):
+    """Share of asset lookups answered from the cache, fresh or after a 304"""
+    counts = {outcome: environment.stats.get(outcome, CACHE_REQUEST_TYPE).num_requests
+              for outcome in CACHE_OUTCOMES}
+    total = sum(counts.values())
+    if total:
+        hits = counts["fresh hit"] + counts["revalidated"]
+        logging.getLogger(__name__).info(
+            f"Browser cache hit ratio: {hits / total:.1%} ({counts['fresh hit']} fresh, "
+            f"{counts['revalidated']} revalidated, {counts['miss']} missed)")
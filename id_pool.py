@@ -0,0 +1,106 @@
+# ============================================================================
+# id_pool.py - Per-worker pools of known record IDs for write tasks
+# ============================================================================
+
+import logging
+import random
+
+import gevent
+
+from odoo_rpc import CallKw, Slot, JSON_HEADERS
+
+logger = logging.getLogger(__name__)
+
+
+class RecordIdPool:
+    """Bounded set of record IDs for one model, sampled locally by tasks
+
+    Once full, new IDs overwrite the oldest ones, so the pool keeps drifting
+    towards recently created and recently fetched records.
+    """
+
+    def __init__(self, model, max_size=2000, batch_size=500):
+        self.model = model
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.search = CallKw(model, "search", args=[[]], kwargs={
+            "limit": batch_size,
+            "offset": Slot("offset")
+        })
+        self._ids = []
+        self._known = set()
+        self._next_eviction = 0
+        self._offset = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, record_id):
+        """Remember an ID, evicting the oldest one when the pool is full"""
+        if record_id in self._known:
+            return
+
+        if len(self._ids) < self.max_size:
+            self._ids.append(record_id)
+        else:
+            self._known.discard(self._ids[self._next_eviction])
+            self._ids[self._next_eviction] = record_id
+            self._next_eviction = (self._next_eviction + 1) % self.max_size
+        self._known.add(record_id)
+
+    def pick(self):
+        """Random known ID, or None while the pool is still empty"""
+        return random.choice(self._ids) if self._ids else None
+
+    def fetch(self, client):
+        """Load the next page of IDs with one bulk search, wrapping to the start at the end"""
+        response = client.post(self.search.url,
+                               data=self.search.encode(offset=self._offset),
+                               headers=JSON_HEADERS,
+                               name=f"ID Pool: {self.model}")
+        try:
+            ids = response.json().get("result") or []
+        except Exception as e:
+            logger.error(f"Failed to fetch {self.model} IDs: {e}")
+            return 0
+
+        for record_id in ids:
+            self.add(record_id)
+
+        self._offset = self._offset + len(ids) if len(ids) == self.batch_size else 0
+        return len(ids)
+
+
+class RecordIdPools:
+    """The pools of one worker, warmed by its first logged-in user and refreshed in the background"""
+
+    def __init__(self, models, refresh_interval=60, **pool_options):
+        self.pools = {model: RecordIdPool(model, **pool_options) for model in models}
+        self.refresh_interval = refresh_interval
+        self._refresher = None
+
+    def __getitem__(self, model):
+        return self.pools[model]
+
+    def ensure_started(self, client):
+        """Warm every pool and start the refresher, once per worker"""
+        if self._refresher is not None:
+            return
+
+        self._refresher = gevent.spawn_later(self.refresh_interval, self._refresh_loop, client)
+        for pool in self.pools.values():
+            logger.info(f"ID pool {pool.model} warmed with {pool.fetch(client)} IDs")
+
+    def _refresh_loop(self, client):
+        while True:
+            for pool in self.pools.values():
+                try:
+                    pool.fetch(client)
+                except Exception as e:
+                    logger.error(f"ID pool refresh failed for {pool.model}: {e}")
+            gevent.sleep(self.refresh_interval)
+
+    def stop(self):
+        if self._refresher is not None:
+            self._refresher.kill(block=False)
+            self._refresher = None
@@ -0,0 +1,150 @@
+# ============================================================================
+# load_shapes.py - Staged load profiles: steps, spikes, soaks and diurnal curves
+# ============================================================================
+#
+# The OdooLoadTest users driven by a ProfileShape, built from --load-profile
+# (JSON, or the path of a JSON file) with one of these types, durations in
+# seconds or locust timespans:
+#
+#   {"type": "step", "start_users": 10, "step_users": 10, "steps": 5, "step_duration": "3m", "spawn_rate": 5}
+#   {"type": "spike", "users": 20, "spike_users": 150, "before": "5m", "spike": "3m", "after": "10m", "spawn_rate": 50}
+#   {"type": "soak", "users": 50, "duration": "2h", "spawn_rate": 1}
+#   {"type": "diurnal", "csv": "diurnal_users.csv", "hour": "1m", "scale": 1, "spawn_rate": 10}
+#   {"type": "stages", "stages": [{"name": "login peak", "users": 80, "duration": "5m", "spawn_rate": 20}, ...]}
+#
+# A diurnal profile replays an hourly "hour,users" CSV with every hour lasting
+# `hour`, the users going linearly from one hour's count to the next. The run
+# stops after the last stage.
+#
+# Every second the shape logs one request to a STAGE row named after the
+# running stage ("2. spike"), so the stats history shows when each stage ran
+# and analysis.py breaks the results down by stage.
+#
+# Run with:
+# locust -f load_shapes.py --host=https://your-odoo-domain.com --headless --csv results_spike --load-profile '{"type": "spike", ...}'
+
+import csv
+import json
+import math
+
+from locust import LoadTestShape, events
+from locust.util.timespan import parse_timespan
+
+# The same user mix as running odoo_load_test.py
+from odoo_load_test import HeavyUser, LightUser, OdooLoadTest  # noqa: F401
+
+STAGE_REQUEST_TYPE = "STAGE"
+
+
+@events.init_command_line_parser.add_listener
+def add_profile_arguments(parser):
+    parser.add_argument("--load-profile", default="",
+                        help="Load profile as JSON or a JSON file: step, spike, soak, diurnal or stages (see load_shapes.py)")
+
+
+def seconds(duration):
+    return parse_timespan(duration) if isinstance(duration, str) else float(duration)
+
+
+class Stage:
+    """users (going linearly to end_users, if set) for duration seconds"""
+
+    def __init__(self, name, duration, users, spawn_rate, end_users=None):
+        self.name = name
+        self.duration = seconds(duration)
+        self.users = users
+        self.spawn_rate = spawn_rate
+        self.end_users = users if end_users is None else end_users
+
+    def users_at(self, elapsed):
+        return round(self.users + (self.end_users - self.users) * min(elapsed / self.duration, 1))
+
+
+def step_stages(start_users, step_users, steps, step_duration, spawn_rate):
+    return [Stage(f"{start_users + step * step_users} users", step_duration, start_users + step * step_users, spawn_rate)
+            for step in range(steps)]
+
+
+def spike_stages(users, spike_users, before, spike, after, spawn_rate):
+    return [Stage("baseline", before, users, spawn_rate),
+            Stage("spike", spike, spike_users, spawn_rate),
+            Stage("recovery", after, users, spawn_rate)]
+
+
+def soak_stages(users, duration, spawn_rate):
+    # The ramp gets a stage of its own so it stays out of the soak's numbers
+    return [Stage("ramp-up", math.ceil(users / spawn_rate), users, spawn_rate),
+            Stage("soak", duration, users, spawn_rate)]
+
+
+def diurnal_stages(csv, hour, spawn_rate, scale=1.0):
+    users = read_hourly_users(csv)
+    return [Stage(f"{hour_of_day:02d}:00", hour, round(count * scale), spawn_rate,
+                  round(users[index + 1][1] * scale) if index + 1 < len(users) else None)
+            for index, (hour_of_day, count) in enumerate(users)]
+
+
+def read_hourly_users(path):
+    """(hour, users) rows of an hourly users CSV, in hour order"""
+    with open(path, newline="") as f:
+        return sorted((int(row["hour"]), int(float(row["users"]))) for row in csv.DictReader(f))
+
+
+def explicit_stages(stages):
+    return [Stage(**stage) for stage in stages]
+
+
+PROFILES = {
+    "step": step_stages,
+    "spike": spike_stages,
+    "soak": soak_stages,
+    "diurnal": diurnal_stages,
+    "stages": explicit_stages,
+}
+
+
+def load_profile(profile):
+    """Stages of a profile given as a dict, JSON or the path of a JSON file"""
+    if not profile:
+        raise ValueError("No load profile given, set --load-profile")
+    if isinstance(profile, str):
+        if not profile.lstrip().startswith("{"):
+            with open(profile) as f:
+                profile = f.read()
+        profile = json.loads(profile)
+    profile = dict(profile)
+    profile_type = profile.pop("type", None)
+    if profile_type not in PROFILES:
+        raise ValueError(f"Unknown load profile type '{profile_type}', expected one of {list(PROFILES)}")
+    try:
+        stages = PROFILES[profile_type](**profile)
+    except TypeError as e:
+        raise ValueError(f"Invalid {profile_type} load profile: {e}") from e
+    if not stages:
+        raise ValueError(f"The {profile_type} load profile has no stages")
+    return stages
+
+
+class ProfileShape(LoadTestShape):
+    """Runs the stages of --load-profile one after the other and marks each in the stats"""
+
+    stages = None
+
+    def current_stage(self, run_time):
+        """(stage number, stage, seconds into it), or None once every stage is over"""
+        start = 0
+        for number, stage in enumerate(self.stages, 1):
+            if run_time < start + stage.duration:
+                return number, stage, run_time - start
+            start += stage.duration
+        return None
+
+    def tick(self):
+        if self.stages is None:
+            self.stages = load_profile(self.runner.environment.parsed_options.load_profile)
+        current = self.current_stage(self.get_run_time())
+        if current is None:
+            return None
+        number, stage, elapsed = current
+        self.runner.environment.stats.get(f"{number}. {stage.name}", STAGE_REQUEST_TYPE).log(0, 0)
+        return stage.users_at(elapsed), stage.spawn_rate
@@ -1,45 +1,552 @@
 # ============================================================================
 # monitoring.py - Performance monitoring during load tests
 # ============================================================================
+#
+# Samples run on a background thread, are kept in a fixed-size ring buffer and
+# are appended to a JSONL file as they are taken, so a crashed run keeps
+# everything up to its last sample. Inside locust, which monkey-patches
+# threading into greenlets, a greenlet keeps the schedule and every sample is
+# taken on gevent's pool of real OS threads, so psutil scans and PostgreSQL
+# queries never block the simulated users.
+#
+# Inside locust, set ODOO_LOCUST_MONITOR_INTERVAL=<seconds> to sample for the
+# length of the test; every sample carries the user count at that moment.
+# ODOO_LOCUST_MONITOR_PROCESSES=1 adds the per-process groups, only useful when
+# Odoo runs on the load generator's host.
+# Standalone, e.g. on the Odoo host:
+#   python monitoring.py --interval 5 --output odoo_host.jsonl
+#
+# unix_time in each sample is on the same clock as the Timestamp column of
+# locust's stats history, so the two line up directly.
 
-import psutil
-import time
+import argparse
 import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
+import psutil
+
+try:
+    from gevent import monkey
+except ImportError:  # standalone on a host without gevent
+    monkey = None
+
+try:
+    import psycopg2
+    import psycopg2.errors
+except ImportError:  # only PostgresSampler needs it
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+
+def in_greenlets():
+    """Whether threading is monkey-patched into greenlets, as inside locust"""
+    return monkey is not None and monkey.is_module_patched("threading")
+
+
+class HostSampler:
+    """Host-wide CPU, memory, disk and network counters"""
+
+    def __init__(self, connections_every=12):
+        # psutil.net_connections() walks every process's file descriptors, so it
+        # only runs every Nth sample; the others repeat the last count
+        self.connections_every = connections_every
+        self.active_connections = None
+        self._samples = 0
+        psutil.cpu_percent(interval=None)  # the first non-blocking call always returns 0.0
+
+    def sample(self):
+        if self._samples % self.connections_every == 0:
+            try:
+                self.active_connections = len(psutil.net_connections(kind="tcp"))
+            except psutil.AccessDenied:
+                self.active_connections = None
+        self._samples += 1
+
+        disk_io = psutil.disk_io_counters()
+        network_io = psutil.net_io_counters()
+        return {
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "disk_io": disk_io._asdict() if disk_io else {},
+            "network_io": network_io._asdict() if network_io else {},
+            "active_connections": self.active_connections
+        }
+
+
+# Process groups tracked by ProcessSampler. A process joins the first group whose
+# pattern matches its command line (or name); its descendants that match no
+# pattern themselves join the same group. Odoo's prefork workers retitle
+# themselves "odoo: WorkerHTTP <pid>" and "odoo: WorkerCron <pid>".
+DEFAULT_PROCESS_GROUPS = [
+    ("odoo_http", r"odoo: WorkerHTTP"),
+    ("odoo_cron", r"odoo: WorkerCron"),
+    ("odoo_gevent", r"odoo.*\bgevent\b"),
+    ("odoo", r"odoo-bin|openerp-server|odoo: "),
+    ("postgres", r"^postgres\b"),
+]
+
+
+class ProcessSampler:
+    """Per-process CPU, RSS, open files and context switches for groups of processes
+
+    One pass over the process table per sample finds the groups' members, so
+    worker recycling shows up as PIDs started and exited between samples.
+    """
+
+    def __init__(self, groups=DEFAULT_PROCESS_GROUPS):
+        self.groups = [(name, re.compile(pattern)) for name, pattern in groups]
+        self._processes = {}
+        self._ctx_switches = {}
+        self._members = {name: set() for name, _ in self.groups}
+
+    def _match(self, info):
+        title = " ".join(info["cmdline"] or []) or info["name"] or ""
+        for name, pattern in self.groups:
+            if pattern.search(title):
+                return name
+        return None
+
+    def discover(self):
+        """Map each tracked PID to its group, following process trees down from matching processes"""
+        table = {}
+        for proc in psutil.process_iter(["pid", "ppid", "name", "cmdline"]):
+            table[proc.info["pid"]] = proc.info
+
+        group_of = {}
+
+        def resolve(pid, depth=0):
+            if pid in group_of:
+                return group_of[pid]
+            info = table.get(pid)
+            group = None
+            if info is not None:
+                group = self._match(info)
+                if group is None and depth < 32 and info["ppid"] not in (None, 0, pid):
+                    group = resolve(info["ppid"], depth + 1)
+            group_of[pid] = group
+            return group
+
+        return {pid: group for pid in table if (group := resolve(pid)) is not None}
+
+    def _measure(self, pid):
+        process = self._processes.get(pid)
+        if process is None:
+            process = self._processes[pid] = psutil.Process(pid)
+
+        with process.oneshot():
+            cpu_percent = process.cpu_percent(interval=None)
+            rss = process.memory_info().rss
+            switches = process.num_ctx_switches()
+            try:
+                num_fds = process.num_fds()
+            except (psutil.AccessDenied, AttributeError):
+                num_fds = None
+
+        total_switches = switches.voluntary + switches.involuntary
+        previous = self._ctx_switches.get(pid, total_switches)
+        self._ctx_switches[pid] = total_switches
+        return {"pid": pid, "cpu_percent": cpu_percent, "rss": rss, "num_fds": num_fds,
+                "ctx_switches": total_switches - previous}
+
+    def sample(self):
+        members = {name: set() for name, _ in self.groups}
+        for pid, group in self.discover().items():
+            members[group].add(pid)
+
+        processes = {}
+        for name, pids in members.items():
+            measured = []
+            for pid in sorted(pids):
+                try:
+                    measured.append(self._measure(pid))
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pids.discard(pid)
+
+            previous = self._members[name]
+            processes[name] = {
+                "count": len(measured),
+                "cpu_percent": sum(p["cpu_percent"] for p in measured),
+                "rss": sum(p["rss"] for p in measured),
+                "max_rss": max((p["rss"] for p in measured), default=0),
+                "num_fds": sum(p["num_fds"] or 0 for p in measured),
+                "ctx_switches": sum(p["ctx_switches"] for p in measured),
+                "started": sorted(pids - previous),
+                "exited": sorted(previous - pids),
+                "per_process": measured
+            }
+
+        # Forget processes that are gone, so the caches don't grow with every recycled worker
+        tracked = set().union(*members.values())
+        for pid in set(self._processes) - tracked:
+            del self._processes[pid]
+            self._ctx_switches.pop(pid, None)
+        self._members = members
+
+        return {"processes": processes}
+
+
+# Tables a statement touches; Odoo always double-quotes its table names
+STATEMENT_TABLES = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+"?([a-z_][a-z0-9_]*)"?', re.IGNORECASE)
+
+ACTIVITY_QUERY = """
+    SELECT pid, state, wait_event_type, wait_event, pg_blocking_pids(pid),
+           extract(epoch FROM now() - xact_start)::float8, extract(epoch FROM now() - query_start)::float8,
+           left(query, 200)
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND pid <> pg_backend_pid() AND backend_type = 'client backend'
+"""
+
+DATABASE_QUERY = """
+    SELECT xact_commit, xact_rollback, deadlocks, temp_files, temp_bytes, blks_read, blks_hit, conflicts
+    FROM pg_stat_database
+    WHERE datname = current_database()
+"""
+DATABASE_COUNTERS = ["commits", "rollbacks", "deadlocks", "temp_files", "temp_bytes", "blks_read", "blks_hit",
+                     "conflicts"]
+
+# Without query texts, which would mean reading pg_stat_statements' whole text file every time
+STATEMENTS_QUERY = """
+    SELECT queryid, calls, {total_time}, rows, shared_blks_read, temp_blks_written
+    FROM pg_stat_statements(false)
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) AND queryid IS NOT NULL
+"""
+STATEMENT_TEXTS_QUERY = "SELECT queryid, query FROM pg_stat_statements(true) WHERE queryid = ANY(%s)"
+
+# A busy server must not hold the monitor up for longer than this per connect or query
+CONNECT_TIMEOUT_SECONDS = 5
+STATEMENT_TIMEOUT_MS = 5000
+
+
+def statement_tags(query):
+    """The tables a statement touches, and the Odoo model of the first one"""
+    tables = list(dict.fromkeys(table.lower() for table in STATEMENT_TABLES.findall(query or "")))
+    return {"tables": tables, "model": tables[0].replace("_", ".") if tables else None}
+
+
+class PostgresSampler:
+    """Lock waits, long transactions and per-interval query statistics from PostgreSQL
+
+    Polls pg_stat_activity as it is, and pg_stat_database and pg_stat_statements
+    as deltas since the previous poll; the heaviest statements of each interval
+    are tagged with the tables and model they touch. Polls every `every` samples
+    of the monitor. Needs psycopg2, and the pg_stat_statements extension for the
+    statement statistics. psycopg2 blocks, so inside locust it only runs on
+    the monitor's OS threads; every query gives up after statement_timeout ms.
+    """
+
+    def __init__(self, dsn, every=1, top=10, statement_timeout=STATEMENT_TIMEOUT_MS):
+        if psycopg2 is None:
+            raise RuntimeError("PostgresSampler needs psycopg2 (pip install psycopg2-binary)")
+        self.dsn = dsn
+        self.every = every
+        self.top = top
+        self.statement_timeout = statement_timeout
+        self._connection = None
+        self._samples = 0
+        self._database = None
+        self._statements = None
+        self._statement_texts = {}
+        self._total_time_column = "total_exec_time"
+
+    def _cursor(self):
+        if self._connection is None or self._connection.closed:
+            self._connection = psycopg2.connect(self.dsn, application_name="odoo-locust-monitor",
+                                                connect_timeout=CONNECT_TIMEOUT_SECONDS,
+                                                options=f"-c statement_timeout={int(self.statement_timeout)}")
+            self._connection.autocommit = True
+        return self._connection.cursor()
+
+    def sample(self):
+        self._samples += 1
+        if (self._samples - 1) % self.every:
+            return {}
+
+        try:
+            with self._cursor() as cr:
+                postgres = {"activity": self._activity(cr)}
+                try:
+                    postgres["top_statements"] = self._top_statements(cr)
+                except psycopg2.errors.QueryCanceled as e:
+                    logger.warning(f"pg_stat_statements timed out, no statement statistics this interval: {e}")
+                    postgres["top_statements"] = None
+                # Last, so its baseline only moves when the sample is kept and deltas stay one interval long
+                postgres["database"] = self._database_delta(cr)
+                return {"postgres": postgres}
+        except psycopg2.errors.QueryCanceled:
+            # Timed out; the connection is still good, the next poll tries again
+            raise
+        except psycopg2.OperationalError:
+            # Reconnect on the next poll, after a PostgreSQL restart for instance
+            self._connection = None
+            raise
+
+    def _activity(self, cr):
+        cr.execute(ACTIVITY_QUERY)
+        backends = cr.fetchall()
+
+        wait_events = {}
+        blocked = []
+        for pid, state, wait_type, wait_event, blocking_pids, xact_age, query_age, query in backends:
+            if wait_type:
+                key = f"{wait_type}:{wait_event}"
+                wait_events[key] = wait_events.get(key, 0) + 1
+            if wait_type == "Lock":
+                blocked.append({"pid": pid, "waiting_s": query_age, "blocking_pids": blocking_pids, "query": query})
+
+        return {
+            "connections": len(backends),
+            "active": sum(1 for backend in backends if backend[1] == "active"),
+            "idle_in_transaction": sum(1 for backend in backends if (backend[1] or "").startswith("idle in transaction")),
+            "lock_waits": len(blocked),
+            "wait_events": wait_events,
+            "oldest_transaction_s": max((backend[5] for backend in backends if backend[5] is not None), default=None),
+            "longest_query_s": max((backend[6] for backend in backends if backend[1] == "active"), default=None),
+            "blocked": sorted(blocked, key=lambda backend: backend["waiting_s"] or 0, reverse=True)[:self.top]
+        }
+
+    def _database_delta(self, cr):
+        cr.execute(DATABASE_QUERY)
+        counters = dict(zip(DATABASE_COUNTERS, cr.fetchone()))
+        previous, self._database = self._database, counters
+        if previous is None:
+            return None
+        return {name: value - previous[name] for name, value in counters.items()}
+
+    def _top_statements(self, cr):
+        if self._total_time_column is None:
+            return None
+        try:
+            cr.execute(STATEMENTS_QUERY.format(total_time=self._total_time_column))
+        except psycopg2.errors.UndefinedColumn:
+            # PostgreSQL 12 and older call it total_time
+            self._total_time_column = "total_time"
+            cr.execute(STATEMENTS_QUERY.format(total_time=self._total_time_column))
+        except (psycopg2.errors.UndefinedTable, psycopg2.errors.UndefinedFunction,
+                psycopg2.errors.ObjectNotInPrerequisiteState) as e:
+            logger.warning(f"pg_stat_statements unavailable, skipping statement statistics: {e}")
+            self._total_time_column = None
+            return None
+
+        current = {row[0]: row[1:] for row in cr.fetchall()}
+        previous, self._statements = self._statements, current
+        if previous is None:
+            return None
+
+        deltas = []
+        for queryid, (calls, total_ms, rows, blks_read, temp_blks) in current.items():
+            before = previous.get(queryid, (0, 0.0, 0, 0, 0))
+            if calls > before[0]:
+                deltas.append({
+                    "queryid": queryid,
+                    "calls": calls - before[0],
+                    "total_ms": total_ms - before[1],
+                    "mean_ms": (total_ms - before[1]) / (calls - before[0]),
+                    "rows": rows - before[2],
+                    "shared_blks_read": blks_read - before[3],
+                    "temp_blks_written": temp_blks - before[4]
+                })
+        deltas.sort(key=lambda statement: statement["total_ms"], reverse=True)
+        deltas = deltas[:self.top]
+
+        missing = [statement["queryid"] for statement in deltas if statement["queryid"] not in self._statement_texts]
+        if missing:
+            cr.execute(STATEMENT_TEXTS_QUERY, (missing,))
+            self._statement_texts.update(cr.fetchall())
+        for statement in deltas:
+            query = self._statement_texts.get(statement["queryid"])
+            statement.update(statement_tags(query), query=(query or "")[:500])
+        return deltas
+
+
 class PerformanceMonitor:
     """Monitor system performance during load tests"""
 
-    def __init__(self, interval=5):
+    def __init__(self, interval=5, output=None, buffer_size=720, samplers=None):
         self.interval = interval
-        self.metrics = []
+        self.output = output or f"performance_metrics_{int(time.time())}.jsonl"
+        self.metrics = deque(maxlen=buffer_size)
+        self.samplers = samplers if samplers is not None else [HostSampler(), ProcessSampler()]
+        self.user_count = lambda: None
         self.monitoring = False
+        self.samples_taken = 0
+        self.sampling_seconds = 0.0
+        self.max_sampling_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
 
-    def start_monitoring(self):
-        """Start performance monitoring"""
+    def start_monitoring(self, user_count=None):
+        """Start sampling in the background; user_count is called for every sample"""
+        if self.monitoring:
+            return
+        if user_count is not None:
+            self.user_count = user_count
         self.monitoring = True
-        print("Performance monitoring started...")
-
-        while self.monitoring:
-            metric = {
-                "timestamp": datetime.now().isoformat(),
-                "cpu_percent": psutil.cpu_percent(interval=1),
-                "memory_percent": psutil.virtual_memory().percent,
-                "disk_io": psutil.disk_io_counters()._asdict() if psutil.disk_io_counters() else {},
-                "network_io": psutil.net_io_counters()._asdict() if psutil.net_io_counters() else {},
-                "active_connections": len(psutil.net_connections())
-            }
+        self._stop.clear()
+        if in_greenlets():
+            import gevent
+
+            self._thread = gevent.spawn(self._run, gevent.get_hub().threadpool.apply)
+        else:
+            self._thread = threading.Thread(target=self._run, name="performance-monitor", daemon=True)
+            self._thread.start()
+        print(f"Performance monitoring started, writing to {self.output}...")
+
+    def _run(self, run_sample=None):
+        """Sample until stopped; run_sample(function, args) takes each sample elsewhere, like a real thread"""
+        next_sample = time.monotonic()
+        with open(self.output, "a") as output:
+            while not self._stop.is_set():
+                # The user count is read here, next to the runner, not on the sampling thread
+                user_count = self.user_count()
+                try:
+                    metric = run_sample(self.sample, (user_count,)) if run_sample else self.sample(user_count)
+                    output.write(json.dumps(metric, default=str) + "\n")
+                    output.flush()
+                except Exception as e:
+                    # One bad sample mustn't end the monitoring of the rest of the test
+                    logger.warning(f"Performance sample skipped: {e}")
 
-            self.metrics.append(metric)
-            print(f"CPU: {metric['cpu_percent']}%, Memory: {metric['memory_percent']}%")
+                next_sample += self.interval
+                self._stop.wait(max(next_sample - time.monotonic(), 0))
 
-            time.sleep(self.interval)
+    def sample(self, user_count=None):
+        """Take one sample from every sampler, timing how long that took"""
+        started = time.perf_counter()
+        metric = {
+            "timestamp": datetime.now().isoformat(),
+            "unix_time": time.time(),
+            "user_count": user_count
+        }
+        for sampler in self.samplers:
+            try:
+                metric.update(sampler.sample())
+            except Exception as e:
+                logger.warning(f"{type(sampler).__name__} failed: {e}")
+
+        elapsed = time.perf_counter() - started
+        metric["sample_ms"] = round(elapsed * 1000, 3)
+        self.samples_taken += 1
+        self.sampling_seconds += elapsed
+        self.max_sampling_seconds = max(self.max_sampling_seconds, elapsed)
+
+        self.metrics.append(metric)
+        return metric
+
+    def overhead(self):
+        """Time spent sampling, on average and as a share of the sampling interval"""
+        mean = self.sampling_seconds / self.samples_taken if self.samples_taken else 0.0
+        return {
+            "samples": self.samples_taken,
+            "mean_ms": mean * 1000,
+            "max_ms": self.max_sampling_seconds * 1000,
+            "share_of_interval": mean / self.interval if self.interval else 0.0
+        }
 
     def stop_monitoring(self):
-        """Stop monitoring and save results"""
+        """Stop sampling; every sample is already on disk"""
+        if not self.monitoring:
+            return
         self.monitoring = False
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 5)
+
+        overhead = self.overhead()
+        print(f"Performance monitoring stopped. {overhead['samples']} metrics saved to {self.output}. "
+              f"Sampling took {overhead['mean_ms']:.1f} ms on average, {overhead['max_ms']:.1f} ms at most "
+              f"({overhead['share_of_interval']:.2%} of the interval).")
+
+
+def check_postgres(dsn, statement_timeout=STATEMENT_TIMEOUT_MS):
+    """Take two PostgresSampler samples against a real server, one transaction held open, and print them
+
+    The second sample has the deltas. Raises if a query fails or a sample isn't plain JSON.
+    """
+    sampler = PostgresSampler(dsn, statement_timeout=statement_timeout)
+    holder = psycopg2.connect(dsn, application_name="odoo-locust-monitor-check",
+                              connect_timeout=CONNECT_TIMEOUT_SECONDS)
+    try:
+        with holder.cursor() as cr:
+            # An open transaction, so the transaction ages are filled in
+            cr.execute("SELECT txid_current()")
+            samples = [sampler.sample()]
+            time.sleep(1)
+            samples.append(sampler.sample())
+        for sample in samples:
+            print(json.dumps(sample, indent=2))
+        activity = samples[-1]["postgres"]["activity"]
+        print(f"PostgreSQL sampling works: {activity['connections']} connections, oldest transaction "
+              f"{activity['oldest_transaction_s']}s, statement statistics "
+              f"{'on' if samples[-1]['postgres']['top_statements'] is not None else 'off'}")
+    finally:
+        holder.rollback()
+        holder.close()
+
+
+def load_monitor():
+    """The monitor configured by ODOO_LOCUST_MONITOR_INTERVAL, or None when monitoring is off
+
+    ODOO_LOCUST_MONITOR_PG_DSN adds PostgreSQL statistics to every sample and
+    ODOO_LOCUST_MONITOR_PROCESSES=1 the process groups of this host.
+    """
+    interval = float(os.environ.get("ODOO_LOCUST_MONITOR_INTERVAL", "0"))
+    if interval <= 0:
+        return None
+    samplers = [HostSampler()]
+    if os.environ.get("ODOO_LOCUST_MONITOR_PROCESSES", "0") not in ("", "0"):
+        samplers.append(ProcessSampler())
+    if os.environ.get("ODOO_LOCUST_MONITOR_PG_DSN"):
+        samplers.append(PostgresSampler(os.environ["ODOO_LOCUST_MONITOR_PG_DSN"]))
+    return PerformanceMonitor(interval, os.environ.get("ODOO_LOCUST_MONITOR_FILE"), samplers=samplers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sample host performance metrics to JSONL")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between samples")
+    parser.add_argument("--output", help="JSONL file to append samples to")
+    parser.add_argument("--buffer-size", type=int, default=720, help="Samples kept in memory")
+    parser.add_argument("--process-group", action="append", metavar="NAME=REGEX",
+                        help="Track processes matching REGEX as NAME (repeatable, replaces the Odoo/PostgreSQL defaults)")
+
+    parser.add_argument("--postgres-dsn",
+                        help='Also sample PostgreSQL statistics, e.g. "dbname=odoo user=odoo host=localhost"')
+    parser.add_argument("--postgres-every", type=int, default=1, help="Poll PostgreSQL every N samples")
+    parser.add_argument("--top-statements", type=int, default=10, help="Statements reported per interval")
+    parser.add_argument("--postgres-timeout", type=int, default=STATEMENT_TIMEOUT_MS,
+                        help="Milliseconds before a PostgreSQL statistics query is cancelled")
+    parser.add_argument("--postgres-check", action="store_true",
+                        help="Take two samples from --postgres-dsn with a transaction open, print them and exit")
+
+    args = parser.parse_args()
 
-        with open(f'performance_metrics_{int(time.time())}.json', 'w') as f:
-            json.dump(self.metrics, f, indent=2)
+    if args.postgres_check:
+        if not args.postgres_dsn:
+            parser.error("--postgres-check needs --postgres-dsn")
+        if psycopg2 is None:
+            parser.error("--postgres-check needs psycopg2 (pip install psycopg2-binary)")
+        check_postgres(args.postgres_dsn, args.postgres_timeout)
+        raise SystemExit(0)
 
-        print(f"Performance monitoring stopped. {len(self.metrics)} metrics saved.")
+    groups = DEFAULT_PROCESS_GROUPS
+    if args.process_group:
+        groups = [tuple(group.split("=", 1)) for group in args.process_group]
+    samplers = [HostSampler(), ProcessSampler(groups)]
+    if args.postgres_dsn:
+        try:
+            samplers.append(PostgresSampler(args.postgres_dsn, args.postgres_every, args.top_statements,
+                                            args.postgres_timeout))
+        except RuntimeError as e:
+            parser.error(str(e))
+    monitor = PerformanceMonitor(args.interval, args.output, args.buffer_size, samplers=samplers)
+    monitor.start_monitoring()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        monitor.stop_monitoring()
@@ -1,27 +1,253 @@
 import json
+import os
 import random
 import time
-from locust import HttpUser, task, between
-from urllib.parse import urlencode
+from locust import HttpUser, task, between, events
+from locust.contrib.fasthttp import FastHttpUser
+from locust.runners import WorkerRunner
 import logging
 
+import histograms  # noqa: F401 - exports mergeable latency histograms with --csv
+import guardrails  # noqa: F401 - stops the run on SLO breaches set in ODOO_LOCUST_SLOS
+from data_feeder import load_feeds
+from deadlines import DeadlineHttpAdapter, FirstByteResponse, deadline, load_deadlines, stamp_first_byte
+from http_cache import BrowserCache
+from id_pool import RecordIdPools
+from monitoring import load_monitor
+from odoo_rpc import CallKw, Slot, JSON_HEADERS, odoo_values
+from session_pool import load_session_pool
+from web_client import WebClientMenu
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class OdooLoadTest(HttpUser):
-    wait_time = between(2, 5)  # Wait 2-5 seconds between tasks
+# HTTP engine the users run on, picked per run with ODOO_LOCUST_ENGINE:
+#   http - requests-based HttpUser (default)
+#   fast - geventhttpclient-based FastHttpUser, several times more requests/s per core
+USER_ENGINES = {
+    "http": HttpUser,
+    "fast": FastHttpUser,
+}
+ENGINE = os.environ.get("ODOO_LOCUST_ENGINE", "http")
+if ENGINE not in USER_ENGINES:
+    raise ValueError(f"Unknown ODOO_LOCUST_ENGINE '{ENGINE}', expected one of {list(USER_ENGINES)}")
+
+# Connect/read/total deadlines per task category, see deadlines.py
+DEADLINES = load_deadlines()
+
+# Logged-in sessions shared between users with ODOO_LOCUST_SESSIONS=N, see session_pool.py
+SESSIONS = load_session_pool()
+
+# Generated records for the create tasks with ODOO_LOCUST_FEEDS, see data_feeder.py
+FEEDS = load_feeds()
+
+
+# =============================================================================
+# JSON-RPC CALL TEMPLATES
+# =============================================================================
+# Compiled once at import; tasks only fill in the Slot values
+
+FETCH_PARTNERS = CallKw("res.partner", "search_read", args=[[]], kwargs={
+    "fields": ["name", "email", "phone", "is_company"],
+    "limit": 50,
+    "offset": Slot("offset")
+})
+
+FETCH_PRODUCTS = CallKw("product.template", "search_read", args=[[]], kwargs={
+    "fields": ["name", "list_price", "categ_id", "active"],
+    "limit": 50,
+    "offset": Slot("offset")
+})
+
+FETCH_SALES_ORDERS = CallKw("sale.order", "search_read", args=[[]], kwargs={
+    "fields": ["name", "partner_id", "amount_total", "state", "date_order"],
+    "limit": 30,
+    "order": "date_order desc"
+})
+
+CREATE_PARTNER = CallKw("res.partner", "create", args=[{
+    "name": Slot("name"),
+    "email": Slot("email"),
+    "phone": Slot("phone"),
+    "is_company": Slot("is_company"),
+    "street": Slot("street"),
+    "city": "Test City",
+    "zip": Slot("zip")
+}])
+
+CREATE_PRODUCT = CallKw("product.template", "create", args=[{
+    "name": Slot("name"),
+    "list_price": Slot("list_price"),
+    "type": Slot("type"),
+    "categ_id": 1,  # All / Saleable category - adjust as needed
+    "active": True,
+    "description": Slot("description")
+}])
+
+# Every field of a record from a data feed
+CREATE_FED_PARTNER = CallKw("res.partner", "create", args=[Slot("values")])
+CREATE_FED_PRODUCT = CallKw("product.template", "create", args=[Slot("values")])
+
+CREATE_SALE_ORDER = CallKw("sale.order", "create", args=[{
+    "partner_id": Slot("partner_id"),
+    "state": "draft",
+    "date_order": Slot("date_order")
+}])
+
+UPDATE_PARTNER = CallKw("res.partner", "write", args=[Slot("ids"), {
+    "phone": Slot("phone"),
+    "street": Slot("street")
+}])
+
+FILTERED_PARTNER_SEARCHES = [
+    CallKw("res.partner", "search_read", args=[domain], kwargs={
+        "fields": ["name", "email", "is_company"],
+        "limit": 20
+    })
+    for domain in [
+        [['is_company', '=', True]],  # Companies only
+        [['email', '!=', False]],     # Partners with email
+        [['active', '=', True]],      # Active partners only
+        [['create_date', '>=', '2023-01-01']]  # Recent partners
+    ]
+]
+
+COUNT_SALES_ORDERS = CallKw("sale.order", "search_count", args=[[]])
+
+HEAVY_PARTNER_LOAD = CallKw("res.partner", "search_read", args=[[]], kwargs={
+    "fields": ["name", "email", "phone", "street", "city", "country_id"],
+    "limit": 200  # Heavy load
+})
+
+# =============================================================================
+# WEB CLIENT MENUS
+# =============================================================================
+# The list view each menu opens; adjust actions, domains and groupings to your database
+
+MANY2ONE = {"fields": {"display_name": {}}}
+
+SALES_MENU = WebClientMenu(
+    "Sales Menu",
+    action="sale.action_orders",
+    model="sale.order",
+    specification={
+        "name": {},
+        "date_order": {},
+        "partner_id": MANY2ONE,
+        "user_id": MANY2ONE,
+        "amount_total": {},
+        "state": {}
+    },
+    domain=[["state", "not in", ["draft", "sent", "cancel"]]],
+    groupby=["state"]
+)
+
+INVENTORY_MENU = WebClientMenu(
+    "Inventory Menu",
+    action="stock.action_picking_tree_all",
+    model="stock.picking",
+    specification={
+        "name": {},
+        "partner_id": MANY2ONE,
+        "scheduled_date": {},
+        "origin": {},
+        "picking_type_id": MANY2ONE,
+        "state": {}
+    },
+    groupby=["picking_type_id"]
+)
+
+ACCOUNTING_MENU = WebClientMenu(
+    "Accounting Menu",
+    action="account.action_move_journal_line",
+    model="account.move",
+    specification={
+        "date": {},
+        "name": {},
+        "partner_id": MANY2ONE,
+        "ref": {},
+        "journal_id": MANY2ONE,
+        "amount_total_signed": {},
+        "state": {}
+    },
+    domain=[["move_type", "=", "entry"]],
+    groupby=["journal_id"]
+)
+
+# Record IDs known to this worker, so write tasks can pick one without a search round-trip
+ID_POOLS = RecordIdPools(["res.partner", "product.template", "sale.order"])
+
+
+@events.test_stop.add_listener
+def stop_id_pool_refresh(environment, **kwargs):
+    ID_POOLS.stop()
+
+
+# Host metrics sampled for the length of the test with ODOO_LOCUST_MONITOR_INTERVAL, see monitoring.py
+MONITOR = load_monitor()
+
+
+@events.test_start.add_listener
+def start_monitor(environment, **kwargs):
+    # Workers leave it to the master, which knows the user count of the whole run
+    if MONITOR is not None and not isinstance(environment.runner, WorkerRunner):
+        MONITOR.start_monitoring(user_count=lambda: environment.runner.user_count)
+
+
+@events.test_stop.add_listener
+def stop_monitor(environment, **kwargs):
+    if MONITOR is not None:
+        MONITOR.stop_monitoring()
+
+
+class OdooUser(USER_ENGINES[ENGINE]):
+    """Odoo session handling shared by every user class, on the selected engine"""
+    abstract = True
+    deadlines = DEADLINES
+
+    # FastHttpUser only sets socket timeouts when it opens a connection, so it gets the
+    # loosest limits here; the per-category total deadline still applies to every task
+    connection_timeout = max(limits.connect for limits in DEADLINES.values())
+    network_timeout = max(limits.read for limits in DEADLINES.values())
+    browser_cache_bytes = 50 * 1024 * 1024
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if ENGINE == "fast":
+            self.client.client.response_type = FirstByteResponse
+        else:
+            self.client.mount("https://", DeadlineHttpAdapter(pool_manager=self.pool_manager))
+            self.client.mount("http://", DeadlineHttpAdapter(pool_manager=self.pool_manager))
+            self.client.hooks["response"].append(stamp_first_byte)
         self.csrf_token = None
         self.session_id = None
         self.database = "medunited_acc_prod_latest"  # Change this
         self.user_id = None
+        self.browser_cache = BrowserCache(self.browser_cache_bytes)
+        self.pooled_session = None
+        self.session_generation = 0
+
+    @property
+    def cookie_jar(self):
+        return self.client.cookiejar if ENGINE == "fast" else self.client.cookies
+
+    def context(self):
+        return {"odoo_user": self}
 
+    @deadline("menu")
     def on_start(self):
         """Initialize session and login"""
-        self.login()
+        self.start_session()
+        if self.user_id is not None:
+            ID_POOLS.ensure_started(self.client)
+
+    def start_session(self):
+        """Log in, or borrow one of the pooled sessions when ODOO_LOCUST_SESSIONS is set"""
+        if SESSIONS is None:
+            self.login()
+        else:
+            SESSIONS.attach(self)
 
     def get_csrf_token(self):
         """Extract CSRF token from login page"""
@@ -68,139 +294,90 @@ class OdooLoadTest(HttpUser):
                 end = response.text.find(',', start)
                 self.user_id = int(response.text[start:end])
                 logger.info(f"User ID extracted: {self.user_id}")
+            self.browser_cache.load_page_assets(self, response.text)
         except Exception as e:
             logger.error(f"Failed to extract session info: {e}")
 
+    def drop_connections(self):
+        """Close pooled connections so the next request opens a fresh one"""
+        if ENGINE == "fast":
+            self.client.client.clientpool.close()
+        else:
+            self.client.close()
+
+
+class OdooLoadTest(OdooUser):
+    wait_time = between(2, 5)  # Wait 2-5 seconds between tasks
+
     # =============================================================================
     # MENU LOADING TESTS
     # =============================================================================
 
     @task(10)
+    @deadline("menu")
     def load_main_dashboard(self):
         """Load main dashboard/home page"""
-        with self.client.get("/web", name="Main Dashboard") as response:
+        with self.client.get("/web", name="Main Dashboard", catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Dashboard failed to load")
+                return
+        self.browser_cache.load_page_assets(self, response.text)
 
     @task(8)
+    @deadline("menu")
     def load_sales_menu(self):
-        """Load Sales menu and views"""
-        menu_params = {
-            "action": "sale.action_orders",
-            "model": "sale.order",
-            "view_type": "list",
-            "menu_id": "174"  # Adjust based on your menu structure
-        }
-
-        url = f"/web#{urlencode(menu_params)}"
-        with self.client.get(url, name="Sales Menu") as response:
-            if response.status_code != 200:
-                response.failure("Sales menu failed to load")
+        """Open Sales: action, views, orders and their grouping"""
+        SALES_MENU.load(self)
 
     @task(6)
+    @deadline("menu")
     def load_inventory_menu(self):
-        """Load Inventory menu"""
-        menu_params = {
-            "action": "stock.action_picking_tree_all",
-            "model": "stock.picking",
-            "view_type": "list"
-        }
-
-        url = f"/web#{urlencode(menu_params)}"
-        with self.client.get(url, name="Inventory Menu") as response:
-            if response.status_code != 200:
-                response.failure("Inventory menu failed to load")
+        """Open Inventory transfers"""
+        INVENTORY_MENU.load(self)
 
     @task(5)
+    @deadline("menu")
     def load_accounting_menu(self):
-        """Load Accounting menu"""
-        menu_params = {
-            "action": "account.action_move_journal_line",
-            "model": "account.move",
-            "view_type": "list"
-        }
-
-        url = f"/web#{urlencode(menu_params)}"
-        with self.client.get(url, name="Accounting Menu") as response:
-            if response.status_code != 200:
-                response.failure("Accounting menu failed to load")
+        """Open Accounting journal entries"""
+        ACCOUNTING_MENU.load(self)
 
     # =============================================================================
     # DATA FETCHING TESTS
     # =============================================================================
 
     @task(15)
+    @deadline("read")
     def fetch_partners_data(self):
         """Fetch partners/customers data"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "search_read",
-                "args": [[]],
-                "kwargs": {
-                    "fields": ["name", "email", "phone", "is_company"],
-                    "limit": 50,
-                    "offset": random.randint(0, 100)
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/res.partner/search_read",
-                              json=payload,
-                              name="Fetch Partners Data") as response:
+        with self.client.post(FETCH_PARTNERS.url,
+                              data=FETCH_PARTNERS.encode(offset=random.randint(0, 100)),
+                              headers=JSON_HEADERS,
+                              name="Fetch Partners Data",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to fetch partners data")
 
     @task(12)
+    @deadline("read")
     def fetch_products_data(self):
         """Fetch products data"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "product.template",
-                "method": "search_read",
-                "args": [[]],
-                "kwargs": {
-                    "fields": ["name", "list_price", "categ_id", "active"],
-                    "limit": 50,
-                    "offset": random.randint(0, 50)
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/product.template/search_read",
-                              json=payload,
-                              name="Fetch Products Data") as response:
+        with self.client.post(FETCH_PRODUCTS.url,
+                              data=FETCH_PRODUCTS.encode(offset=random.randint(0, 50)),
+                              headers=JSON_HEADERS,
+                              name="Fetch Products Data",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to fetch products data")
 
     @task(10)
+    @deadline("read")
     def fetch_sales_orders(self):
         """Fetch sales orders data"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "sale.order",
-                "method": "search_read",
-                "args": [[]],
-                "kwargs": {
-                    "fields": ["name", "partner_id", "amount_total", "state", "date_order"],
-                    "limit": 30,
-                    "order": "date_order desc"
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/sale.order/search_read",
-                              json=payload,
-                              name="Fetch Sales Orders") as response:
+        with self.client.post(FETCH_SALES_ORDERS.url,
+                              data=FETCH_SALES_ORDERS.encode(),
+                              headers=JSON_HEADERS,
+                              name="Fetch Sales Orders",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to fetch sales orders")
 
@@ -209,33 +386,30 @@ class OdooLoadTest(HttpUser):
     # =============================================================================
 
     @task(5)
+    @deadline("write")
     def create_partner(self):
         """Create a new partner/customer"""
-        partner_data = {
-            "name": f"Test Customer {random.randint(1000, 9999)}",
-            "email": f"test{random.randint(1000, 9999)}@example.com",
-            "phone": f"+1-555-{random.randint(1000, 9999)}",
-            "is_company": random.choice([True, False]),
-            "street": f"{random.randint(100, 999)} Test Street",
-            "city": "Test City",
-            "zip": f"{random.randint(10000, 99999)}"
-        }
-
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "create",
-                "args": [partner_data],
-                "kwargs": {}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/res.partner/create",
-                              json=payload,
-                              name="Create Partner") as response:
+        feed = FEEDS.get("res.partner")
+        record = feed.next() if feed is not None else None
+        if record is not None:
+            payload = CREATE_FED_PARTNER.encode(values=odoo_values(record))
+        elif feed is not None and feed.stopped:
+            return
+        else:
+            payload = CREATE_PARTNER.encode(
+                name=f"Test Customer {random.randint(1000, 9999)}",
+                email=f"test{random.randint(1000, 9999)}@example.com",
+                phone=f"+1-555-{random.randint(1000, 9999)}",
+                is_company=random.choice([True, False]),
+                street=f"{random.randint(100, 999)} Test Street",
+                zip=f"{random.randint(10000, 99999)}"
+            )
+
+        with self.client.post(CREATE_PARTNER.url,
+                              data=payload,
+                              headers=JSON_HEADERS,
+                              name="Create Partner",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to create partner")
             else:
@@ -245,36 +419,33 @@ class OdooLoadTest(HttpUser):
                         response.failure(f"Partner creation error: {result['error']}")
                     else:
                         logger.info(f"Partner created with ID: {result.get('result')}")
+                        ID_POOLS["res.partner"].add(result['result'])
                 except:
                     response.failure("Invalid JSON response for partner creation")
 
     @task(3)
+    @deadline("write")
     def create_product(self):
         """Create a new product"""
-        product_data = {
-            "name": f"Test Product {random.randint(1000, 9999)}",
-            "list_price": round(random.uniform(10.0, 1000.0), 2),
-            "type": random.choice(["product", "service"]),
-            "categ_id": 1,  # All / Saleable category - adjust as needed
-            "active": True,
-            "description": f"Test product description {random.randint(1, 100)}"
-        }
-
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "product.template",
-                "method": "create",
-                "args": [product_data],
-                "kwargs": {}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/product.template/create",
-                              json=payload,
-                              name="Create Product") as response:
+        feed = FEEDS.get("product.template")
+        record = feed.next() if feed is not None else None
+        if record is not None:
+            payload = CREATE_FED_PRODUCT.encode(values=odoo_values(record))
+        elif feed is not None and feed.stopped:
+            return
+        else:
+            payload = CREATE_PRODUCT.encode(
+                name=f"Test Product {random.randint(1000, 9999)}",
+                list_price=round(random.uniform(10.0, 1000.0), 2),
+                type=random.choice(["product", "service"]),
+                description=f"Test product description {random.randint(1, 100)}"
+            )
+
+        with self.client.post(CREATE_PRODUCT.url,
+                              data=payload,
+                              headers=JSON_HEADERS,
+                              name="Create Product",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to create product")
             else:
@@ -284,56 +455,27 @@ class OdooLoadTest(HttpUser):
                         response.failure(f"Product creation error: {result['error']}")
                     else:
                         logger.info(f"Product created with ID: {result.get('result')}")
+                        ID_POOLS["product.template"].add(result['result'])
                 except:
                     response.failure("Invalid JSON response for product creation")
 
     @task(2)
+    @deadline("write")
     def create_sale_order(self):
         """Create a new sales order"""
-        # First, get a random partner ID
-        partner_search_payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "search",
-                "args": [[]],
-                "kwargs": {"limit": 1, "offset": random.randint(0, 10)}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        partner_response = self.client.post("/web/dataset/call_kw/res.partner/search",
-                                            json=partner_search_payload)
-
-        try:
-            partner_result = partner_response.json()
-            partner_id = partner_result.get('result', [1])[0] if partner_result.get('result') else 1
-        except:
-            partner_id = 1  # Fallback to admin user
+        partner_id = ID_POOLS["res.partner"].pick() or 1  # Fallback to admin user
 
         # Create the sales order
-        order_data = {
-            "partner_id": partner_id,
-            "state": "draft",
-            "date_order": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "sale.order",
-                "method": "create",
-                "args": [order_data],
-                "kwargs": {}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/sale.order/create",
-                              json=payload,
-                              name="Create Sale Order") as response:
+        payload = CREATE_SALE_ORDER.encode(
+            partner_id=partner_id,
+            date_order=time.strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+        with self.client.post(CREATE_SALE_ORDER.url,
+                              data=payload,
+                              headers=JSON_HEADERS,
+                              name="Create Sale Order",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to create sale order")
             else:
@@ -343,6 +485,7 @@ class OdooLoadTest(HttpUser):
                         response.failure(f"Sale order creation error: {result['error']}")
                     else:
                         logger.info(f"Sale order created with ID: {result.get('result')}")
+                        ID_POOLS["sale.order"].add(result['result'])
                 except:
                     response.failure("Invalid JSON response for sale order creation")
 
@@ -351,91 +494,42 @@ class OdooLoadTest(HttpUser):
     # =============================================================================
 
     @task(4)
+    @deadline("write")
     def update_partner(self):
         """Update an existing partner"""
-        # First search for a partner to update
-        search_payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "search",
-                "args": [[]],
-                "kwargs": {"limit": 1, "offset": random.randint(0, 20)}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        search_response = self.client.post("/web/dataset/call_kw/res.partner/search",
-                                           json=search_payload)
-
-        try:
-            search_result = search_response.json()
-            partner_ids = search_result.get('result', [])
-
-            if partner_ids:
-                partner_id = partner_ids[0]
-
-                # Update the partner
-                update_data = {
-                    "phone": f"+1-555-{random.randint(1000, 9999)}",
-                    "street": f"{random.randint(100, 999)} Updated Street"
-                }
-
-                update_payload = {
-                    "jsonrpc": "2.0",
-                    "method": "call",
-                    "params": {
-                        "model": "res.partner",
-                        "method": "write",
-                        "args": [[partner_id], update_data],
-                        "kwargs": {}
-                    },
-                    "id": random.randint(1, 1000000)
-                }
-
-                with self.client.post("/web/dataset/call_kw/res.partner/write",
-                                      json=update_payload,
-                                      name="Update Partner") as response:
-                    if response.status_code != 200:
-                        response.failure("Failed to update partner")
-        except Exception as e:
-            logger.error(f"Error in update_partner: {e}")
+        partner_id = ID_POOLS["res.partner"].pick()
+        if partner_id is None:
+            return  # Pool not warmed yet
+
+        update_payload = UPDATE_PARTNER.encode(
+            ids=[partner_id],
+            phone=f"+1-555-{random.randint(1000, 9999)}",
+            street=f"{random.randint(100, 999)} Updated Street"
+        )
+
+        with self.client.post(UPDATE_PARTNER.url,
+                              data=update_payload,
+                              headers=JSON_HEADERS,
+                              name="Update Partner",
+                              catch_response=True) as response:
+            if response.status_code != 200:
+                response.failure("Failed to update partner")
 
     # =============================================================================
     # SEARCH AND FILTER OPERATIONS
     # =============================================================================
 
     @task(8)
+    @deadline("read")
     def search_with_filters(self):
         """Test search with various filters"""
-        search_domains = [
-            [['is_company', '=', True]],  # Companies only
-            [['email', '!=', False]],     # Partners with email
-            [['active', '=', True]],      # Active partners only
-            [['create_date', '>=', '2023-01-01']]  # Recent partners
-        ]
-
-        domain = random.choice(search_domains)
-
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "search_read",
-                "args": [domain],
-                "kwargs": {
-                    "fields": ["name", "email", "is_company"],
-                    "limit": 20
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
+        search = random.choice(FILTERED_PARTNER_SEARCHES)
 
-        with self.client.post("/web/dataset/call_kw/res.partner/search_read",
-                              json=payload,
-                              name="Search with Filters") as response:
+        with self.client.post(search.url,
+                              data=search.encode(),
+                              headers=JSON_HEADERS,
+                              name="Search with Filters",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to search with filters")
 
@@ -444,23 +538,14 @@ class OdooLoadTest(HttpUser):
     # =============================================================================
 
     @task(2)
+    @deadline("report")
     def generate_report(self):
         """Test report generation (lighter version)"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "sale.order",
-                "method": "search_count",
-                "args": [[]],
-                "kwargs": {}
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/sale.order/search_count",
-                              json=payload,
-                              name="Generate Report Count") as response:
+        with self.client.post(COUNT_SALES_ORDERS.url,
+                              data=COUNT_SALES_ORDERS.encode(),
+                              headers=JSON_HEADERS,
+                              name="Generate Report Count",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Failed to generate report")
 
@@ -474,26 +559,14 @@ class HeavyUser(OdooLoadTest):
     weight = 1
 
     @task(20)
+    @deadline("read")
     def heavy_data_operations(self):
         """Perform heavy data operations"""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "res.partner",
-                "method": "search_read",
-                "args": [[]],
-                "kwargs": {
-                    "fields": ["name", "email", "phone", "street", "city", "country_id"],
-                    "limit": 200  # Heavy load
-                }
-            },
-            "id": random.randint(1, 1000000)
-        }
-
-        with self.client.post("/web/dataset/call_kw/res.partner/search_read",
-                              json=payload,
-                              name="Heavy Data Load") as response:
+        with self.client.post(HEAVY_PARTNER_LOAD.url,
+                              data=HEAVY_PARTNER_LOAD.encode(),
+                              headers=JSON_HEADERS,
+                              name="Heavy Data Load",
+                              catch_response=True) as response:
             if response.status_code != 200:
                 response.failure("Heavy data operation failed")
 
@@ -504,6 +577,7 @@ class LightUser(OdooLoadTest):
     wait_time = between(5, 15)  # Longer wait times
 
     @task
+    @deadline("menu")
     def browse_menus(self):
         """Light browsing operations"""
         self.load_main_dashboard()
@@ -524,3 +598,6 @@ class LightUser(OdooLoadTest):
 # Example command line usage:
 # locust -f odoo_load_test.py --host=https://your-odoo-domain.com -u 50 -r 5 -t 300s
 # This runs 50 users, spawning 5 per second, for 300 seconds
+#
+# Switch to the geventhttpclient engine for much higher request rates per worker:
+# ODOO_LOCUST_ENGINE=fast locust -f odoo_load_test.py --host=https://your-odoo-domain.com -u 50 -r 5 -t 300s
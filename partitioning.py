@@ -0,0 +1,55 @@
+# ============================================================================
+# partitioning.py - Split shared work (captures, datasets) across locust workers
+# ============================================================================
+#
+# When a test starts, the master numbers its connected workers 0..count-1 and
+# tells each one its share. Anything that must not be duplicated between
+# workers keeps only the items where partition.owns(key) is true. A
+# standalone run is partition 0 of 1 and owns everything.
+
+import zlib
+
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner, STATE_MISSING
+
+
+class WorkerPartition:
+    """This process's share of work split across the workers of a distributed run"""
+
+    def __init__(self):
+        self.index = 0
+        self.count = 1
+
+    def owns(self, key):
+        """Whether this worker handles the item with the given key"""
+        if self.count == 1:
+            return True
+        return zlib.crc32(str(key).encode()) % self.count == self.index
+
+    def __repr__(self):
+        return f"WorkerPartition({self.index}/{self.count})"
+
+
+PARTITION = WorkerPartition()
+
+
+@events.init.add_listener
+def setup_partitioning(environment, **kwargs):
+    if isinstance(environment.runner, MasterRunner):
+        environment.events.test_start.add_listener(assign_partitions)
+    elif isinstance(environment.runner, WorkerRunner):
+        environment.runner.register_message("partition", receive_partition)
+
+
+def assign_partitions(environment, **kwargs):
+    """Master: number the connected workers, before any users are spawned on them"""
+    worker_ids = sorted(worker.id for worker in environment.runner.clients.values()
+                        if worker.state != STATE_MISSING)
+    for index, worker_id in enumerate(worker_ids):
+        environment.runner.send_message("partition", {"index": index, "count": len(worker_ids)},
+                                        client_id=worker_id)
+
+
+def receive_partition(environment, msg, **kwargs):
+    PARTITION.index = msg.data["index"]
+    PARTITION.count = msg.data["count"]
@@ -0,0 +1,203 @@
+# ============================================================================
+# replay.py - Replay captured Odoo web-client traffic
+# ============================================================================
+#
+# Plays back a JSONL capture, one request per line:
+#   {"ts": 12.5, "session": "a1b2", "method": "POST",
+#    "path": "/web/dataset/call_kw/res.partner/web_search_read", "body": {...}}
+# ts is seconds since the start of the capture and session is any key that
+# groups a browser session's requests. Gzipped captures (.gz) work too.
+#
+# The file is streamed, never loaded whole. Every capture session is pinned
+# to one running OdooReplayUser, which plays its requests on its own logged-in
+# Odoo session. In distributed runs the capture sessions are split between
+# workers (see partitioning.py), so no request is sent twice.
+#
+# Run with:
+# locust -f replay.py --host=https://your-odoo-domain.com -u 50 -r 10 --replay-file capture.jsonl --replay-speed 2
+
+import gzip
+import json
+import logging
+import time
+
+import gevent
+from gevent.pool import Pool
+from locust import events, task, constant
+
+import odoo_load_test
+from deadlines import DEFAULT_DEADLINES, deadline
+from odoo_rpc import JSON_HEADERS
+from partitioning import PARTITION
+
+logger = logging.getLogger(__name__)
+
+# Authentication in the capture belongs to someone else; our users log in themselves
+SKIPPED_PATHS = {"/web/login", "/web/session/authenticate", "/web/session/logout"}
+
+WRITE_METHODS = {"create", "write", "unlink", "copy", "action_confirm", "button_validate"}
+REPORT_METHODS = {"read_group", "web_read_group", "read_progress_bar", "search_count"}
+
+
+@events.init_command_line_parser.add_listener
+def add_replay_arguments(parser):
+    parser.add_argument("--replay-file", default="capture.jsonl", help="JSONL capture to replay")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Playback speed, 2 replays a capture twice as fast")
+
+
+class CaptureReader:
+    """Lazily streams the records of a JSONL capture that belong to this worker"""
+
+    def __init__(self, path, partition=PARTITION):
+        self.path = path
+        self.partition = partition
+
+    def __iter__(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt") as capture:
+            for line_number, line in enumerate(capture, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"Skipping line {line_number} of {self.path}: {e}")
+                    continue
+
+                if record.get("path", "").split("?")[0] in SKIPPED_PATHS:
+                    continue
+                if self.partition.owns(record.get("session", "")):
+                    yield record
+
+
+class ReplayDispatcher:
+    """Sends this worker's share of the capture through the running replay users, on schedule"""
+
+    def __init__(self, reader, speed=1.0):
+        self.reader = reader
+        self.speed = speed
+        self.users = []
+        self.sessions = {}
+        self._next_user = 0
+        self._greenlet = None
+
+    def register(self, user):
+        self.users.append(user)
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self.run)
+
+    def unregister(self, user):
+        self.users.remove(user)
+
+    def user_for(self, session):
+        """Pin each capture session to one user, round-robin over the users running now"""
+        user = self.sessions.get(session)
+        if user is None or user not in self.users:
+            user = self.users[self._next_user % len(self.users)]
+            self._next_user += 1
+            self.sessions[session] = user
+        return user
+
+    def run(self):
+        started = time.time()
+        first_ts = None
+        replayed = 0
+
+        for record in self.reader:
+            if first_ts is None:
+                first_ts = record.get("ts", 0)
+            delay = started + (record.get("ts", first_ts) - first_ts) / self.speed - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+
+            while not self.users:
+                gevent.sleep(1)
+
+            self.user_for(record.get("session", "")).replay(record)
+            replayed += 1
+
+        logger.info(f"Capture {self.reader.path} finished: {replayed} requests replayed on {PARTITION}")
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+
+
+_dispatcher = None
+
+
+@events.test_stop.add_listener
+def stop_replay(environment, **kwargs):
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.stop()
+        _dispatcher = None
+
+
+def replay_category(record):
+    """Deadline category of a captured request"""
+    path = record.get("path", "")
+    if "/call_kw/" not in path and "/dataset/" not in path:
+        return "menu"
+    method = path.rstrip("/").rsplit("/", 1)[-1]
+    if method in WRITE_METHODS:
+        return "write"
+    if method in REPORT_METHODS:
+        return "report"
+    return "read"
+
+
+def replay_request(user, record):
+    """Send one captured request and check the response like the synthetic tasks do"""
+    path = record["path"]
+    kwargs = {"name": f"Replay {path.split('?')[0]}", "catch_response": True}
+    body = record.get("body")
+    if body is not None:
+        kwargs["data"] = body if isinstance(body, str) else json.dumps(body)
+        kwargs["headers"] = JSON_HEADERS
+
+    with user.client.request(record.get("method", "GET").upper(), path, **kwargs) as response:
+        if response.status_code >= 400 or response.status_code == 0:
+            response.failure(f"Replayed request failed with status {response.status_code}")
+        elif body is not None:
+            try:
+                if "error" in response.json():
+                    response.failure("JSON-RPC error in replayed request")
+            except ValueError:
+                response.failure("Invalid JSON response for replayed request")
+
+
+REPLAY_SENDERS = {category: deadline(category)(replay_request) for category in DEFAULT_DEADLINES}
+
+
+class OdooReplayUser(odoo_load_test.OdooUser):
+    """One logged-in Odoo session that plays back the capture sessions pinned to it"""
+    wait_time = constant(1)
+    max_in_flight = 100
+    # FastHttpUser's per-session connection limit, like a browser's parallel requests
+    concurrency = 6
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = Pool(self.max_in_flight)
+
+    def on_start(self):
+        global _dispatcher
+        super().on_start()
+        if _dispatcher is None:
+            options = self.environment.parsed_options
+            _dispatcher = ReplayDispatcher(CaptureReader(options.replay_file), options.replay_speed)
+        _dispatcher.register(self)
+
+    def on_stop(self):
+        if _dispatcher is not None:
+            _dispatcher.unregister(self)
+        self.in_flight.kill(block=False)
+
+    def replay(self, record):
+        self.in_flight.spawn(REPLAY_SENDERS[replay_category(record)], self, record)
+
+    @task
+    def wait_for_replay(self):
+        """Requests are pushed by the dispatcher; the user itself only stays alive"""
@@ -1,9 +1,64 @@
+import importlib
+import json
+import logging
+import os
+import statistics
 import subprocess
 import sys
 import argparse
 import time
 from datetime import datetime
 
+# locust first: it monkey-patches the standard library before requests imports ssl
+from locust import events
+from locust.argument_parser import get_parser
+from locust.env import Environment
+from locust.log import setup_logging
+from locust.runners import STATE_INIT, STATE_STOPPED
+from locust.stats import CSV_STATS_INTERVAL_SEC, PERCENTILES_TO_REPORT, StatsCSVFileWriter, print_percentile_stats, print_stats
+from locust.util.load_locustfile import is_shape_class, is_user_class
+from locust.util.timespan import parse_timespan
+import gevent
+import requests
+
+import guardrails
+
+# Between scenarios, wait until the target answers its login page about as fast as before
+# the first one: median of COOLDOWN_PROBES requests within COOLDOWN_TOLERANCE of the baseline
+COOLDOWN_PROBES = 5
+COOLDOWN_TOLERANCE = 1.2
+COOLDOWN_SLACK_MS = 20
+COOLDOWN_MIN_SECONDS = 5
+COOLDOWN_MAX_SECONDS = 60
+
+PROGRESS_EVERY_SECONDS = 10
+
+
+def load_locustfile_classes(locustfile):
+    """User classes and load shape of a locustfile, imported once as a regular module
+
+    Importing instead of loading by path keeps every module-level listener
+    registered exactly once, however many scenarios use the file.
+    """
+    module = importlib.import_module(os.path.splitext(os.path.basename(locustfile))[0])
+    user_classes = [value for value in vars(module).values() if is_user_class(value)]
+    shape_classes = [value for value in vars(module).values() if is_shape_class(value)]
+    return user_classes, (shape_classes[0]() if shape_classes else None)
+
+
+def probe_latency(host, probes=COOLDOWN_PROBES):
+    """Median time in ms for the target to answer its login page, or None if it doesn't"""
+    timings = []
+    for _ in range(probes):
+        started = time.perf_counter()
+        try:
+            requests.get(f"{host}/web/login", timeout=10)
+        except requests.RequestException:
+            return None
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
 class OdooLoadTestRunner:
     """Automated test runner for different scenarios"""
 
@@ -28,36 +83,224 @@ class OdooLoadTestRunner:
         },
         "stress": {
             "users": 200,
-            "spawn_rate": 20,
+            "spawn_rate": 0.5,
             "duration": "10m",
-            "description": "Stress test - 200 users, find breaking point"
+            "description": "Stress test - ramp to 200 users over 400s, find breaking point (analysis.py --capacity)"
+        },
+        "open": {
+            "users": 20,
+            "spawn_rate": 20,
+            "duration": "15m",
+            "arrival_rate": 40,
+            "description": "Open model - 40 tasks/s from the OdooLoadTest mix, however slow Odoo gets"
+        },
+        "search": {
+            "locustfile": "breaking_point.py",
+            "options": ["--slo-p95", "2000", "--slo-error-rate", "1", "--search-max-users", "1000"],
+            "description": "Breaking point search - most users within p95 < 2s and < 1% errors, in one run"
+        },
+        "steps": {
+            "profile": {"type": "step", "start_users": 20, "step_users": 20, "steps": 5, "step_duration": "3m",
+                        "spawn_rate": 5},
+            "description": "Step load - 20 to 100 users in steps of 20, 3 minutes each"
+        },
+        "spike": {
+            "profile": {"type": "spike", "users": 20, "spike_users": 150, "before": "5m", "spike": "3m",
+                        "after": "10m", "spawn_rate": 50},
+            "description": "Month-end spike - 20 users, 150 for 3 minutes, then 10 minutes to recover"
+        },
+        "soak": {
+            "profile": {"type": "soak", "users": 50, "duration": "2h", "spawn_rate": 1},
+            "description": "Soak - 50 users for 2 hours, for leaks and slow degradation"
+        },
+        "diurnal": {
+            "profile": {"type": "diurnal", "csv": "diurnal_users.csv", "hour": "1m", "spawn_rate": 10},
+            "description": "Working day - users per hour from diurnal_users.csv, one minute per hour"
         }
     }
 
+    # What --scenario=all runs: the quick fixed-size scenarios, about an hour in all. The open
+    # model, the search and the load profiles (a 2h soak among them) only run on request
+    all_scenarios = ["light", "medium", "heavy", "stress"]
+
+    def __init__(self):
+        self.environment = None
+        self.baseline_ms = None
+
+    def scenario_locustfile(self, scenario):
+        # Load profiles run as a load shape; scenarios with an arrival_rate run the open model
+        # instead of closed-loop users
+        if "profile" in scenario:
+            return "load_shapes.py"
+        return scenario.get("locustfile", "arrival_rate.py" if "arrival_rate" in scenario else "odoo_load_test.py")
+
+    def scenario_arguments(self, scenario):
+        """The scenario's own locust arguments: its arrival rate, load profile and options"""
+        args = []
+        if "arrival_rate" in scenario:
+            args.extend(["--arrival-rate", str(scenario["arrival_rate"] / scenario["users"])])
+        if "profile" in scenario:
+            args.extend(["--load-profile", json.dumps(scenario["profile"])])
+        return args + scenario.get("options", [])
+
+    def planned_seconds(self, scenario):
+        """How long a scenario runs, or None when it runs until it has an answer"""
+        if "profile" in scenario:
+            import load_shapes
+
+            return sum(stage.duration for stage in load_shapes.load_profile(scenario["profile"]))
+        if "duration" in scenario:
+            return parse_timespan(scenario["duration"])
+        return None
+
+    def scenario_options(self, scenario, host, csv_prefix):
+        """locust's options for a scenario, with the defaults from locust.conf and the locustfiles' own arguments"""
+        args = ["-f", self.scenario_locustfile(scenario), "--host", host, "--csv", csv_prefix, "--csv-full-history"]
+        options = get_parser().parse_args(args + self.scenario_arguments(scenario))
+        # A finished load shape would otherwise quit the runner the next scenario reuses
+        options.headless = False
+        return options
+
     def run_scenario(self, scenario_name, host, headless=False):
-        """Run a specific test scenario"""
+        """Run a specific test scenario; returns its final stats, or None without --headless"""
         if scenario_name not in self.scenarios:
             print(f"Unknown scenario: {scenario_name}")
             print(f"Available scenarios: {list(self.scenarios.keys())}")
             return
 
+        if not headless:
+            return self.run_scenario_with_ui(scenario_name, host)
+
+        # Every locustfile before anything else: their arguments and init listeners must be in place
+        locustfiles = {locustfile: load_locustfile_classes(locustfile)
+                       for locustfile in {self.scenario_locustfile(scenario) for scenario in self.scenarios.values()}}
+
+        scenario = self.scenarios[scenario_name]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        csv_prefix = f"results_{scenario_name}_{timestamp}"
+        options = self.scenario_options(scenario, host, csv_prefix)
+        user_classes, shape = locustfiles[self.scenario_locustfile(scenario)]
+
+        # One Environment and runner for every scenario of the session
+        if self.environment is None:
+            setup_logging(options.loglevel)
+            self.environment = Environment(user_classes=user_classes, shape_class=shape, host=host,
+                                           parsed_options=options, events=events)
+            self.environment.create_local_runner()
+            events.init.fire(environment=self.environment, runner=self.environment.runner, web_ui=None)
+        environment = self.environment
+        runner = environment.runner
+        environment.user_classes = user_classes
+        environment.shape_class = shape
+        environment.host = host
+        environment.parsed_options = options
+        if shape is not None:
+            shape.runner = runner
+
+        log_handler = logging.FileHandler(f"locust_{scenario_name}_{timestamp}.log")
+        log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s/%(name)s: %(message)s"))
+        logging.getLogger().addHandler(log_handler)
+
+        print(f"\nRunning scenario: {scenario['description']}")
+        environment.stats.reset_all()
+        csv_writer = StatsCSVFileWriter(environment, PERCENTILES_TO_REPORT, csv_prefix, full_history=True)
+        csv_greenlet = gevent.spawn(csv_writer.stats_writer)
+        started = time.monotonic()
+        environment.process_exit_code = None
+        try:
+            if shape is not None:
+                runner.start_shape()
+            else:
+                # A reused runner otherwise reads as stopped until every user is spawned
+                runner.update_state(STATE_INIT)
+                runner.start(scenario["users"], scenario["spawn_rate"])
+            self.watch(scenario_name, scenario, started)
+        except KeyboardInterrupt:
+            print(f"\nScenario '{scenario_name}' interrupted")
+        finally:
+            runner.stop()
+            # One more pass of the writer puts the final numbers in the CSVs
+            gevent.sleep(CSV_STATS_INTERVAL_SEC + 0.1)
+            csv_greenlet.kill()
+            csv_writer.close_files()
+            logging.getLogger().removeHandler(log_handler)
+            log_handler.close()
+
+        print_stats(environment.stats, current=False)
+        print_percentile_stats(environment.stats)
+        live = self.live_stats()
+        if live["aborted"]:
+            print(f"\nScenario '{scenario_name}' aborted after {time.monotonic() - started:.0f}s: {live['aborted']}")
+        else:
+            print(f"\nScenario '{scenario_name}' finished after {time.monotonic() - started:.0f}s")
+        print(f"Results saved with timestamp: {timestamp}")
+        return live
+
+    def watch(self, scenario_name, scenario, started):
+        """Wait for the scenario to end: its duration, or its load shape stopping the runner
+
+        Every second reads the live stats, so decisions don't wait for the CSVs.
+        """
+        runner = self.environment.runner
+        duration = parse_timespan(scenario["duration"]) if "duration" in scenario and "users" in scenario else None
+        last_progress = started
+        while runner.state != STATE_STOPPED:
+            now = time.monotonic()
+            if duration is not None and now - started >= duration:
+                return
+            if now - last_progress >= PROGRESS_EVERY_SECONDS:
+                last_progress = now
+                live = self.live_stats()
+                print(f"[{now - started:.0f}s] {live['users']} users, {live['requests_per_s']:.1f} req/s, "
+                      f"p95 {live['p95']}ms, {live['failure_rate']:.2f}% failures")
+            gevent.sleep(1)
+
+    def live_stats(self):
+        """Current numbers of the running scenario, straight from locust's in-memory stats"""
+        total = self.environment.stats.total
+        aborted = self.environment.process_exit_code == guardrails.SLO_ABORT_EXIT_CODE
+        return {
+            "users": self.environment.runner.user_count,
+            "requests": total.num_requests,
+            "failures": total.num_failures,
+            "failure_rate": total.fail_ratio * 100,
+            "requests_per_s": total.current_rps,
+            "p95": total.get_current_response_time_percentile(0.95),
+            "total_p95": total.get_response_time_percentile(0.95),
+            "aborted": guardrails.GUARDRAILS.abort_reason if aborted else None,
+        }
+
+    def cool_down(self, host):
+        """Wait until the target's latency is back to the baseline, at most COOLDOWN_MAX_SECONDS"""
+        started = time.monotonic()
+        gevent.sleep(COOLDOWN_MIN_SECONDS)
+        while time.monotonic() - started < COOLDOWN_MAX_SECONDS:
+            latency = probe_latency(host)
+            if self.baseline_ms is None or (
+                    latency is not None and latency <= self.baseline_ms * COOLDOWN_TOLERANCE + COOLDOWN_SLACK_MS):
+                print(f"Target back to baseline after {time.monotonic() - started:.0f}s")
+                return
+            gevent.sleep(COOLDOWN_MIN_SECONDS)
+        print(f"Target still slower than its baseline after {COOLDOWN_MAX_SECONDS}s, continuing")
+
+    def run_scenario_with_ui(self, scenario_name, host):
+        """Start locust with its web UI for a scenario; the scenario only sets the defaults"""
         scenario = self.scenarios[scenario_name]
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         cmd = [
             "locust",
-            "-f", "odoo_load_test.py",
+            "-f", self.scenario_locustfile(scenario),
             "--host", host,
-            "-u", str(scenario["users"]),
-            "-r", str(scenario["spawn_rate"]),
-            "-t", scenario["duration"],
             "--csv", f"results_{scenario_name}_{timestamp}",
             "--csv-full-history",
             "--logfile", f"locust_{scenario_name}_{timestamp}.log"
         ]
 
-        if headless:
-            cmd.append("--headless")
+        # Without users the locustfile's load shape decides the load and when to stop
+        if "users" in scenario:
+            cmd.extend(["-u", str(scenario["users"]), "-r", str(scenario["spawn_rate"]), "-t", scenario["duration"]])
+        cmd.extend(self.scenario_arguments(scenario))
 
         print(f"\nRunning scenario: {scenario['description']}")
         print(f"Command: {' '.join(cmd)}")
@@ -67,19 +310,43 @@ class OdooLoadTestRunner:
             print(f"\nScenario '{scenario_name}' completed successfully!")
             print(f"Results saved with timestamp: {timestamp}")
         except subprocess.CalledProcessError as e:
-            print(f"Test failed with error: {e}")
+            if e.returncode == guardrails.SLO_ABORT_EXIT_CODE:
+                print(f"\nScenario '{scenario_name}' aborted on an SLO breach, see the log")
+            else:
+                print(f"Test failed with error: {e}")
+
+    def run_all_scenarios(self, host, include=()):
+        """Run all_scenarios plus the included ones sequentially in this process, cooling down adaptively in between"""
+        scenario_names = list(dict.fromkeys(self.all_scenarios + list(include)))
+        planned = [self.planned_seconds(self.scenarios[scenario_name]) for scenario_name in scenario_names]
+        print(f"Planned: {', '.join(scenario_names)}, {sum(seconds or 0 for seconds in planned) / 60:.0f} minutes "
+              f"of load plus cool-downs" + (" and open-ended searches" if None in planned else ""))
+
+        self.baseline_ms = probe_latency(host)
+        if self.baseline_ms is not None:
+            print(f"Baseline login page latency: {self.baseline_ms:.0f}ms")
+
+        results = {}
+        for index, scenario_name in enumerate(scenario_names):
+            if index:
+                print("\nCooling down until the target is back to its baseline...")
+                self.cool_down(host)
 
-    def run_all_scenarios(self, host):
-        """Run all scenarios sequentially"""
-        for scenario_name in self.scenarios:
             print(f"\n{'='*60}")
             print(f"Starting scenario: {scenario_name}")
             print(f"{'='*60}")
 
-            self.run_scenario(scenario_name, host, headless=True)
+            results[scenario_name] = self.run_scenario(scenario_name, host, headless=True)
+            # Heavier scenarios would only breach harder
+            if results[scenario_name]["aborted"]:
+                print(f"\nSkipping the remaining scenarios, '{scenario_name}' breached its SLOs")
+                break
 
-            print("\nWaiting 60 seconds before next scenario...")
-            time.sleep(60)
+        print(f"\n{'='*60}")
+        for scenario_name, live in results.items():
+            print(f"{scenario_name:>8}: {live['requests']} requests, {live['failure_rate']:.2f}% failures, "
+                  f"p95 {live['total_p95']}ms" + (", aborted on SLO breach" if live["aborted"] else ""))
+        return results
 
 
 if __name__ == "__main__":
@@ -88,12 +355,20 @@ if __name__ == "__main__":
     parser.add_argument("--scenario", choices=list(OdooLoadTestRunner.scenarios.keys()) + ["all"],
                         default="medium", help="Test scenario to run")
     parser.add_argument("--headless", action="store_true", help="Run without web UI")
+    parser.add_argument("--include", nargs="+", default=[], choices=list(OdooLoadTestRunner.scenarios.keys()),
+                        metavar="SCENARIO",
+                        help=f"Scenarios --scenario=all runs after {', '.join(OdooLoadTestRunner.all_scenarios)}, "
+                             f"e.g. --include spike soak")
 
     args = parser.parse_args()
 
     runner = OdooLoadTestRunner()
 
     if args.scenario == "all":
-        runner.run_all_scenarios(args.host)
+        results = runner.run_all_scenarios(args.host, args.include)
     else:
-        runner.run_scenario(args.scenario, args.host, args.headless)
+        results = {args.scenario: runner.run_scenario(args.scenario, args.host, args.headless)}
+
+    # A distinct exit code lets CI tell an SLO abort from a broken run
+    if any(live and live["aborted"] for live in results.values()):
+        sys.exit(guardrails.SLO_ABORT_EXIT_CODE)
@@ -0,0 +1,182 @@
+# ============================================================================
+# session_pool.py - Share a few real Odoo sessions between many virtual users
+# ============================================================================
+#
+# Logging every user in costs three requests and a password hash check each,
+# so a fast ramp-up mostly measures the login storm it causes. With
+# ODOO_LOCUST_SESSIONS=N only N users log in; every other user borrows the
+# cookies, csrf token and uid of one of those N sessions, round-robin.
+#
+# Sessions are saved to ODOO_LOCUST_SESSION_FILE (default .odoo_sessions.json,
+# empty to disable) and reused by the next run against the same host. When a
+# request comes back 401 or with Odoo's SessionExpiredException, that session
+# is logged in again once and every user sharing it picks up the new cookies.
+#
+# In distributed runs every worker keeps its own pool of N sessions.
+
+import itertools
+import json
+import logging
+import os
+import weakref
+
+import gevent
+from gevent.lock import Semaphore
+from locust import events
+from requests.cookies import create_cookie
+
+logger = logging.getLogger(__name__)
+
+SESSION_EXPIRED_MARKER = b"odoo.http.SessionExpiredException"
+
+
+class PooledSession:
+    """One logged-in Odoo session and the users currently sharing it"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.cookies = None
+        self.csrf_token = None
+        self.user_id = None
+        self.generation = 0
+        self.users = weakref.WeakSet()
+        self.lock = Semaphore()
+
+    @property
+    def logged_in(self):
+        return self.cookies is not None
+
+    def capture(self, user):
+        """Take over the session the user just logged in with"""
+        self.cookies = [[cookie.name, cookie.value, cookie.domain, cookie.path] for cookie in user.cookie_jar]
+        self.csrf_token = user.csrf_token
+        self.user_id = user.user_id
+        self.generation += 1
+        user.session_generation = self.generation
+
+    def apply(self, user):
+        for name, value, domain, path in self.cookies:
+            user.cookie_jar.set_cookie(create_cookie(name, value, domain=domain, path=path))
+        user.csrf_token = self.csrf_token
+        user.user_id = self.user_id
+        user.session_generation = self.generation
+
+    def to_json(self):
+        return {"cookies": self.cookies, "csrf_token": self.csrf_token, "user_id": self.user_id}
+
+
+class SessionPool:
+    """A fixed number of Odoo sessions handed out to virtual users"""
+
+    def __init__(self, size, path=None):
+        self.size = size
+        self.path = path
+        self.sessions = [PooledSession(self) for _ in range(size)]
+        self._next_session = itertools.count()
+        self._loaded = False
+
+    def attach(self, user):
+        """Put the user on one of the pooled sessions, logging it in on first use"""
+        self._load(user.host)
+        session = self.sessions[next(self._next_session) % self.size]
+
+        with session.lock:
+            if session.logged_in:
+                session.apply(user)
+            else:
+                user.login()
+                if user.user_id is None:
+                    return False
+                session.capture(user)
+                self._save(user.host)
+
+        session.users.add(user)
+        user.pooled_session = session
+        return True
+
+    def relogin(self, user, generation):
+        """Log an expired session in again and hand its new cookies to everyone sharing it"""
+        session = user.pooled_session
+        with session.lock:
+            if session.generation != generation:
+                # Someone else already logged it in again while this request was in flight
+                if session.logged_in:
+                    session.apply(user)
+                return
+
+            logger.info(f"Session {self.sessions.index(session)} expired, logging in again")
+            user.login()
+            if user.user_id is None:
+                session.cookies = None
+                return
+            session.capture(user)
+            for other in list(session.users):
+                if other is not user:
+                    session.apply(other)
+
+        self._save(user.host)
+
+    def _load(self, host):
+        """Pick up the sessions a previous run saved for this host"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path) as f:
+                saved = json.load(f).get(host, [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring session file {self.path}: {e}")
+            return
+
+        for session, data in zip(self.sessions, saved):
+            session.cookies = data["cookies"]
+            session.csrf_token = data.get("csrf_token")
+            session.user_id = data.get("user_id")
+        logger.info(f"Reusing {min(len(saved), self.size)} saved sessions for {host}")
+
+    def _save(self, host):
+        if not self.path:
+            return
+
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        saved[host] = [session.to_json() for session in self.sessions if session.logged_in]
+
+        # Session cookies are credentials: keep the file private to this account
+        temp_path = f"{self.path}.tmp"
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(saved, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def load_session_pool():
+    """The pool configured by ODOO_LOCUST_SESSIONS, or None when every user logs in itself"""
+    size = int(os.environ.get("ODOO_LOCUST_SESSIONS", "0"))
+    if size <= 0:
+        return None
+    return SessionPool(size, os.environ.get("ODOO_LOCUST_SESSION_FILE", ".odoo_sessions.json"))
+
+
+@events.request.add_listener
+def detect_expired_session(response, context, **kwargs):
+    """Re-login lazily: the first request that finds its pooled session expired triggers it"""
+    user = context.get("odoo_user")
+    session = getattr(user, "pooled_session", None)
+    if session is None or response is None or session.lock.locked():
+        return
+
+    status = getattr(response, "status_code", 0)
+    if status == 200:
+        content = response.content or b""
+        expired = len(content) < 16384 and SESSION_EXPIRED_MARKER in content
+    else:
+        expired = status == 401
+
+    if expired:
+        gevent.spawn(session.pool.relogin, user, user.session_generation)
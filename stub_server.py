@@ -0,0 +1,354 @@
+# ============================================================================
+# stub_server.py - Minimal Odoo web/JSON-RPC stub for running the load test locally
+# ============================================================================
+
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import gevent
+import gevent.socket
+from gevent.lock import BoundedSemaphore
+from gevent.pywsgi import WSGIHandler, WSGIServer
+
+CALL_KW_PATH = re.compile(r"^/web/dataset/call_kw/(?P<model>[\w.]+)/(?P<method>\w+)$")
+
+CSRF_TOKEN = "stubcsrftoken0123456789abcdef0123456789ab"
+
+LOGIN_PAGE = (
+    '<html><head><script>var odoo = {"csrf_token":"%s"};</script></head>'
+    '<body><form action="/web/login" method="post"></form></body></html>' % CSRF_TOKEN
+).encode()
+
+WEB_PAGE = (
+    '<html><head>'
+    '<link type="text/css" rel="stylesheet" href="/web/assets/1/a1b2c3d/web.assets_web.min.css"/>'
+    '<script type="text/javascript" src="/web/assets/1/e4f5a6b/web.assets_web.min.js" defer="defer"></script>'
+    '<script>odoo.__session_info__ = {"session_info": true, "uid":2, '
+    '"name": "Stub User", "db": "stub"};</script></head>'
+    '<body><img src="/web/image/res.users/2/avatar_128"/></body></html>'
+).encode() + b" " * 8000
+
+# Hashed bundles are immutable; images are revalidated on every use, like Odoo serves them
+ASSETS = {
+    "/web/assets/1/a1b2c3d/web.assets_web.min.css": (b"." * 300_000, "text/css",
+                                                      "public, max-age=31536000, immutable"),
+    "/web/assets/1/e4f5a6b/web.assets_web.min.js": (b";" * 1_500_000, "application/javascript",
+                                                     "public, max-age=31536000, immutable"),
+    "/web/image/res.users/2/avatar_128": (b"\x89PNG" + b"\x00" * 4000, "image/png", "no-cache"),
+}
+
+
+# Delay distributions for RPC calls, in milliseconds: "lognormal:80:0.5" is a
+# median of 80ms with sigma 0.5, and a bare number is a constant delay
+LATENCY_DISTRIBUTIONS = {
+    "constant": lambda ms: ms,
+    "uniform": lambda low, high: random.uniform(low, high),
+    "normal": lambda mean, stddev: max(random.gauss(mean, stddev), 0),
+    "lognormal": lambda median, sigma: random.lognormvariate(math.log(median), sigma),
+    "exponential": lambda mean: random.expovariate(1 / mean),
+}
+
+
+def parse_latency(spec):
+    """Turn a latency spec such as "uniform:20:200" into a function returning milliseconds"""
+    name, *params = str(spec).split(":")
+    if name not in LATENCY_DISTRIBUTIONS:
+        params, name = [name], "constant"
+    try:
+        params = [float(param) for param in params]
+        distribution = LATENCY_DISTRIBUTIONS[name]
+        distribution(*params)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid latency '{spec}', expected e.g. 50, uniform:20:200 or lognormal:80:0.5") from e
+    return lambda: distribution(*params)
+
+
+SESSION_EXPIRED = {
+    "code": 100,
+    "message": "Odoo Session Expired",
+    "data": {
+        "name": "odoo.http.SessionExpiredException",
+        "debug": "Traceback (most recent call last):\nodoo.http.SessionExpiredException: Session expired\n",
+        "message": "Session expired",
+        "arguments": ["Session expired"],
+        "context": {}
+    }
+}
+
+
+class DropConnection(Exception):
+    """Raised by the application to close the connection without any response"""
+
+
+class StubHandler(WSGIHandler):
+    """Lets the application hang up mid-request, which clients see as RemoteDisconnected"""
+
+    def run_application(self):
+        try:
+            super().run_application()
+        except DropConnection:
+            self.close_connection = True
+
+
+class OdooStubServer:
+    """Answers the handful of Odoo routes the load test uses with canned data
+
+    RPC calls (call_kw and /web/action/load) are delayed by the latency
+    distribution and can be made to fail on purpose: error_rate answers with an
+    Odoo JSON-RPC error, server_error_rate with a bare 500 and disconnect_rate
+    closes the connection without answering. With a session_lifetime (seconds)
+    RPC calls need a session cookie from a login no older than that, otherwise
+    they get Odoo's "Session Expired" error. A capacity serves at most that many
+    RPC calls at once, like Odoo's HTTP workers, and queues the rest: with a
+    constant latency of L ms it tops out at capacity * 1000 / L calls per second.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8069, latency=0, error_rate=0.0, server_error_rate=0.0,
+                 disconnect_rate=0.0, session_lifetime=0, capacity=0):
+        self.host = host
+        self.port = port
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.disconnect_rate = disconnect_rate
+        self.session_lifetime = session_lifetime
+        self.workers = BoundedSemaphore(capacity) if capacity else None
+        self.sessions = {}
+        self.logins = 0
+        self.next_id = itertools.count(1000)
+        self.server = WSGIServer(self._listen(host, port), self.application, log=None, handler_class=StubHandler)
+
+    def application(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        method = environ.get("REQUEST_METHOD", "GET")
+
+        if path == "/web/login" and method == "GET":
+            return self._respond(start_response, "200 OK", LOGIN_PAGE, "text/html")
+        if path == "/web/login" and method == "POST":
+            self.logins += 1
+            session_id = f"stub{self.logins}"
+            self.sessions[session_id] = time.time()
+            start_response("303 See Other", [("Location", "/web"),
+                                             ("Set-Cookie", f"session_id={session_id}; Path=/"),
+                                             ("Content-Length", "0")])
+            return [b""]
+        if path == "/web":
+            return self._respond(start_response, "200 OK", WEB_PAGE, "text/html")
+
+        if path in ASSETS:
+            return self.asset(environ, start_response, path)
+
+        match = CALL_KW_PATH.match(path)
+        if method == "POST" and (match or path == "/web/action/load"):
+            delay = self.latency()
+            if self.workers is not None:
+                with self.workers:
+                    gevent.sleep(delay / 1000)
+            elif delay:
+                gevent.sleep(delay / 1000)
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            request = json.loads(environ["wsgi.input"].read(length) or b"{}")
+            params = request.get("params", {})
+
+            if self.session_lifetime and not self.session_valid(environ):
+                body = json.dumps({"jsonrpc": "2.0", "id": request.get("id"), "error": SESSION_EXPIRED}).encode()
+                return self._respond(start_response, "200 OK", body, "application/json")
+
+            fault = random.random()
+            if fault < self.disconnect_rate:
+                raise DropConnection()
+            fault -= self.disconnect_rate
+            if fault < self.server_error_rate:
+                return self._respond(start_response, "500 Internal Server Error", b"Internal Server Error", "text/plain")
+            fault -= self.server_error_rate
+            if fault < self.error_rate:
+                body = json.dumps({"jsonrpc": "2.0", "id": request.get("id"), "error": self.rpc_error(path)}).encode()
+                return self._respond(start_response, "200 OK", body, "application/json")
+
+            if match:
+                result = self.call_kw(match.group("model"), match.group("method"), params)
+            else:
+                result = self.action_load(params)
+            body = json.dumps({"jsonrpc": "2.0", "id": request.get("id"), "result": result}).encode()
+            return self._respond(start_response, "200 OK", body, "application/json")
+
+        return self._respond(start_response, "404 Not Found", b"Not Found", "text/plain")
+
+    @staticmethod
+    def asset(environ, start_response, path):
+        body, content_type, cache_control = ASSETS[path]
+        etag = '"%08x"' % (hash(path) & 0xFFFFFFFF)
+        headers = [("ETag", etag), ("Cache-Control", cache_control)]
+        if environ.get("HTTP_IF_NONE_MATCH") == etag:
+            start_response("304 Not Modified", headers)
+            return [b""]
+        start_response("200 OK", headers + [("Content-Type", content_type), ("Content-Length", str(len(body)))])
+        return [body]
+
+    def session_valid(self, environ):
+        cookies = dict(cookie.strip().partition("=")[::2] for cookie in environ.get("HTTP_COOKIE", "").split(";"))
+        logged_in_at = self.sessions.get(cookies.get("session_id"))
+        return logged_in_at is not None and time.time() - logged_in_at < self.session_lifetime
+
+    @staticmethod
+    def rpc_error(path):
+        """An error shaped like the ones Odoo returns for exceptions in RPC calls"""
+        return {
+            "code": 200,
+            "message": "Odoo Server Error",
+            "data": {
+                "name": "odoo.exceptions.UserError",
+                "debug": f"Traceback (most recent call last):\n  Injected by the stub for {path}\n",
+                "message": "Injected error",
+                "arguments": ["Injected error"],
+                "context": {}
+            }
+        }
+
+    @staticmethod
+    def action_load(params):
+        """A list-view window action, whatever action was asked for"""
+        return {
+            "id": 1,
+            "type": "ir.actions.act_window",
+            "xml_id": params.get("action_id"),
+            "res_model": "stub.model",
+            "views": [[False, "list"], [False, "form"]],
+            "search_view_id": False,
+            "domain": "[]",
+            "context": "{}"
+        }
+
+    def call_kw(self, model, method, params):
+        """Produce a plausible result for an ORM call"""
+        kwargs = params.get("kwargs", {})
+        limit = kwargs.get("limit") or 80
+        offset = kwargs.get("offset") or 0
+
+        if method == "get_views":
+            return {
+                "views": {view_type: {"id": False, "arch": f"<{view_type}/>"} for _, view_type in kwargs.get("views", [])},
+                "models": {model: {"fields": {"name": {"type": "char"}}}}
+            }
+        if method == "web_search_read":
+            fields = kwargs.get("specification") or {"name": {}}
+            return {
+                "length": 1000,
+                "records": [dict({"id": record_id}, **{field: f"{model} {record_id}" for field in fields})
+                            for record_id in range(offset + 1, offset + limit + 1)]
+            }
+        if method == "web_read_group":
+            return {"groups": [], "length": 0}
+
+        if method == "search":
+            return list(range(offset + 1, offset + limit + 1))
+        if method == "search_read":
+            fields = kwargs.get("fields") or ["name"]
+            return [dict({"id": record_id}, **{field: f"{model} {record_id}" for field in fields})
+                    for record_id in range(offset + 1, offset + limit + 1)]
+        if method == "search_count":
+            return 1000
+        if method == "create":
+            # create([vals, ...]) makes several records at once and returns their ids
+            args = params.get("args") or [{}]
+            if isinstance(args[0], list):
+                return [next(self.next_id) for _ in args[0]]
+            return next(self.next_id)
+        if method == "read_group":
+            return []
+        return True
+
+    @staticmethod
+    def _listen(host, port):
+        """Listening socket with Nagle disabled, so replies aren't held back by delayed ACKs"""
+        listener = gevent.socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        listener.bind((host, port))
+        listener.listen(1024)
+        return listener
+
+    @staticmethod
+    def _respond(start_response, status, body, content_type):
+        start_response(status, [("Content-Type", content_type), ("Content-Length", str(len(body)))])
+        return [body]
+
+    def start(self):
+        """Serve from greenlets in this process, e.g. next to an in-process locust Environment"""
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def serve_forever(self):
+        print(f"Odoo stub listening on http://{self.host}:{self.port}")
+        self.server.serve_forever()
+
+
+class StubServerProcess:
+    """Runs the stub in a subprocess so it doesn't share a CPU with the load generator"""
+
+    def __init__(self, host="127.0.0.1", port=8069, extra_args=()):
+        self.host = host
+        self.port = port
+        self.extra_args = list(extra_args)
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        cmd = [sys.executable, __file__, "--host", self.host, "--port", str(self.port)] + self.extra_args
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+
+        self.process.terminate()
+        raise RuntimeError(f"Stub server did not start on {self.url}")
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.process.terminate()
+        self.process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Odoo stub server for load test development")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8069, help="Port to listen on")
+    parser.add_argument("--latency", "--latency-ms", default="0",
+                        help="Delay added to every RPC call in ms: a number or constant:MS, uniform:LOW:HIGH, "
+                             "normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA, exponential:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of RPC calls answered with an Odoo JSON-RPC error")
+    parser.add_argument("--server-error-rate", type=float, default=0.0,
+                        help="Share of RPC calls answered with HTTP 500")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0,
+                        help="Share of RPC calls whose connection is closed without a response")
+    parser.add_argument("--session-lifetime", type=float, default=0,
+                        help="Seconds a login stays valid for RPC calls, 0 to accept any session")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="RPC calls served at once, the rest queue (like Odoo workers); 0 for no limit")
+
+    args = parser.parse_args()
+
+    try:
+        server = OdooStubServer(args.host, args.port, args.latency, args.error_rate, args.server_error_rate,
+                                args.disconnect_rate, args.session_lifetime, args.capacity)
+    except ValueError as e:
+        parser.error(str(e))
+    server.serve_forever()
@@ -1,73 +1,459 @@
+# ============================================================================
+# test_data_generator.py - Generate test datasets and seed them into Odoo
+# ============================================================================
+#
+# Rows aren't built with Faker calls one by one: pools of POOL_SIZE Faker
+# values per field are built once and handed to every process, and each shard
+# of SHARD_ROWS rows samples them with numpy. Shards run on a process pool and
+# are written in order as they finish, to JSONL or Parquet (by the output's
+# extension), so memory stays at a few shards whatever the row count.
+#
+# Reference fields (countries, partner tags, product categories, units of
+# measure, pricelists) only get ids that exist: read from the target with one
+# search per model and cached in .odoo_reference_ids.json per host, or taken
+# from a fixture file shaped like {"res.country": [1, 2, ...], ...}. Without
+# either they are left to Odoo's defaults. The same seed and reference ids give
+# a byte-identical dataset.
+#
+# Seeding pushes a dataset into Odoo with multi-record create calls of
+# --batch-size rows over --connections logged-in sessions. Finished batches
+# are appended to <dataset>.progress, and a rerun skips them.
+#
+# Run with:
+# python test_data_generator.py generate partners 1000000 partners.parquet --processes 8 --seed 42 --host=https://your-odoo-domain.com --login admin --password admin
+# python test_data_generator.py seed partners partners.parquet --host=https://your-odoo-domain.com --login admin --password admin
+
+import argparse
 import json
-import random
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import requests
 from faker import Faker
 
-fake = Faker()
+from odoo_rpc import CallKw, JSON_HEADERS, Slot, odoo_values
 
-class TestDataGenerator:
-    """Generate realistic test data for Odoo load testing"""
+POOL_SIZE = 2000
+SHARD_ROWS = 50_000
+# Random numbers are drawn per block of rows, so shard sizes don't change the data
+BLOCK_ROWS = 1000
+PARQUET_ROW_GROUP_ROWS = 100_000
+SEED_BATCH = 500
+REPORT_EVERY_SECONDS = 5
 
-    @staticmethod
-    def generate_partners(count=100):
-        """Generate partner data"""
-        partners = []
-        for i in range(count):
-            is_company = random.choice([True, False])
+REFERENCE_MODELS = ["res.country", "res.partner.category", "product.category", "uom.uom", "product.pricelist"]
+REFERENCE_CACHE = ".odoo_reference_ids.json"
+
+MODELS = {"partners": "res.partner", "products": "product.template"}
+
+# Faker values per field, sampled by the generated rows
+FAKER_FIELDS = {
+    "company": lambda fake: fake.company(),
+    "person": lambda fake: fake.name(),
+    "phone": lambda fake: fake.phone_number(),
+    "street": lambda fake: fake.street_address(),
+    "city": lambda fake: fake.city(),
+    "zip": lambda fake: fake.zipcode(),
+    "url": lambda fake: fake.url(),
+    "user_name": lambda fake: fake.user_name(),
+    "domain": lambda fake: fake.free_email_domain(),
+    "word": lambda fake: fake.word().title(),
+    "text": lambda fake: fake.text(max_nb_chars=200),
+}
+
+POOL_FIELDS = {
+    "partners": ["company", "person", "phone", "street", "city", "zip", "url", "user_name", "domain"],
+    "products": ["word", "text"],
+}
+
+_pools = None
+_references = {}
+
+
+def build_pools(kind, seed):
+    """POOL_SIZE Faker values for each field the kind samples, the same for the same seed"""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {field: np.array([FAKER_FIELDS[field](fake) for _ in range(POOL_SIZE)], dtype=object)
+            for field in POOL_FIELDS[kind]}
+
+
+def use_values(pools, references):
+    """Process pool initializer: the value pools and reference ids every shard of this process samples"""
+    global _pools, _references
+    _pools = pools
+    _references = references
+
+
+def reference_ids(rng, model, count):
+    """count ids of existing model records, or None when none are known"""
+    ids = _references.get(model)
+    return np.asarray(ids)[rng.integers(0, len(ids), count)] if ids else None
+
+
+def with_references(frame, columns):
+    """frame plus the reference columns that have ids"""
+    return frame.assign(**{column: ids for column, ids in columns.items() if ids is not None})
+
+
+def partner_block(start, count, seed):
+    """Partners start to start + count; their emails are unique by row number"""
+    rng = np.random.default_rng([seed, start])
+    pools = _pools
+
+    def sample(field):
+        return pools[field][rng.integers(0, POOL_SIZE, count)]
+
+    is_company = rng.random(count) < 0.5
+    rows = pd.Series(np.arange(start, start + count)).astype(str)
+    tags = reference_ids(rng, "res.partner.category", count)
+    frame = pd.DataFrame({
+        "name": np.where(is_company, sample("company"), sample("person")),
+        "email": pd.Series(sample("user_name")) + "." + rows + "@" + pd.Series(sample("domain")),
+        "phone": sample("phone"),
+        "is_company": is_company,
+        "street": sample("street"),
+        "city": sample("city"),
+        "zip": sample("zip"),
+        "website": np.where(is_company, sample("url"), None),
+    })
+    return with_references(frame, {
+        "country_id": reference_ids(rng, "res.country", count),
+        "category_id": [[tag] for tag in tags.tolist()] if tags is not None else None,
+        "property_product_pricelist": reference_ids(rng, "product.pricelist", count),
+    })
+
+
+def product_block(start, count, seed):
+    """Products start to start + count; their internal references are unique by row number"""
+    rng = np.random.default_rng([seed, start])
+    pools = _pools
+
+    def sample(field):
+        return pools[field][rng.integers(0, POOL_SIZE, count)]
+
+    frame = pd.DataFrame({
+        "name": pd.Series(sample("word")) + " " + pd.Series(sample("word")),
+        "default_code": [f"LT{row:08d}" for row in range(start, start + count)],
+        "list_price": rng.uniform(5.0, 500.0, count).round(2),
+        "standard_price": rng.uniform(3.0, 300.0, count).round(2),
+        "type": rng.choice(["product", "service", "consu"], count),
+        "active": True,
+        "description": sample("text"),
+        "weight": rng.uniform(0.1, 10.0, count).round(2),
+        "volume": rng.uniform(0.01, 1.0, count).round(3),
+    })
+    # Purchases in the sales unit: both units of a product must share a category
+    units = reference_ids(rng, "uom.uom", count)
+    return with_references(frame, {
+        "categ_id": reference_ids(rng, "product.category", count),
+        "uom_id": units,
+        "uom_po_id": units,
+    })
+
+
+BLOCK_GENERATORS = {"partners": partner_block, "products": product_block}
+
+
+def generate_shard(kind, start, count, seed):
+    """Rows start to start + count, one BLOCK_ROWS block at a time; start is a multiple of BLOCK_ROWS"""
+    end = start + count
+    return pd.concat([BLOCK_GENERATORS[kind](block, min(BLOCK_ROWS, end - block), seed)
+                      for block in range(start, end, BLOCK_ROWS)], ignore_index=True)
+
+
+def random_seed():
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+
+def generate_shards(kind, count, seed=None, processes=None, shard_rows=SHARD_ROWS, references=None):
+    """DataFrames of `count` rows in order, shard by shard, built on a process pool
+
+    The rows depend only on the seed (random when None) and the reference
+    ids, not on the number of processes or shard sizes. At most two shards
+    per process are in flight.
+    """
+    seed = random_seed() if seed is None else seed
+    shard_rows = -(-shard_rows // BLOCK_ROWS) * BLOCK_ROWS
+    references = {model: sorted(ids) for model, ids in (references or {}).items()}
+    starts = list(range(0, count, shard_rows))
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(processes, initializer=use_values,
+                             initargs=(build_pools(kind, seed), references)) as executor:
+        pending = []
+        for start in starts:
+            pending.append(executor.submit(generate_shard, kind, start, min(shard_rows, count - start), seed))
+            if len(pending) >= 2 * processes:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
 
-            partner = {
-                "name": fake.company() if is_company else fake.name(),
-                "email": fake.email(),
-                "phone": fake.phone_number(),
-                "is_company": is_company,
-                "street": fake.street_address(),
-                "city": fake.city(),
-                "zip": fake.zipcode(),
-                "country_id": random.randint(1, 50),  # Adjust based on your countries
-                "category_id": [[6, 0, [random.randint(1, 10)]]]  # Random categories
-            }
 
-            if is_company:
-                partner["website"] = fake.url()
+def write_dataset(shards, path):
+    """Stream DataFrames to a JSONL or Parquet file; returns the number of rows written"""
+    rows = 0
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
 
-            partners.append(partner)
+        # Row groups of a fixed size, however the rows were sharded, keep the file reproducible
+        writer = None
+        buffered = []
+        try:
+            for shard in shards:
+                table = pa.Table.from_pandas(shard, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                buffered.append(table.cast(writer.schema))
+                rows += len(shard)
+                if sum(len(table) for table in buffered) >= PARQUET_ROW_GROUP_ROWS:
+                    table = pa.concat_tables(buffered).combine_chunks()
+                    full = len(table) // PARQUET_ROW_GROUP_ROWS * PARQUET_ROW_GROUP_ROWS
+                    writer.write_table(table.slice(0, full), row_group_size=PARQUET_ROW_GROUP_ROWS)
+                    buffered = [table.slice(full)]
+            if buffered:
+                writer.write_table(pa.concat_tables(buffered).combine_chunks(), row_group_size=PARQUET_ROW_GROUP_ROWS)
+        finally:
+            if writer is not None:
+                writer.close()
+    elif path.endswith(".jsonl"):
+        with open(path, "w") as f:
+            for shard in shards:
+                f.write(shard.to_json(orient="records", lines=True).rstrip("\n") + "\n")
+                rows += len(shard)
+    else:
+        raise ValueError(f"Unknown dataset format of '{path}', expected .jsonl or .parquet")
+    return rows
 
-        return partners
+
+def read_dataset(path, batch_size=SEED_BATCH):
+    """Lists of records from a JSONL or Parquet dataset, batch_size at a time"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size):
+            yield batch.to_pylist()
+    else:
+        batch = []
+        with open(path) as f:
+            for line in f:
+                batch.append(json.loads(line))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def to_records(shards):
+    """Dicts of the rows of all shards, with None where a value is missing"""
+    frame = pd.concat(shards, ignore_index=True).astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+
+class OdooClient:
+    """JSON-RPC calls to Odoo over one logged-in session per thread"""
+
+    def __init__(self, host, login, password):
+        self.host = host.rstrip("/")
+        self.login = login
+        self.password = password
+        self._local = threading.local()
+
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            page = session.get(f"{self.host}/web/login", timeout=30).text
+            start = page.find('csrf_token') + len('csrf_token":"')
+            response = session.post(f"{self.host}/web/login", timeout=30, data={
+                "login": self.login, "password": self.password,
+                "csrf_token": page[start:page.find('"', start)], "redirect": ""})
+            if response.status_code != 200 or "/web" not in response.url:
+                raise RuntimeError(f"Login failed with status {response.status_code}")
+        return session
+
+    def call(self, call, **values):
+        response = self.session().post(f"{self.host}{call.url}", data=call.encode(**values),
+                                       headers=JSON_HEADERS, timeout=300)
+        response.raise_for_status()
+        result = response.json()
+        if "error" in result:
+            raise RuntimeError(f"{call.method} failed: {result['error'].get('data', {}).get('message', result['error'])}")
+        return result["result"]
+
+
+def fetch_references(client):
+    """Ids of the records of every reference model, one search each; models not installed are left out"""
+    references = {}
+    for model in REFERENCE_MODELS:
+        try:
+            references[model] = sorted(client.call(CallKw(model, "search", args=[[]], kwargs={"order": "id"})))
+        except RuntimeError as e:
+            print(f"No reference ids for {model}: {e}")
+    return references
+
+
+def load_references(host=None, login=None, password=None, fixture=None, cache=REFERENCE_CACHE, refresh=False):
+    """Reference ids per model from a fixture, the cache for the host, or the host itself; {} without any"""
+    if fixture:
+        with open(fixture) as f:
+            return {model: sorted(ids) for model, ids in json.load(f).items()}
+    if not host:
+        return {}
+
+    try:
+        with open(cache) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    if host in cached and not refresh:
+        return cached[host]
+
+    cached[host] = fetch_references(OdooClient(host, login, password))
+    with open(cache, "w") as f:
+        json.dump(cached, f, indent=2, sort_keys=True)
+    return cached[host]
+
+
+class OdooSeeder(OdooClient):
+    """Creates dataset records in Odoo in batches, over one logged-in session per thread"""
+
+    def __init__(self, host, login, password, connections=4, batch_size=SEED_BATCH):
+        super().__init__(host, login, password)
+        self.connections = connections
+        self.batch_size = batch_size
+        self.failure = None
+
+    def create(self, call, records):
+        return self.call(call, vals_list=records)
+
+    def seed(self, kind, path):
+        """Create every record of the dataset not created by an earlier run; returns the number created"""
+        call = CallKw(MODELS[kind], "create", args=[Slot("vals_list")])
+        progress_path = f"{path}.progress"
+        done = set()
+        if os.path.exists(progress_path):
+            with open(progress_path) as f:
+                done = {json.loads(line)["start"] for line in f}
+            if any(start % self.batch_size for start in done):
+                raise ValueError(f"{progress_path} was written with another --batch-size")
+            print(f"Resuming: {len(done)} batches already created")
+
+        created = 0
+        self.failure = None
+        started = last_report = time.monotonic()
+        batches = ((start * self.batch_size, batch) for start, batch in enumerate(read_dataset(path, self.batch_size)))
+        with open(progress_path, "a") as progress, ThreadPoolExecutor(self.connections) as executor:
+            pending = {}
+            for start, batch in batches:
+                if self.failure is not None:
+                    break
+                if start in done:
+                    continue
+                future = executor.submit(self.create, call, [odoo_values(record) for record in batch])
+                pending[future] = (start, len(batch))
+                # Two batches per connection in flight keep them busy without reading ahead
+                while len(pending) >= 2 * self.connections:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    created += self._record(finished, pending, progress)
+                if time.monotonic() - last_report >= REPORT_EVERY_SECONDS:
+                    last_report = time.monotonic()
+                    print(f"{created:,} records, {created / (last_report - started):,.0f} records/s")
+            # Batches still in flight after a failure get recorded too, or a resume would create them again
+            finished, _ = wait(pending)
+            created += self._record(finished, pending, progress)
+        if self.failure is not None:
+            raise self.failure
+
+        elapsed = time.monotonic() - started
+        print(f"Created {created:,} {MODELS[kind]} records in {elapsed:.0f}s, {created / max(elapsed, 1e-9):,.0f} records/s")
+        return created
+
+    def _record(self, finished, pending, progress):
+        """Log created batches to the progress file; the first failed batch stops the seeding"""
+        created = 0
+        for future in finished:
+            start, count = pending.pop(future)
+            if future.exception() is not None:
+                self.failure = self.failure or future.exception()
+                continue
+            ids = future.result()
+            progress.write(json.dumps({"start": start, "count": count, "ids": ids}) + "\n")
+            created += count
+        progress.flush()
+        return created
+
+
+class TestDataGenerator:
+    """Generate realistic test data for Odoo load testing"""
 
     @staticmethod
-    def generate_products(count=50):
+    def generate_partners(count=100, seed=None, references=None):
+        """Generate partner data"""
+        return to_records(generate_shards("partners", count, seed, references=references))
+
+    @staticmethod
+    def generate_products(count=50, seed=None, references=None):
         """Generate product data"""
-        products = []
-        categories = [
-            "Electronics", "Clothing", "Food", "Books", "Home & Garden",
-            "Sports", "Automotive", "Health", "Beauty", "Toys"
-        ]
-
-        for i in range(count):
-            product = {
-                "name": f"{fake.word().title()} {fake.word().title()}",
-                "list_price": round(random.uniform(5.0, 500.0), 2),
-                "standard_price": round(random.uniform(3.0, 300.0), 2),
-                "type": random.choice(["product", "service", "consu"]),
-                "categ_id": random.randint(1, 20),  # Adjust based on your categories
-                "active": True,
-                "description": fake.text(max_nb_chars=200),
-                "weight": round(random.uniform(0.1, 10.0), 2),
-                "volume": round(random.uniform(0.01, 1.0), 3)
-            }
-            products.append(product)
-
-        return products
+        return to_records(generate_shards("products", count, seed, references=references))
 
     @staticmethod
-    def save_test_data():
+    def save_test_data(partners=100, products=50, seed=None, references=None, extension="jsonl"):
         """Save generated test data to files"""
-        partners = TestDataGenerator.generate_partners(100)
-        products = TestDataGenerator.generate_products(50)
+        write_dataset(generate_shards("partners", partners, seed, references=references), f"test_partners.{extension}")
+        write_dataset(generate_shards("products", products, seed, references=references), f"test_products.{extension}")
+        print("Test data generated and saved to files")
 
-        with open('test_partners.json', 'w') as f:
-            json.dump(partners, f, indent=2)
 
-        with open('test_products.json', 'w') as f:
-            json.dump(products, f, indent=2)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Odoo test data and seed it into a database")
+    commands = parser.add_subparsers(dest="command", required=True)
 
-        print("Test data generated and saved to files")
+    generate = commands.add_parser("generate", help="Write a dataset to a .jsonl or .parquet file")
+    generate.add_argument("kind", choices=list(MODELS))
+    generate.add_argument("count", type=int)
+    generate.add_argument("output", help="Dataset file, .jsonl or .parquet")
+    generate.add_argument("--seed", type=int, help="Same seed and reference ids, same bytes (random by default)")
+    generate.add_argument("--processes", type=int, default=os.cpu_count())
+    generate.add_argument("--shard-rows", type=int, default=SHARD_ROWS, help="Rows each process generates at a time")
+    generate.add_argument("--host", help="Odoo host to read the reference ids from, once; cached in " + REFERENCE_CACHE)
+    generate.add_argument("--login")
+    generate.add_argument("--password")
+    generate.add_argument("--references", help="Reference ids fixture, JSON like {\"res.country\": [1, 2, ...], ...}")
+    generate.add_argument("--refresh-references", action="store_true", help="Read the host's reference ids again")
+
+    seed = commands.add_parser("seed", help="Create the records of a dataset in Odoo, resuming after a failure")
+    seed.add_argument("kind", choices=list(MODELS))
+    seed.add_argument("dataset", help="Dataset file written by generate")
+    seed.add_argument("--host", required=True, help="Odoo host URL")
+    seed.add_argument("--login", required=True)
+    seed.add_argument("--password", required=True)
+    seed.add_argument("--connections", type=int, default=4, help="Sessions creating batches in parallel")
+    seed.add_argument("--batch-size", type=int, default=SEED_BATCH, help="Records per create call")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        references = load_references(args.host, args.login, args.password, args.references,
+                                     refresh=args.refresh_references)
+        if not references:
+            print("No reference ids (--host or --references): countries, categories and units are left to Odoo")
+        seed = random_seed() if args.seed is None else args.seed
+        started = time.monotonic()
+        rows = write_dataset(generate_shards(args.kind, args.count, seed, args.processes, args.shard_rows, references),
+                             args.output)
+        elapsed = time.monotonic() - started
+        print(f"Wrote {rows:,} {args.kind} to {args.output} in {elapsed:.1f}s, {rows / max(elapsed, 1e-9):,.0f} rows/s, "
+              f"seed {seed}")
+    else:
+        seeder = OdooSeeder(args.host, args.login, args.password, args.connections, args.batch_size)
+        try:
+            seeder.seed(args.kind, args.dataset)
+        except (requests.RequestException, RuntimeError) as e:
+            sys.exit(f"Seeding stopped: {e}\nRun the same command again to resume")
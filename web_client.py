@@ -0,0 +1,91 @@
+# ============================================================================
+# web_client.py - The RPC sequences the Odoo 17/18 web client issues
+# ============================================================================
+
+import time
+
+from odoo_rpc import CallKw, JsonRpcCall, Slot, JSON_HEADERS
+
+TTI_REQUEST_TYPE = "TTI"
+
+WEB_CONTEXT = {"lang": "en_US", "tz": "UTC", "bin_size": True}
+
+
+class WebClientMenu:
+    """Opening a menu the way the web client does: action, views, records, groups
+
+    Each RPC is its own stats entry ("<menu>: <step>"), and when all of them
+    succeed the total is logged as the menu's time to interactive under the
+    TTI request type. The TTI row is written straight into its entry, so the
+    Aggregated row only counts real requests.
+    """
+
+    def __init__(self, name, action, model, specification, domain=None, groupby=None, limit=80):
+        self.name = name
+        domain = domain or []
+
+        self.action_load = JsonRpcCall("/web/action/load", {"action_id": action, "context": WEB_CONTEXT})
+        self.get_views = CallKw(model, "get_views", kwargs={
+            "views": Slot("views"),
+            "options": {"action_id": Slot("action_id"), "load_filters": True, "toolbar": True},
+            "context": WEB_CONTEXT
+        })
+        self.web_search_read = CallKw(model, "web_search_read", kwargs={
+            "specification": specification,
+            "offset": 0,
+            "limit": limit,
+            "order": "",
+            "count_limit": 10001,
+            "domain": domain,
+            "context": WEB_CONTEXT
+        })
+        self.web_read_group = CallKw(model, "web_read_group", kwargs={
+            "domain": domain,
+            "fields": [],
+            "groupby": groupby,
+            "lazy": True,
+            "context": WEB_CONTEXT
+        }) if groupby else None
+
+    def load(self, user):
+        """Replay the menu's RPCs on the user's session; returns whether it became interactive"""
+        started = time.perf_counter()
+
+        action = self._call(user, self.action_load, "action/load")
+        if action is None:
+            return False
+
+        # The views the action declares, plus its search view
+        views = [list(view) for view in action.get("views") or [[False, "list"]]]
+        search_view = action.get("search_view_id")
+        views.append([search_view[0] if search_view else False, "search"])
+
+        if self._call(user, self.get_views, "get_views", views=views, action_id=action.get("id", False)) is None:
+            return False
+        if self._call(user, self.web_search_read, "web_search_read") is None:
+            return False
+        if self.web_read_group is not None and self._call(user, self.web_read_group, "web_read_group") is None:
+            return False
+
+        user.environment.stats.get(self.name, TTI_REQUEST_TYPE).log((time.perf_counter() - started) * 1000, 0)
+        return True
+
+    def _call(self, user, call, step, **values):
+        """POST one step and return its JSON-RPC result, or None after marking it failed"""
+        with user.client.post(call.url,
+                              data=call.encode(**values),
+                              headers=JSON_HEADERS,
+                              name=f"{self.name}: {step}",
+                              catch_response=True) as response:
+            if response.status_code != 200:
+                response.failure(f"{self.name} failed to load at {step}")
+                return None
+            try:
+                result = response.json()
+            except ValueError:
+                response.failure(f"Invalid JSON response for {self.name} {step}")
+                return None
+            if "error" in result:
+                response.failure(f"{self.name} {step} error: {result['error']}")
+                return None
+            return result.get("result")